@@ -117,15 +117,9 @@ for image_file in image_files:
     gaze.refresh(frame)
 
     frame = gaze.annotated_frame()
-    text = ""
-    if gaze.is_blinking():
-        text = "Blinking"
-    elif gaze.is_right():
-        text = "Looking right"
-    elif gaze.is_left():
-        text = "Looking left"
-    elif gaze.is_center():
-        text = "Looking center"
+    # The direction is computed once per frame
+    labels = {"blinking": "Blinking", "right": "Looking right", "left": "Looking left", "center": "Looking center"}
+    text = labels.get(gaze.direction(), "")
 
     left_pupil = gaze.pupil_left_coords()
     right_pupil = gaze.pupil_right_coords()
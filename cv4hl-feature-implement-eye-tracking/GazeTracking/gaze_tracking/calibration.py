@@ -1,22 +1,38 @@
 from __future__ import division
 import cv2
+import numpy as np
 from .pupil import Pupil
+from .running_stats import RunningStats
 
 
 class Calibration(object):
     """
     This class calibrates the pupil detection algorithm by finding the
     best binarization threshold value for the person and the webcam.
+
+    The calibration of an eye is complete as soon as the standard error of
+    its mean threshold is within the tolerance (after at least min_frames
+    frames), and at the latest after nb_frames frames. The thresholds are
+    searched every threshold_step between 5 and 100.
     """
 
-    def __init__(self):
-        self.nb_frames = 20
+    def __init__(self, nb_frames=20, min_frames=5, tolerance=1.0, threshold_step=5):
+        self.nb_frames = nb_frames
+        self.min_frames = min_frames
+        self.tolerance = tolerance
+        self.threshold_step = threshold_step
         self.thresholds_left = []
         self.thresholds_right = []
+        self._stats_left = RunningStats()
+        self._stats_right = RunningStats()
+
+    def _side_complete(self, thresholds, stats):
+        return len(thresholds) >= self.nb_frames or stats.has_converged(self.tolerance, self.min_frames)
 
     def is_complete(self):
         """Returns true if the calibration is completed"""
-        return len(self.thresholds_left) >= self.nb_frames and len(self.thresholds_right) >= self.nb_frames
+        return (self._side_complete(self.thresholds_left, self._stats_left)
+                and self._side_complete(self.thresholds_right, self._stats_right))
 
     def threshold(self, side):
         """Returns the threshold value for the given eye.
@@ -29,6 +45,12 @@ class Calibration(object):
         elif side == 1:
             return int(sum(self.thresholds_right) / len(self.thresholds_right))
 
+    def freeze(self):
+        """Returns a FrozenCalibration with the current thresholds of both eyes"""
+        if not self.thresholds_left or not self.thresholds_right:
+            raise ValueError("Both eyes need at least one calibrated threshold to freeze the calibration")
+        return FrozenCalibration(self.threshold(0), self.threshold(1))
+
     @staticmethod
     def iris_size(frame):
         """Returns the percentage of space that the iris takes up on
@@ -44,19 +66,29 @@ class Calibration(object):
         return nb_blacks / nb_pixels
 
     @staticmethod
-    def find_best_threshold(eye_frame):
+    def find_best_threshold(eye_frame, step=5):
         """Calculates the optimal threshold to binarize the
         frame for the given eye.
 
+        The eye frame is filtered once; the iris size for every threshold is
+        read from the cumulative histogram of the filtered frame, so a finer
+        step costs nothing.
+
         Argument:
             eye_frame (numpy.ndarray): Frame of the eye to be analyzed
+            step (int): Distance between the thresholds tried
         """
         average_iris_size = 0.48
         trials = {}
 
-        for threshold in range(5, 100, 5):
-            iris_frame = Pupil.image_processing(eye_frame, threshold)
-            trials[threshold] = Calibration.iris_size(iris_frame)
+        # Same region as iris_size(): pixels <= threshold turn black in the binarized frame
+        frame = Pupil.filter_eye_frame(eye_frame)[5:-5, 5:-5]
+        height, width = frame.shape[:2]
+        nb_pixels = height * width
+        nb_blacks = np.cumsum(np.bincount(frame.ravel(), minlength=256))
+
+        for threshold in range(5, 100, step):
+            trials[threshold] = int(nb_blacks[threshold]) / nb_pixels
 
         best_threshold, iris_size = min(trials.items(), key=(lambda p: abs(p[1] - average_iris_size)))
         return best_threshold
@@ -69,9 +101,48 @@ class Calibration(object):
             eye_frame (numpy.ndarray): Frame of the eye
             side: Indicates whether it's the left eye (0) or the right eye (1)
         """
-        threshold = self.find_best_threshold(eye_frame)
-
         if side == 0:
+            if self._side_complete(self.thresholds_left, self._stats_left):
+                return
+            threshold = self.find_best_threshold(eye_frame, self.threshold_step)
             self.thresholds_left.append(threshold)
+            self._stats_left.add(threshold)
         elif side == 1:
+            if self._side_complete(self.thresholds_right, self._stats_right):
+                return
+            threshold = self.find_best_threshold(eye_frame, self.threshold_step)
             self.thresholds_right.append(threshold)
+            self._stats_right.add(threshold)
+
+
+class FrozenCalibration(object):
+    """
+    Binarization thresholds fixed once the calibration is done. It is never
+    changed by the frames analyzed with it, so it can be shared by threads
+    and passed to other processes.
+    """
+
+    def __init__(self, threshold_left, threshold_right):
+        self.thresholds = (threshold_left, threshold_right)
+
+    def __repr__(self):
+        return f"FrozenCalibration(threshold_left={self.thresholds[0]}, threshold_right={self.thresholds[1]})"
+
+    def is_complete(self):
+        """A frozen calibration is always complete"""
+        return True
+
+    def freeze(self):
+        """Returns the calibration itself, it is frozen already"""
+        return self
+
+    def threshold(self, side):
+        """Returns the threshold value for the given eye.
+
+        Argument:
+            side: Indicates whether it's the left eye (0) or the right eye (1)
+        """
+        return self.thresholds[side]
+
+    def evaluate(self, eye_frame, side):
+        """Does nothing, the thresholds are frozen"""
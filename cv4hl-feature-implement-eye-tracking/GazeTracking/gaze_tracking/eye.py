@@ -13,7 +13,7 @@ class Eye(object):
     LEFT_EYE_POINTS = [36, 37, 38, 39, 40, 41]
     RIGHT_EYE_POINTS = [42, 43, 44, 45, 46, 47]
 
-    def __init__(self, original_frame, landmarks, side, calibration):
+    def __init__(self, original_frame, landmarks, side, calibration, subpixel=False):
         self.frame = None
         self.origin = None
         self.center = None
@@ -22,18 +22,18 @@ class Eye(object):
         self.width = None
         self.landmark_points = None
 
-        self._analyze(original_frame, landmarks, side, calibration)
+        self._analyze(original_frame, landmarks, side, calibration, subpixel)
 
     @staticmethod
     def _middle_point(p1, p2):
         """Returns the middle point (x,y) between two points
 
         Arguments:
-            p1 (dlib.point): First point
-            p2 (dlib.point): Second point
+            p1: First point (x, y)
+            p2: Second point (x, y)
         """
-        x = int((p1.x + p2.x) / 2)
-        y = int((p1.y + p2.y) / 2)
+        x = int((p1[0] + p2[0]) / 2)
+        y = int((p1[1] + p2[1]) / 2)
         return (x, y)
 
     def _isolate(self, frame, landmarks, points):
@@ -41,30 +41,34 @@ class Eye(object):
 
         Arguments:
             frame (numpy.ndarray): Frame containing the face
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) int32 array of the facial landmarks for the face region
             points (list): Points of an eye (from the 68 Multi-PIE landmarks)
         """
-        region = np.array([(landmarks.part(point).x, landmarks.part(point).y) for point in points])
-        region = region.astype(np.int32)
+        region = landmarks[points]
         self.landmark_points = region
 
-        # Applying a mask to get only the eye
-        height, width = frame.shape[:2]
-        black_frame = np.zeros((height, width), np.uint8)
-        mask = np.full((height, width), 255, np.uint8)
-        cv2.fillPoly(mask, [region], (0, 0, 0))
-        eye = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
-
         # Cropping on the eye
         margin = 5
         min_x = np.min(region[:, 0]) - margin
         max_x = np.max(region[:, 0]) + margin
         min_y = np.min(region[:, 1]) - margin
         max_y = np.max(region[:, 1]) + margin
-        #breakpoint()
-        self.frame = eye[min_y:max_y, min_x:max_x]
         self.origin = (min_x, min_y)
 
+        # Applying a mask to get only the eye, inside the crop only. The crop
+        # bounds follow the slicing rules, as if the whole frame was cropped.
+        height, width = frame.shape[:2]
+        start_y, stop_y, _ = slice(min_y, max_y).indices(height)
+        start_x, stop_x, _ = slice(min_x, max_x).indices(width)
+        eye = frame[start_y:stop_y, start_x:stop_x]
+        if eye.size:
+            # Everything but the eye polygon is white
+            mask = np.full(eye.shape[:2], 255, np.uint8)
+            cv2.fillPoly(mask, [region - np.int32([start_x, start_y])], (0, 0, 0))
+            eye = cv2.bitwise_or(eye, mask)
+        #breakpoint()
+        self.frame = eye
+
         self.height, self.width = self.frame.shape[:2]
         self.center = (self.width / 2, self.height / 2)
 
@@ -73,16 +77,17 @@ class Eye(object):
         It's the division of the width of the eye, by its height.
 
         Arguments:
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) int32 array of the facial landmarks for the face region
             points (list): Points of an eye (from the 68 Multi-PIE landmarks)
 
         Returns:
             The computed ratio
         """
-        left = (landmarks.part(points[0]).x, landmarks.part(points[0]).y)
-        right = (landmarks.part(points[3]).x, landmarks.part(points[3]).y)
-        top = self._middle_point(landmarks.part(points[1]), landmarks.part(points[2]))
-        bottom = self._middle_point(landmarks.part(points[5]), landmarks.part(points[4]))
+        eye_points = landmarks[points].tolist()
+        left = eye_points[0]
+        right = eye_points[3]
+        top = self._middle_point(eye_points[1], eye_points[2])
+        bottom = self._middle_point(eye_points[5], eye_points[4])
 
         eye_width = math.hypot((left[0] - right[0]), (left[1] - right[1]))
         eye_height = math.hypot((top[0] - bottom[0]), (top[1] - bottom[1]))
@@ -94,15 +99,16 @@ class Eye(object):
 
         return ratio
 
-    def _analyze(self, original_frame, landmarks, side, calibration):
+    def _analyze(self, original_frame, landmarks, side, calibration, subpixel=False):
         """Detects and isolates the eye in a new frame, sends data to the calibration
         and initializes Pupil object.
 
         Arguments:
             original_frame (numpy.ndarray): Frame passed by the user
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) int32 array of the facial landmarks for the face region
             side: Indicates whether it's the left eye (0) or the right eye (1)
             calibration (calibration.Calibration): Manages the binarization threshold value
+            subpixel: If true, the pupil coordinates are not truncated to ints
         """
         if side == 0:
             points = self.LEFT_EYE_POINTS
@@ -118,4 +124,4 @@ class Eye(object):
             calibration.evaluate(self.frame, side)
 
         threshold = calibration.threshold(side)
-        self.pupil = Pupil(self.frame, threshold)
+        self.pupil = Pupil(self.frame, threshold, subpixel)
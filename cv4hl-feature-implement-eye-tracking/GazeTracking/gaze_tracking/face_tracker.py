@@ -0,0 +1,182 @@
+from __future__ import division
+import time
+import cv2
+import dlib
+import numpy as np
+
+
+class DetectionStats(object):
+    """
+    This class counts the face detections of a FaceTracker, to know how often
+    the face was found in the search region and how much time it saved.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.faces = 0
+        self.full_detections = 0
+        self.full_time = 0.0
+        self.region_detections = 0
+        self.region_hits = 0
+        self.region_time = 0.0
+
+    def add_frame(self, attempts):
+        """Adds the detection attempts made on one frame.
+
+        Arguments:
+            attempts: List of (in_region, found, duration in s), one per detection run
+        """
+        self.frames += 1
+        for in_region, found, duration in attempts:
+            if in_region:
+                self.region_detections += 1
+                self.region_hits += found
+                self.region_time += duration
+            else:
+                self.full_detections += 1
+                self.full_time += duration
+        if attempts and attempts[-1][1]:
+            self.faces += 1
+
+    @property
+    def hit_rate(self):
+        """Share of the search region detections that found the face"""
+        return self.region_hits / self.region_detections if self.region_detections else None
+
+    @property
+    def face_rate(self):
+        """Share of the frames a face was found in"""
+        return self.faces / self.frames if self.frames else None
+
+    def speedup(self):
+        """Estimated speedup of the face detection over a full frame detection on every frame"""
+        if not self.full_detections:
+            return None
+        total_time = self.full_time + self.region_time
+        return self.frames * (self.full_time / self.full_detections) / total_time if total_time else None
+
+    def __str__(self):
+        def percent(value):
+            return "n/a" if value is None else f"{100 * value:.1f}%"
+
+        def milliseconds(total, count):
+            return f"{1000 * total / count:.1f} ms" if count else "n/a"
+
+        speedup = self.speedup()
+        return (f"{self.frames} frames, faces found in {percent(self.face_rate)}, "
+                f"{self.full_detections} full detections ({milliseconds(self.full_time, self.full_detections)}), "
+                f"{self.region_detections} region detections ({milliseconds(self.region_time, self.region_detections)}, "
+                f"hit rate {percent(self.hit_rate)}), "
+                f"speedup {'n/a' if speedup is None else f'{speedup:.2f}x'}")
+
+
+class FaceTracker(object):
+    """
+    This class finds the face in a frame. While the face is tracked, the HOG
+    detector only searches the region around the landmarks of the previous
+    frame, and falls back to the whole frame every redetect_interval frames,
+    when the face is not found in the region or when its detection score is
+    below min_score.
+
+    The detector runs with an adjust_threshold of 0, so every face it
+    returns scores at least 0. On the frames of outs_backup, faces fully
+    inside the region score 1.37 or more; faces cut in half by the region
+    border score 0.09 to 0.47, so they are searched in the whole frame
+    with the default min_score of 0.5.
+
+    The detector can run on a downsampled copy of the frame (scale < 1); the
+    face rectangle is mapped back to the full resolution frame, so the
+    landmarks are still predicted at full resolution.
+    """
+
+    def __init__(self, detector, tracking=True, redetect_interval=30, padding=0.3, min_score=0.5, scale=1.0):
+        """
+        Arguments:
+            detector: dlib frontal face detector
+            tracking: If false, every frame is searched entirely
+            redetect_interval: Number of frames after which the whole frame is searched again
+            padding: Margin around the landmarks of the search region, relative to their size
+            min_score: Detection score below which the face is searched in the whole frame
+            scale: Factor the frame is resized by before the detection
+        """
+        self._detector = detector
+        self.tracking = tracking
+        self.redetect_interval = redetect_interval
+        self.padding = padding
+        self.min_score = min_score
+        self.scale = scale
+        self.stats = DetectionStats()
+        self.last_attempts = []
+        self._region = None
+        self._frames_since_full_detection = 0
+
+    def _run(self, frame, in_region, left=0, top=0):
+        """Runs the detector on the frame and returns (face, score) of the best face, with
+        the face rectangle in the coordinates of the full frame the frame is cropped from"""
+        start = time.perf_counter()
+        if self.scale != 1:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        else:
+            # dlib needs a contiguous buffer, a numpy view of a region is not searched correctly
+            frame = np.ascontiguousarray(frame)
+        faces, scores, _ = self._detector.run(frame, 0, 0)
+        duration = time.perf_counter() - start
+        self.last_attempts.append((in_region, len(faces) > 0, duration))
+        if not len(faces):
+            return None, None
+
+        face = faces[0]
+        face = dlib.rectangle(int(round(face.left() / self.scale)) + left, int(round(face.top() / self.scale)) + top,
+                              int(round(face.right() / self.scale)) + left, int(round(face.bottom() / self.scale)) + top)
+        return face, scores[0]
+
+    def _detect_in_region(self, frame):
+        left, top, right, bottom = self._region
+        face, score = self._run(frame[top:bottom, left:right], True, left, top)
+        if face is None or score < self.min_score:
+            return None
+        return face
+
+    def detect(self, frame):
+        """Returns the rectangle of the face in the frame, or None.
+
+        Arguments:
+            frame (numpy.ndarray): Grayscale frame
+        """
+        self.last_attempts = []
+        face = None
+        if self.tracking and self._region is not None and self._frames_since_full_detection < self.redetect_interval:
+            face = self._detect_in_region(frame)
+            self._frames_since_full_detection += 1
+        if face is None:
+            face, _ = self._run(frame, False)
+            self._frames_since_full_detection = 0
+        self.stats.add_frame(self.last_attempts)
+        return face
+
+    def update(self, frame, landmarks, shift=(0, 0)):
+        """Sets the search region of the next frame around the landmarks.
+
+        Arguments:
+            frame (numpy.ndarray): Frame the landmarks were found in
+            landmarks (numpy.ndarray): (68, 2) array of the landmarks of the face, None if the face was lost
+            shift: Expected motion (dx, dy) of the face until the next frame
+        """
+        if landmarks is None or not self.tracking:
+            self._region = None
+            return
+        (min_x, min_y), (max_x, max_y) = landmarks.min(axis=0).tolist(), landmarks.max(axis=0).tolist()
+        dx, dy = int(round(shift[0])), int(round(shift[1]))
+        min_x, max_x, min_y, max_y = min_x + dx, max_x + dx, min_y + dy, max_y + dy
+        margin_x = int(self.padding * (max_x - min_x))
+        margin_y = int(self.padding * (max_y - min_y))
+        height, width = frame.shape[:2]
+        self._region = (max(min_x - margin_x, 0), max(min_y - margin_y, 0),
+                        min(max_x + margin_x, width), min(max_y + margin_y, height))
+        if self._region[2] <= self._region[0] or self._region[3] <= self._region[1]:
+            # The face is expected to leave the frame
+            self._region = None
+
+    def reset(self):
+        """Searches the whole frame on the next detection"""
+        self._region = None
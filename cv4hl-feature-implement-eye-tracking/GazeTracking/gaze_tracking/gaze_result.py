@@ -0,0 +1,68 @@
+from __future__ import division
+import numpy as np
+
+
+class GazeResult(object):
+    """
+    This class holds what the gaze tracking found in one frame. It is
+    immutable and only made of numbers, tuples and a small NumPy array,
+    so it is cheap to keep and to pass between processes.
+    """
+
+    __slots__ = ("frame_size", "face", "landmarks", "eye_origins", "eye_sizes",
+                 "pupils", "blinking", "valid")
+
+    def __init__(self, frame_size, face=None, landmarks=None, eye_origins=None, eye_sizes=None,
+                 pupils=None, blinking=None, valid=False):
+        """
+        Arguments:
+            frame_size: (width, height) of the frame
+            face: (left, top, right, bottom) of the face rectangle, None if no face was found
+            landmarks (numpy.ndarray): (68, 2) int32 array of the facial landmarks (x, y)
+            eye_origins: ((x, y), (x, y)) top left corners of the left and right eye frames
+            eye_sizes: ((width, height), (width, height)) of the left and right eye frames
+            pupils: ((x, y), (x, y)) of the left and right pupil in the frame, None if not located
+            blinking: (left, right) width to height ratios of the eyes
+            valid: True if both pupils were located
+        """
+        if landmarks is not None:
+            landmarks.setflags(write=False)
+        for name, value in zip(self.__slots__, (frame_size, face, landmarks, eye_origins, eye_sizes,
+                                                pupils, blinking, valid)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        return f"GazeResult(valid={self.valid}, face={self.face}, pupils={self.pupils})"
+
+    @property
+    def pupil_left(self):
+        """Coordinates (x, y) of the left pupil in the frame"""
+        return self.pupils[0] if self.valid else None
+
+    @property
+    def pupil_right(self):
+        """Coordinates (x, y) of the right pupil in the frame"""
+        return self.pupils[1] if self.valid else None
+
+    def landmark(self, number):
+        """Returns the coordinates (x, y) of a landmark as ints"""
+        x, y = self.landmarks[number]
+        return int(x), int(y)
+
+
+def landmarks_array(shape):
+    """Converts the landmarks found by dlib's shape predictor into a (n, 2) int32 array
+
+    Arguments:
+        shape (dlib.full_object_detection): Facial landmarks for the face region
+    """
+    return np.array([(point.x, point.y) for point in shape.parts()], np.int32)
@@ -1,9 +1,39 @@
 from __future__ import division
-import os
+import functools
+import threading
 import cv2
-import dlib
 from .eye import Eye
 from .calibration import Calibration
+from .face_tracker import FaceTracker
+from .smoothing import KalmanFilter
+from .gaze_result import GazeResult, landmarks_array
+from . import models
+
+
+def _per_frame(method):
+    """Caches the result of a method until the next frame is analyzed"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def cached(self):
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = method(self)
+            return value
+    return cached
+
+
+def _pupils_located(eye_left, eye_right):
+    """Check that the pupils of both eyes have been located"""
+    try:
+        int(eye_left.pupil.x)
+        int(eye_left.pupil.y)
+        int(eye_right.pupil.x)
+        int(eye_right.pupil.y)
+        return True
+    except Exception:
+        return False
 
 
 class GazeTracking(object):
@@ -11,61 +41,186 @@ class GazeTracking(object):
     This class tracks the user's gaze.
     It provides useful information like the position of the eyes
     and pupils and allows to know if the eyes are open or closed
+
+    The values derived from the analyzed frame (pupil coordinates, ratios,
+    directions) are computed once per frame and cached until the next
+    refresh().
+
+    refresh() keeps the analyzed frame on the instance, so it must be called
+    by one thread at a time. analyze() keeps nothing on the instance and can
+    be called by several threads at once, which then share the models.
     """
 
-    def __init__(self):
+    def __init__(self, face_tracking=False, redetect_interval=30, roi_padding=0.3, min_detection_score=0.5,
+                 detection_scale=1.0, subpixel=False, predict_roi=False):
+        """
+        Arguments:
+            face_tracking: If true, the face is searched around the landmarks of the previous frame
+            redetect_interval: Number of tracked frames after which the whole frame is searched again
+            roi_padding: Margin of the search region around the landmarks, relative to their size
+            min_detection_score: Detection score in the search region below which the whole frame is searched
+            detection_scale: Factor the frame is downsampled by for the face detection (landmarks
+                             are always predicted on the full resolution frame)
+            subpixel: If true, the pupil coordinates are floats instead of being truncated to ints
+            predict_roi: If true (with face_tracking), the search region follows the pupil motion
+                         predicted by a Kalman filter. The next frame is expected as long after
+                         the current one as the current one after the previous one, measured
+                         on the timestamps passed to refresh() or analyze()
+        """
         self.frame = None
         self.eye_left = None
         self.eye_right = None
         self.face = None
         self.face_landmarks = None
+        self.landmarks = None
+        self.result = None
+        self._cache = {}
         self.calibration = Calibration()
+        self.subpixel = subpixel
+
+        # _face_detector is used to detect faces (the models are loaded once per process)
+        self._face_detector = models.face_detector()
+        self._tracking_options = (face_tracking, redetect_interval, roi_padding, min_detection_score, detection_scale)
+        self._face_tracker = FaceTracker(self._face_detector, *self._tracking_options)
 
-        # _face_detector is used to detect faces
-        self._face_detector = dlib.get_frontal_face_detector()
+        # _pupil_motion predicts where the face moves to in the next frame
+        self._predict_roi = face_tracking and predict_roi
+        self._pupil_motion = KalmanFilter() if self._predict_roi else None
+
+        # Face tracker and pupil motion of every thread calling analyze()
+        self._threads = threading.local()
 
         # _predictor is used to get facial landmarks of a given face
-        cwd = os.path.abspath(os.path.dirname(__file__))
-        model_path = os.path.abspath(os.path.join(cwd, "trained_models/shape_predictor_68_face_landmarks.dat"))
-        self._predictor = dlib.shape_predictor(model_path)
+        self._predictor = models.landmark_predictor()
 
     @property
+    @_per_frame
     def pupils_located(self):
         """Check that the pupils have been located"""
-        try:
-            int(self.eye_left.pupil.x)
-            int(self.eye_left.pupil.y)
-            int(self.eye_right.pupil.x)
-            int(self.eye_right.pupil.y)
-            return True
-        except Exception:
-            return False
-
-    def _analyze(self):
-        """Detects the face and initialize Eye objects"""
-        frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
-        faces = self._face_detector(frame)
+        return _pupils_located(self.eye_left, self.eye_right)
+
+    def _locate(self, frame, calibration, face_tracker, pupil_motion, timestamp=None):
+        """Detects the face and initialize Eye objects. Only the given calibration,
+        face tracker and pupil motion are changed, not the instance.
+
+        Returns:
+            (face, face_landmarks, landmarks, eye_left, eye_right), all None but
+            the face (None as well) if no face was found
+        """
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        face = face_tracker.detect(frame)
         #breakpoint()
 
-        try:
-            self.face = faces[0] if faces else None
-            self.face_landmarks = self._predictor(frame, faces[0])
-            self.eye_left = Eye(frame, self.face_landmarks, 0, self.calibration)
-            self.eye_right = Eye(frame, self.face_landmarks, 1, self.calibration)
+        if face is None:
+            face_tracker.reset()
+            return None, None, None, None, None
 
-        except IndexError:
-            self.eye_left = None
-            self.eye_right = None
+        face_landmarks = self._predictor(frame, face)
+        # Read from dlib once, everything else works on the array
+        landmarks = landmarks_array(face_landmarks)
+        eye_left = Eye(frame, landmarks, 0, calibration, self.subpixel)
+        eye_right = Eye(frame, landmarks, 1, calibration, self.subpixel)
+        located = _pupils_located(eye_left, eye_right)
+        # Lost pupils trigger a full frame detection on the next frame
+        face_tracker.update(frame, landmarks if located else None,
+                            self._predicted_shift(pupil_motion, eye_left, eye_right, located, timestamp))
+        return face, face_landmarks, landmarks, eye_left, eye_right
 
-    def refresh(self, frame):
+    @staticmethod
+    def _predicted_shift(pupil_motion, eye_left, eye_right, located, timestamp=None):
+        """Returns the motion (dx, dy) of the pupils expected until the next frame"""
+        if pupil_motion is None:
+            return 0, 0
+        if not located:
+            pupil_motion.reset()
+            return 0, 0
+        pupils = [(eye.origin[0] + eye.pupil.x, eye.origin[1] + eye.pupil.y) for eye in (eye_left, eye_right)]
+        pupil_motion.update(pupils[0] + pupils[1], timestamp)
+        # A worker of a pool gets every n-th frame only, so the interval is measured rather than assumed
+        velocity = pupil_motion.velocity * pupil_motion.time_step
+        return (velocity[0] + velocity[2]) / 2, (velocity[1] + velocity[3]) / 2
+
+    @staticmethod
+    def _make_result(frame, face, landmarks, eye_left, eye_right):
+        """Returns the GazeResult of an analyzed frame"""
+        height, width = frame.shape[:2]
+        if face is None:
+            return GazeResult((width, height))
+
+        face = (face.left(), face.top(), face.right(), face.bottom())
+        eyes = (eye_left, eye_right)
+        eye_origins = tuple((int(eye.origin[0]), int(eye.origin[1])) for eye in eyes)
+        eye_sizes = tuple((eye.width, eye.height) for eye in eyes)
+        blinking = tuple(eye.blinking for eye in eyes)
+        valid = _pupils_located(eye_left, eye_right)
+        pupils = None
+        if valid:
+            pupils = tuple((origin[0] + eye.pupil.x, origin[1] + eye.pupil.y) for origin, eye in zip(eye_origins, eyes))
+        return GazeResult((width, height), face, landmarks, eye_origins, eye_sizes, pupils, blinking, valid)
+
+    def _thread_state(self):
+        """Returns the face tracker and the pupil motion of the calling thread"""
+        state = self._threads
+        if not hasattr(state, "face_tracker"):
+            # models.face_detector() is a copy of the detector for the calling thread
+            state.face_tracker = FaceTracker(models.face_detector(), *self._tracking_options)
+            state.pupil_motion = KalmanFilter() if self._predict_roi else None
+        return state
+
+    @property
+    def detection_stats(self):
+        """Face detection statistics (DetectionStats) of the frames analyzed so far"""
+        return self._face_tracker.stats
+
+    @property
+    def last_detection_attempts(self):
+        """Detection attempts made on the last frame, see DetectionStats.add_frame()"""
+        return self._face_tracker.last_attempts
+
+    def thread_detection_attempts(self):
+        """Detection attempts made on the last frame analyze() was called with by the calling thread"""
+        return self._thread_state().face_tracker.last_attempts
+
+    def analyze(self, frame, calibration=None, timestamp=None):
+        """Analyzes a frame without changing the instance, so several threads can
+        analyze frames at once. Each thread tracks the face over the frames it analyzes.
+
+        Arguments:
+            frame (numpy.ndarray): The frame to analyze
+            calibration: Calibration that is complete or frozen (see Calibration.freeze()),
+                         by default the frozen calibration of this instance
+            timestamp: Capture time of the frame in s, for the search region prediction
+
+        Returns:
+            The GazeResult of the frame
+        """
+        if calibration is None:
+            calibration = self.calibration.freeze()
+        elif not calibration.is_complete():
+            raise ValueError("analyze() needs a complete or frozen calibration")
+        state = self._thread_state()
+        face, _, landmarks, eye_left, eye_right = self._locate(frame, calibration, state.face_tracker,
+                                                               state.pupil_motion, timestamp)
+        return self._make_result(frame, face, landmarks, eye_left, eye_right)
+
+    def refresh(self, frame, timestamp=None):
         """Refreshes the frame and analyzes it.
 
         Arguments:
             frame (numpy.ndarray): The frame to analyze
+            timestamp: Capture time of the frame in s, for the search region prediction
+
+        Returns:
+            The GazeResult of the frame (also kept in self.result)
         """
         self.frame = frame
-        self._analyze()
+        self._cache.clear()
+        self.face, self.face_landmarks, self.landmarks, self.eye_left, self.eye_right = self._locate(
+            frame, self.calibration, self._face_tracker, self._pupil_motion, timestamp)
+        self.result = self._make_result(frame, self.face, self.landmarks, self.eye_left, self.eye_right)
+        return self.result
 
+    @_per_frame
     def pupil_left_coords(self):
         """Returns the coordinates of the left pupil"""
         if self.pupils_located:
@@ -73,6 +228,7 @@ class GazeTracking(object):
             y = self.eye_left.origin[1] + self.eye_left.pupil.y
             return (x, y)
 
+    @_per_frame
     def pupil_right_coords(self):
         """Returns the coordinates of the right pupil"""
         if self.pupils_located:
@@ -80,6 +236,7 @@ class GazeTracking(object):
             y = self.eye_right.origin[1] + self.eye_right.pupil.y
             return (x, y)
 
+    @_per_frame
     def horizontal_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
         horizontal direction of the gaze. The extreme right is 0.0,
@@ -90,6 +247,7 @@ class GazeTracking(object):
             pupil_right = self.eye_right.pupil.x / (self.eye_right.center[0] * 2 - 10)
             return (pupil_left + pupil_right) / 2
 
+    @_per_frame
     def vertical_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
         vertical direction of the gaze. The extreme top is 0.0,
@@ -100,35 +258,51 @@ class GazeTracking(object):
             pupil_right = self.eye_right.pupil.y / (self.eye_right.center[1] * 2 - 10)
             return (pupil_left + pupil_right) / 2
 
+    @_per_frame
     def is_right(self):
         """Returns true if the user is looking to the right"""
         if self.pupils_located:
             return self.horizontal_ratio() <= 0.35
 
+    @_per_frame
     def is_left(self):
         """Returns true if the user is looking to the left"""
         if self.pupils_located:
             return self.horizontal_ratio() >= 0.65
 
+    @_per_frame
     def is_center(self):
         """Returns true if the user is looking to the center"""
         if self.pupils_located:
             return self.is_right() is not True and self.is_left() is not True
 
+    @_per_frame
     def is_blinking(self):
         """Returns true if the user closes his eyes"""
         if self.pupils_located:
             blinking_ratio = (self.eye_left.blinking + self.eye_right.blinking) / 2
             return blinking_ratio > 3.8
 
+    @_per_frame
+    def direction(self):
+        """Returns "blinking", "right", "left" or "center", None if the pupils are not located"""
+        if self.pupils_located:
+            if self.is_blinking():
+                return "blinking"
+            if self.is_right():
+                return "right"
+            if self.is_left():
+                return "left"
+            return "center"
+
     def annotated_frame(self):
         """Returns the main frame with pupils highlighted"""
         frame = self.frame.copy()
 
         if self.pupils_located:
             color = (0, 200, 0)
-            x_left, y_left = self.pupil_left_coords()
-            x_right, y_right = self.pupil_right_coords()
+            x_left, y_left = [int(i) for i in self.pupil_left_coords()]
+            x_right, y_right = [int(i) for i in self.pupil_right_coords()]
             #cv2.line(frame, (x_left - 5, y_left), (x_left + 5, y_left), color, thickness=2)
             #cv2.line(frame, (x_left, y_left - 5), (x_left, y_left + 5), color, thickness=2)
             #cv2.line(frame, (x_right - 5, y_right), (x_right + 5, y_right), color, thickness=2)
@@ -0,0 +1,82 @@
+"""
+Process-wide registry of the dlib models used by GazeTracking.
+
+The models are loaded once per process, on first use or in the background
+with preload(), and shared by every GazeTracking instance. A process forked
+after loading shares the loaded models with its parent through
+copy-on-write instead of loading them again: the worker processes of the
+pool are forked from a fork server that imported preloaded_models, while
+spawned processes load their own.
+"""
+from __future__ import division
+import copy
+import os
+import threading
+import dlib
+
+LANDMARKS_MODEL_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                                    "trained_models", "shape_predictor_68_face_landmarks.dat")
+
+
+class _LazyModel(object):
+    """A model loaded by the first thread that needs it, the others wait for it"""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._loader()
+                model = self._model
+        return model
+
+    def is_loaded(self):
+        return self._model is not None
+
+
+_face_detector = _LazyModel(dlib.get_frontal_face_detector)
+_landmark_predictor = _LazyModel(lambda: dlib.shape_predictor(LANDMARKS_MODEL_PATH))
+_thread_models = threading.local()
+
+
+def face_detector():
+    """Returns the HOG face detector of the calling thread.
+
+    A dlib detector must not be used by several threads at once, so every
+    thread gets its own copy of the process-wide detector (copying takes a
+    few ms, building a detector almost a second).
+    """
+    detector = getattr(_thread_models, "face_detector", None)
+    if detector is None:
+        detector = copy.copy(_face_detector.get())
+        _thread_models.face_detector = detector
+    return detector
+
+
+def landmark_predictor():
+    """Returns the 68 landmarks shape predictor, shared by all threads"""
+    return _landmark_predictor.get()
+
+
+def is_loaded():
+    """Returns true if every model is loaded in this process"""
+    return _face_detector.is_loaded() and _landmark_predictor.is_loaded()
+
+
+def load():
+    """Loads every model now, unless it is loaded already"""
+    _face_detector.get()
+    _landmark_predictor.get()
+
+
+def preload():
+    """Starts loading the models in a background thread and returns the thread.
+    Models needed before the thread is done are waited for."""
+    thread = threading.Thread(target=load, name="model-preload", daemon=True)
+    thread.start()
+    return thread
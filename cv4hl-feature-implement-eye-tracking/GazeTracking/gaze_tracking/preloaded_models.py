@@ -0,0 +1,10 @@
+"""
+Importing this module loads every model of the process (see models.load()).
+
+The worker pool lists it as a preload module of the forkserver, so the
+models are loaded once in the fork server and the worker processes forked
+from it share them instead of loading their own copies.
+"""
+from . import models
+
+models.load()
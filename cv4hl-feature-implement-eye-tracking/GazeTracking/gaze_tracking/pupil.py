@@ -8,14 +8,32 @@ class Pupil(object):
     the position of the pupil
     """
 
-    def __init__(self, eye_frame, threshold):
+    def __init__(self, eye_frame, threshold, subpixel=False):
+        """
+        Arguments:
+            eye_frame (numpy.ndarray): Frame containing an eye and nothing else
+            threshold (int): Threshold value used to binarize the eye frame
+            subpixel: If true, x and y are the exact centroid instead of being truncated to ints
+        """
         self.iris_frame = None
         self.threshold = threshold
+        self.subpixel = subpixel
         self.x = None
         self.y = None
 
         self.detect_iris(eye_frame)
 
+    @staticmethod
+    def filter_eye_frame(eye_frame):
+        """Smooths the eye frame and erodes it, before it is binarized
+
+        Arguments:
+            eye_frame (numpy.ndarray): Frame containing an eye and nothing else
+        """
+        kernel = np.ones((3, 3), np.uint8)
+        new_frame = cv2.bilateralFilter(eye_frame, 10, 15, 15)
+        return cv2.erode(new_frame, kernel, iterations=3)
+
     @staticmethod
     def image_processing(eye_frame, threshold):
         """Performs operations on the eye frame to isolate the iris
@@ -27,13 +45,28 @@ class Pupil(object):
         Returns:
             A frame with a single element representing the iris
         """
-        kernel = np.ones((3, 3), np.uint8)
-        new_frame = cv2.bilateralFilter(eye_frame, 10, 15, 15)
-        new_frame = cv2.erode(new_frame, kernel, iterations=3)
+        new_frame = Pupil.filter_eye_frame(eye_frame)
         new_frame = cv2.threshold(new_frame, threshold, 255, cv2.THRESH_BINARY)[1]
 
         return new_frame
 
+    @staticmethod
+    def contours_centroid(iris_frame):
+        """Returns the centroid (x, y) of the second largest contour
+        of the binarized frame, or None
+
+        Arguments:
+            iris_frame (numpy.ndarray): Binarized iris frame
+        """
+        contours, _ = cv2.findContours(iris_frame, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)[-2:]
+        contours = sorted(contours, key=cv2.contourArea)
+
+        try:
+            moments = cv2.moments(contours[-2])
+            return moments['m10'] / moments['m00'], moments['m01'] / moments['m00']
+        except (IndexError, ZeroDivisionError):
+            return None
+
     def detect_iris(self, eye_frame):
         """Detects the iris and estimates the position of the iris by
         calculating the centroid.
@@ -43,13 +76,10 @@ class Pupil(object):
         """
         self.iris_frame = self.image_processing(eye_frame, self.threshold)
 
-        contours, _ = cv2.findContours(self.iris_frame, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)[-2:]
-        contours = sorted(contours, key=cv2.contourArea)
-
-        try:
-            moments = cv2.moments(contours[-2])
-            #breakpoint()
-            self.x = int(moments['m10'] / moments['m00'])
-            self.y = int(moments['m01'] / moments['m00'])
-        except (IndexError, ZeroDivisionError):
-            pass
+        centroid = self.contours_centroid(self.iris_frame)
+        #breakpoint()
+        if centroid is not None:
+            if self.subpixel:
+                self.x, self.y = float(centroid[0]), float(centroid[1])
+            else:
+                self.x, self.y = int(centroid[0]), int(centroid[1])
@@ -0,0 +1,37 @@
+from __future__ import division
+import math
+
+
+class RunningStats(object):
+    """
+    This class keeps the running mean and variance of a stream of values
+    (Welford's algorithm), to know when an estimate has converged.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        """Adds a value to the statistics"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        """Sample variance of the values added so far"""
+        if self.count < 2:
+            return float("inf")
+        return self._m2 / (self.count - 1)
+
+    def standard_error(self):
+        """Standard error of the mean"""
+        return math.sqrt(self.variance / self.count) if self.count else float("inf")
+
+    def has_converged(self, tolerance, min_count=2):
+        """Returns true if at least min_count values were added and the
+        standard error of the mean is within the tolerance"""
+        return self.count >= max(min_count, 2) and self.standard_error() <= tolerance
@@ -0,0 +1,179 @@
+from __future__ import division
+import numpy as np
+
+
+class MovingAverage(object):
+    """
+    This class smooths positions with the mean of the last window positions,
+    kept in a ring buffer with a running sum.
+    """
+
+    def __init__(self, window=3):
+        self.window = window
+        self.last_measurement = None
+        self._buffer = None
+        self._sum = None
+        self._index = 0
+        self._count = 0
+
+    def reset(self):
+        self.last_measurement = None
+        self._buffer = None
+        self._count = 0
+        self._index = 0
+
+    def update(self, position, timestamp=None):
+        """Adds a measured position and returns the smoothed position.
+
+        Arguments:
+            position: Tuple of coordinates (e.g. left_x, left_y, right_x, right_y)
+            timestamp: Time of the measurement in s, None if unknown
+        """
+        self.last_measurement = tuple(position)
+        position = np.asarray(position, dtype=float)
+        if self._buffer is None:
+            self._buffer = np.zeros((self.window, len(position)))
+            self._sum = np.zeros(len(position))
+        if self._count == self.window:
+            self._sum -= self._buffer[self._index]
+        else:
+            self._count += 1
+        self._buffer[self._index] = position
+        self._sum += position
+        self._index = (self._index + 1) % self.window
+        return tuple((self._sum / self._count).tolist())
+
+    def predict(self, timestamp=None):
+        """Returns the expected position at a time without measurement, None if there is no model of the motion"""
+        return None
+
+
+class ExponentialMovingAverage(object):
+    """
+    This class smooths positions with an exponential moving average:
+    every new position is weighted by alpha.
+    """
+
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+        self.last_measurement = None
+        self._value = None
+
+    def reset(self):
+        self.last_measurement = None
+        self._value = None
+
+    def update(self, position, timestamp=None):
+        """Adds a measured position and returns the smoothed position"""
+        self.last_measurement = tuple(position)
+        position = np.asarray(position, dtype=float)
+        if self._value is None:
+            self._value = position
+        else:
+            self._value = self._value + self.alpha * (position - self._value)
+        return tuple(self._value.tolist())
+
+    def predict(self, timestamp=None):
+        """Returns the expected position at a time without measurement, None if there is no model of the motion"""
+        return None
+
+
+class KalmanFilter(object):
+    """
+    This class tracks positions with a constant velocity Kalman filter,
+    one independent filter per coordinate. It smooths the measured positions
+    and predicts the positions of up to max_gap frames without measurement.
+
+    Time steps are taken from the timestamps, or are frame_interval long
+    when no timestamps are given. time_step is the last one.
+    """
+
+    def __init__(self, measurement_noise=2.0, acceleration_noise=300.0, frame_interval=1 / 30, max_gap=5):
+        """
+        Arguments:
+            measurement_noise: Standard deviation of the measured positions (px)
+            acceleration_noise: Standard deviation of the random acceleration (px/s^2)
+            frame_interval: Time step (s) used when the updates have no timestamps
+            max_gap: Number of frames in a row that are predicted without measurement
+        """
+        self.measurement_noise = measurement_noise
+        self.acceleration_noise = acceleration_noise
+        self.frame_interval = frame_interval
+        self.max_gap = max_gap
+        self.last_measurement = None
+        self.reset()
+
+    def reset(self):
+        self.last_measurement = None
+        self.position = None
+        self.velocity = None
+        self.time_step = self.frame_interval
+        self._timestamp = None
+        self._gap = 0
+        # Covariance of (position, velocity) of every coordinate
+        self._p00 = self._p01 = self._p11 = None
+
+    def _time_step(self, timestamp):
+        if timestamp is None or self._timestamp is None:
+            return self.frame_interval
+        return max(timestamp - self._timestamp, 0.0)
+
+    def _predict(self, timestamp):
+        dt = self.time_step = self._time_step(timestamp)
+        q = self.acceleration_noise ** 2
+        self.position = self.position + dt * self.velocity
+        self._p00 = self._p00 + dt * (2 * self._p01 + dt * self._p11) + q * dt ** 4 / 4
+        self._p01 = self._p01 + dt * self._p11 + q * dt ** 3 / 2
+        self._p11 = self._p11 + q * dt ** 2
+        if timestamp is not None:
+            self._timestamp = timestamp
+
+    def update(self, position, timestamp=None):
+        """Adds a measured position and returns the filtered position"""
+        self.last_measurement = tuple(position)
+        measurement = np.asarray(position, dtype=float)
+        self._gap = 0
+        if self.position is None:
+            self.position = measurement
+            self.velocity = np.zeros_like(measurement)
+            self._p00 = np.full_like(measurement, self.measurement_noise ** 2)
+            self._p01 = np.zeros_like(measurement)
+            # Nothing is known about the velocity yet
+            self._p11 = np.full_like(measurement, 1e4)
+            self._timestamp = timestamp
+            return tuple(self.position.tolist())
+
+        self._predict(timestamp)
+        innovation_variance = self._p00 + self.measurement_noise ** 2
+        gain_position = self._p00 / innovation_variance
+        gain_velocity = self._p01 / innovation_variance
+        innovation = measurement - self.position
+        self.position = self.position + gain_position * innovation
+        self.velocity = self.velocity + gain_velocity * innovation
+        self._p11 = self._p11 - gain_velocity * self._p01
+        self._p00 = (1 - gain_position) * self._p00
+        self._p01 = (1 - gain_position) * self._p01
+        return tuple(self.position.tolist())
+
+    def predict(self, timestamp=None):
+        """Advances the filter to a time without measurement and returns the
+        predicted position, None if there is no track or the gap is too long"""
+        if self.position is None or self._gap >= self.max_gap:
+            return None
+        self._gap += 1
+        self._predict(timestamp)
+        return tuple(self.position.tolist())
+
+
+SMOOTHERS = {
+    "moving_average": MovingAverage,
+    "ema": ExponentialMovingAverage,
+    "kalman": KalmanFilter,
+}
+
+
+def make_smoother(name="moving_average", **kwargs):
+    """Creates a smoother by name ("moving_average", "ema" or "kalman")"""
+    if name not in SMOOTHERS:
+        raise ValueError(f"Unknown smoother {name!r}, expected one of {', '.join(SMOOTHERS)}")
+    return SMOOTHERS[name](**kwargs)
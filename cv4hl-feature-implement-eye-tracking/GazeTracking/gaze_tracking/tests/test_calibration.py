@@ -0,0 +1,74 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from GazeTracking.gaze_tracking import GazeTracking
+from GazeTracking.gaze_tracking.calibration import Calibration
+from GazeTracking.gaze_tracking.pupil import Pupil
+from pipeline.archive import frame_files
+
+RECORDED_FRAMES = os.path.join(os.path.dirname(__file__), "..", "..", "..", "outs_backup")
+
+
+def binarized_iris_sizes(eye_frame, step=5):
+    """Iris size of every threshold, the way the calibration searched before the cumulative histogram"""
+    return {threshold: Calibration.iris_size(Pupil.image_processing(eye_frame, threshold))
+            for threshold in range(5, 100, step)}
+
+
+def binarized_best_threshold(eye_frame, step=5):
+    trials = binarized_iris_sizes(eye_frame, step)
+    return min(trials.items(), key=(lambda p: abs(p[1] - 0.48)))[0]
+
+
+def synthetic_eye_frames():
+    rng = np.random.default_rng(0)
+    frames = []
+    # Uniform frames: every threshold below the value is a tie (no dark pixel), and so is every one above it
+    frames += [np.full((30, 60), value, np.uint8) for value in (0, 4, 5, 37, 99, 100, 255)]
+    # Two levels, only two distinct iris sizes
+    two_levels = np.full((30, 60), 200, np.uint8)
+    two_levels[:, :29] = 40
+    frames.append(two_levels)
+    # Dark iris on a bright eye, white around the eye like the isolated eye frames
+    for radius in (4, 8, 12):
+        frame = np.full((32, 64), 255, np.uint8)
+        cv2.ellipse(frame, (32, 16), (24, 10), 0, 0, 360, 170, -1)
+        cv2.circle(frame, (30, 16), radius, 30, -1)
+        frames.append(cv2.add(frame, rng.integers(0, 20, frame.shape, np.uint8)))
+    frames += [rng.integers(0, 256, (24, 48), np.uint8) for _ in range(3)]
+    frames.append(np.tile(np.arange(0, 120, 2, dtype=np.uint8), (20, 1)))
+    return frames
+
+
+@pytest.fixture(scope="module")
+def recorded_eye_frames():
+    gaze = GazeTracking()
+    frames = []
+    for _, file_path in frame_files(RECORDED_FRAMES)[::100]:
+        gaze.refresh(cv2.imread(file_path))
+        if gaze.face is not None:
+            frames += [gaze.eye_left.frame, gaze.eye_right.frame]
+    assert frames
+    return frames
+
+
+@pytest.mark.parametrize("step", [5, 1, 7])
+def test_threshold_of_synthetic_frames_matches_the_binarized_search(step):
+    ties = 0
+    for eye_frame in synthetic_eye_frames():
+        sizes = binarized_iris_sizes(eye_frame, step)
+        best = min(abs(size - 0.48) for size in sizes.values())
+        ties += sum(abs(size - 0.48) == best for size in sizes.values()) > 1
+        assert Calibration.find_best_threshold(eye_frame, step) == binarized_best_threshold(eye_frame, step)
+    # The lowest of the tied thresholds is taken, as before
+    assert ties >= 5
+
+
+def test_threshold_of_recorded_frames_matches_the_binarized_search(recorded_eye_frames):
+    for eye_frame in recorded_eye_frames:
+        for step in (5, 1):
+            assert Calibration.find_best_threshold(eye_frame, step) == binarized_best_threshold(eye_frame, step)
+
@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+import pytest
+
+from GazeTracking.gaze_tracking.eye import Eye
+
+HEIGHT, WIDTH = 120, 160
+
+
+def isolate_full_frame(frame, landmarks, points):
+    """Former Eye._isolate: masks the whole frame, then crops the eye"""
+    region = landmarks[points]
+
+    height, width = frame.shape[:2]
+    black_frame = np.zeros((height, width), np.uint8)
+    mask = np.full((height, width), 255, np.uint8)
+    cv2.fillPoly(mask, [region], (0, 0, 0))
+    eye = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
+
+    margin = 5
+    min_x = np.min(region[:, 0]) - margin
+    max_x = np.max(region[:, 0]) + margin
+    min_y = np.min(region[:, 1]) - margin
+    max_y = np.max(region[:, 1]) + margin
+    return eye[min_y:max_y, min_x:max_x], (min_x, min_y)
+
+
+def isolate_crop_first(frame, landmarks, points):
+    eye = Eye.__new__(Eye)
+    eye._isolate(frame, landmarks, points)
+    return eye.frame, eye.origin
+
+
+def eye_landmarks(center_x, center_y, width=30, height=10):
+    """Landmarks with both eyes at the given center, shaped like the 68 point eye contours"""
+    dx, dy = width // 2, height // 2
+    contour = [(-dx, 0), (-dx // 3, -dy), (dx // 3, -dy), (dx, 0), (dx // 3, dy), (-dx // 3, dy)]
+    landmarks = np.zeros((68, 2), np.int32)
+    for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS):
+        landmarks[points] = [(center_x + x, center_y + y) for x, y in contour]
+    return landmarks
+
+
+# Eye centers inside, touching and crossing every border, in the corners and outside the frame
+CENTERS = [(80, 60), (15, 60), (20, 60), (5, 60), (0, 60), (-10, 60), (145, 60), (140, 60), (155, 60), (160, 60),
+           (175, 60), (80, 5), (80, 10), (80, 0), (80, -5), (80, 115), (80, 110), (80, 120), (80, 130), (0, 0),
+           (-3, -3), (160, 120), (163, 124), (-20, 60), (200, 200), (-100, -100)]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return np.random.default_rng(0).integers(0, 256, (HEIGHT, WIDTH), np.uint8)
+
+
+@pytest.mark.parametrize("center", CENTERS)
+def test_isolation_matches_the_full_frame_mask(frame, center):
+    landmarks = eye_landmarks(*center)
+    for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS):
+        expected, expected_origin = isolate_full_frame(frame, landmarks, points)
+        eye, origin = isolate_crop_first(frame, landmarks, points)
+
+        assert eye.shape == expected.shape and eye.dtype == expected.dtype
+        assert np.array_equal(eye, expected)
+        assert tuple(origin) == tuple(expected_origin)
+
+
+def test_isolation_of_random_eyes_matches_the_full_frame_mask(frame):
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        landmarks = rng.integers(-30, 190, (68, 2)).astype(np.int32)
+        # Eye contours of any shape, around a point near the frame
+        landmarks[36:48] = landmarks[36:48] // 8 + rng.integers(-20, 180, 2)
+        for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS):
+            expected, expected_origin = isolate_full_frame(frame, landmarks, points)
+            eye, origin = isolate_crop_first(frame, landmarks, points)
+
+            assert np.array_equal(eye, expected) and eye.shape == expected.shape
+            assert tuple(origin) == tuple(expected_origin)
+
+
+def test_eye_is_masked_inside_its_crop(frame):
+    eye, origin = isolate_crop_first(frame, eye_landmarks(80, 60), Eye.LEFT_EYE_POINTS)
+
+    assert origin == (60, 50)
+    assert eye.shape == (20, 40)
+    # The corners of the crop are outside the eye polygon, its center inside
+    assert eye[0, 0] == eye[-1, -1] == 255
+    assert eye[10, 20] == frame[60, 80]
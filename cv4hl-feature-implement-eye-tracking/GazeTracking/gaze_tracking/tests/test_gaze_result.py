@@ -0,0 +1,72 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from GazeTracking.gaze_tracking.gaze_result import GazeResult, landmarks_array
+
+
+def make_result():
+    landmarks = np.arange(136, dtype=np.int32).reshape(68, 2)
+    return GazeResult((1280, 720), (100, 50, 300, 250), landmarks, ((120, 100), (220, 100)), ((40, 20), (40, 20)),
+                      ((130.5, 110.0), (230.0, 111.0)), (4.1, 3.9), True)
+
+
+def test_attributes_cannot_be_changed():
+    result = make_result()
+    with pytest.raises(AttributeError):
+        result.valid = False
+    with pytest.raises(AttributeError):
+        result.extra = 1
+    with pytest.raises(AttributeError):
+        del result.face
+
+
+def test_landmarks_are_read_only():
+    result = make_result()
+    with pytest.raises(ValueError):
+        result.landmarks[0, 0] = 1
+
+
+def test_pickling_keeps_every_value():
+    result = make_result()
+    copy = pickle.loads(pickle.dumps(result))
+
+    for name in GazeResult.__slots__:
+        if name == "landmarks":
+            np.testing.assert_array_equal(copy.landmarks, result.landmarks)
+        else:
+            assert getattr(copy, name) == getattr(result, name)
+    assert not copy.landmarks.flags.writeable
+    with pytest.raises(AttributeError):
+        copy.valid = False
+
+
+def test_pupils_and_landmarks():
+    result = make_result()
+    assert result.pupil_left == (130.5, 110.0)
+    assert result.pupil_right == (230.0, 111.0)
+    assert result.landmark(27) == (54, 55)
+    assert type(result.landmark(27)[0]) is int
+
+
+def test_result_without_face():
+    result = pickle.loads(pickle.dumps(GazeResult((640, 480))))
+    assert result.frame_size == (640, 480)
+    assert result.face is None and result.landmarks is None
+    assert not result.valid
+    assert result.pupil_left is None and result.pupil_right is None
+
+
+def test_landmarks_array():
+    class Part:
+        def __init__(self, x, y):
+            self.x, self.y = x, y
+
+    class Shape:
+        def parts(self):
+            return [Part(i, 2 * i) for i in range(68)]
+
+    landmarks = landmarks_array(Shape())
+    assert landmarks.shape == (68, 2) and landmarks.dtype == np.int32
+    assert landmarks[10].tolist() == [10, 20]
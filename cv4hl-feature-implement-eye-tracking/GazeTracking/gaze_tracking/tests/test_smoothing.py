@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from GazeTracking.gaze_tracking.smoothing import (ExponentialMovingAverage, KalmanFilter, MovingAverage, SMOOTHERS,
+                                                  make_smoother)
+
+
+def test_moving_average_is_the_mean_of_the_last_window_positions():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-100, 100, (50, 4))
+    smoother = MovingAverage(3)
+
+    for i, position in enumerate(positions):
+        smoothed = smoother.update(tuple(position))
+        # The running sum is not bit-identical to a fresh mean, only close to it
+        assert smoothed == pytest.approx(tuple(positions[max(i - 2, 0):i + 1].mean(axis=0)), rel=1e-12, abs=1e-12)
+    assert smoother.last_measurement == tuple(positions[-1])
+
+
+def test_moving_average_running_sum_does_not_drift():
+    rng = np.random.default_rng(1)
+    smoother = MovingAverage(5)
+    for position in rng.uniform(-1000, 1000, (100000, 2)):
+        smoother.update(position)
+    last = [(1.0, 2.0), (3.0, 4.0), (5.0, 6.0), (7.0, 8.0), (9.0, 10.0)]
+    for position in last:
+        smoothed = smoother.update(position)
+
+    assert smoothed == pytest.approx((5.0, 6.0), abs=1e-8)
+
+
+def test_moving_average_reset():
+    smoother = MovingAverage(3)
+    smoother.update((10.0, 10.0))
+    smoother.reset()
+
+    assert smoother.last_measurement is None
+    assert smoother.update((1.0, 2.0)) == (1.0, 2.0)
+    assert smoother.predict() is None
+
+
+def test_exponential_moving_average():
+    smoother = ExponentialMovingAverage(alpha=0.25)
+    assert smoother.update((8.0,)) == (8.0,)
+    assert smoother.update((0.0,)) == (6.0,)
+    assert smoother.update((6.0,)) == (6.0,)
+    smoother.reset()
+    assert smoother.update((1.0,)) == (1.0,)
+
+
+def test_kalman_filter_converges_on_a_still_position():
+    smoother = KalmanFilter()
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        smoothed = smoother.update(tuple(rng.normal((10.0, -5.0), 2.0)))
+
+    assert smoothed == pytest.approx((10.0, -5.0), abs=1.0)
+    assert smoother.velocity == pytest.approx((0.0, 0.0), abs=5.0)
+
+
+def test_kalman_filter_follows_a_constant_velocity_from_the_timestamps():
+    smoother = KalmanFilter(measurement_noise=0.5)
+    # 60 px/s, sampled irregularly
+    timestamps = np.cumsum(np.tile([0.02, 0.05, 0.03], 40))
+    for timestamp in timestamps:
+        smoother.update((60.0 * timestamp, 0.0), timestamp)
+
+    assert smoother.velocity == pytest.approx((60.0, 0.0), abs=1.0)
+    assert smoother.time_step == pytest.approx(0.03)
+    predicted = smoother.predict(timestamps[-1] + 0.1)
+    assert predicted == pytest.approx((60.0 * (timestamps[-1] + 0.1), 0.0), abs=0.5)
+
+
+def test_kalman_filter_uses_the_frame_interval_without_timestamps():
+    smoother = KalmanFilter(frame_interval=0.5)
+    for i in range(50):
+        smoother.update((float(i),))
+
+    # One px per frame of 0.5 s
+    assert smoother.time_step == 0.5
+    assert smoother.velocity[0] == pytest.approx(2.0, abs=0.05)
+
+
+def test_kalman_filter_predicts_short_gaps_only():
+    smoother = KalmanFilter(max_gap=2)
+    assert smoother.predict() is None
+    smoother.update((1.0, 1.0))
+
+    assert smoother.predict() is not None
+    assert smoother.predict() is not None
+    assert smoother.predict() is None
+    smoother.update((1.0, 1.0))
+    assert smoother.predict() is not None
+
+
+def test_make_smoother():
+    assert isinstance(make_smoother("kalman", max_gap=3), KalmanFilter)
+    assert make_smoother("moving_average", window=4).window == 4
+    assert set(SMOOTHERS) == {"moving_average", "ema", "kalman"}
+    with pytest.raises(ValueError):
+        make_smoother("median")
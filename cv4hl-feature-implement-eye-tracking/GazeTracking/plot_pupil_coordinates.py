@@ -1,5 +1,6 @@
 import csv
 from dataclasses import dataclass
+import sys
 import time
 
 import matplotlib.pyplot as plt
@@ -46,12 +47,23 @@ def read_row(row):
     return left_pupil, right_pupil, left_eye, right_eye
 
 
+def read_data_row(row, status_column):
+    # Rows of a data.csv file written by main.py, None for the rows without measured pupils
+    # (dropped, predicted and not_valid)
+    if row[status_column].strip() != 'valid':
+        return None
+    left_pupil = Pupil(*[float(i) for i in row[:2]])
+    right_pupil = Pupil(*[float(i) for i in row[2:4]])
+    return left_pupil, right_pupil
+
 
 def read_and_plot_coordinates(file_path):
     # Read the CSV file
     with open(file_path, 'r') as file:
         reader = csv.reader(file)
-        next(reader)  # Skip the header row
+        header = [name.strip() for name in next(reader)]
+        # data.csv files have a status column instead of the eye rectangles
+        status_column = header.index('valid') if 'valid' in header else None
 
         # Create a new figure and axis
         fig, ax = plt.subplots()
@@ -66,7 +78,13 @@ def read_and_plot_coordinates(file_path):
         # Iterate over each line in the CSV file
         for row in reader:
             # Append new coordinates to the lists
-            left_pupil, right_pupil, left_eye, right_eye = read_row(row)
+            if status_column is None:
+                left_pupil, right_pupil, left_eye, right_eye = read_row(row)
+            else:
+                pupils = read_data_row(row, status_column)
+                if pupils is None:
+                    continue
+                left_pupil, right_pupil = pupils
             #breakpoint()
             left_pupil_x.append(left_pupil.x)
             left_pupil_y.append(left_pupil.y)
@@ -94,8 +112,8 @@ def read_and_plot_coordinates(file_path):
 
 
 if __name__ == '__main__':
-    # Define the file path
-    file_path = 'pupil_coordinates.csv'
+    # Define the file path (pupil_coordinates.csv or a data.csv file)
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'pupil_coordinates.csv'
 
     # Read and plot the coordinates from the CSV file
     read_and_plot_coordinates(file_path)
\ No newline at end of file
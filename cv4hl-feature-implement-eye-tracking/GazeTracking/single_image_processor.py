@@ -3,6 +3,7 @@ import os
 from dataclasses import dataclass
 
 from GazeTracking.gaze_tracking import GazeTracking
+from GazeTracking.gaze_tracking.smoothing import MovingAverage
 from led_point.point import Point
 
 @dataclass
@@ -23,63 +24,122 @@ class Landmark:
     y: float    
 
 class SingleImageProcessor:
-    def __init__(self, data_file_path):
-        self.gaze = GazeTracking()
+    def __init__(self, data_file_path, smoother=None, sink=None, **gaze_options):
+        # gaze_options are passed on to GazeTracking (e.g. face_tracking, redetect_interval)
+        self.gaze_options = gaze_options
+        self.gaze = GazeTracking(**gaze_options)
         self.data_file_path = data_file_path
-        self.previous_positions = []
+        # Smooths the pupil positions over the frames (see gaze_tracking.smoothing)
+        self.smoother = smoother if smoother is not None else MovingAverage(3)
         self.img_height = None
         self.img_width = None
+        self.timestamp = None
+        self.sequence = 0
         self.calib_left = None
         self.calib_right = None
-        # Create an empty data file
-        with open(data_file_path, 'w') as file:
-            file.write("left_pupil_x,left_pupil_y,right_pupil_x,right_pupil_y,valid,led_x,led_y\n")
+        # The rows go to a sink with a write(row) method, created by the application for
+        # data_file_path (see pipeline.result_sink). Worker processes only analyze and pass neither.
+        if sink is None and data_file_path is not None:
+            raise ValueError(f"No sink given to write the rows to {data_file_path}")
+        self.sink = sink
 
     def set_calibration(self, left_x, left_y, right_x, right_y):
         self.calib_left = Pupil(left_x, left_y)
         self.calib_right = Pupil(right_x, right_y)
 
     def read_image(self, image_path):
-        self.image = cv2.imread(image_path)
+        self.set_image(cv2.imread(image_path))
+
+    def set_image(self, frame):
+        self.image = frame
         self.img_height, self.img_width, _ = self.image.shape
 
     def process_without_writing(self, image_path, led_point: Point):
         self.read_image(image_path)
-        self.gaze.refresh(self.image)
-        if self.prediction_is_valid():
-            try:
-                left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y = self.pupil_position_relative_to_lm27(self.gaze)
-                return True, left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y
-            except Exception as e:
-                print(f"Error processing image: {e}")
+        return self._analyze_without_writing(led_point)
+
+    def process_frame_without_writing(self, frame, led_point: Point):
+        self.set_image(frame)
+        return self._analyze_without_writing(led_point)
+
+    def _analyze_without_writing(self, led_point: Point):
+        valid, *position = self.relative_position(self.analyze_frame(self.image))
+        if valid:
+            return (True, *self.smooth_position(position))
         return False, None, None, None, None
 
     def process(self, image_path, led_point: Point):
         self.read_image(image_path)
-        self.gaze.refresh(self.image)
+        return self.record(self.relative_position(self.analyze_frame(self.image)), led_point)
+
+    def process_frame(self, frame, led_point: Point, timestamp=None):
+        return self.record(self.relative_position(self.analyze_frame(frame, timestamp)), led_point, timestamp=timestamp)
+
+    def analyze_frame(self, frame, timestamp=None):
+        """Runs the gaze tracking on a frame and returns its GazeResult. Keeps no smoothing
+        state, so frames can be analyzed in any order (e.g. by a worker pool)."""
+        self.set_image(frame)
+        return self.gaze.refresh(self.image, timestamp)
+
+    def relative_position(self, result):
+        """Returns (valid, left_x, left_y, right_x, right_y) with the unsmoothed pupil
+        positions of a GazeResult relative to landmark 27"""
         #breakpoint()
-        if self.prediction_is_valid():
-            try:
-                left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y = self.pupil_position_relative_to_lm27(self.gaze)
-                led_point_cart = Point(led_point.x, 1080 - led_point.y)
-                with open(self.data_file_path, 'a') as file:
-                    file.write(f'{left_pupil_x},{left_pupil_y},{right_pupil_x},{right_pupil_y}, valid,{led_point_cart.x},{led_point_cart.y}\n')
-                return True
-            except Exception as e:
-                print(f"Error processing image: {e}")
-        try:
-            with open(self.data_file_path, 'a') as file:
-                #breakpoint()
-                file.write(f'{self.previous_positions[-1][0]},{self.previous_positions[-1][1]},{self.previous_positions[-1][2]},{self.previous_positions[-1][3]}, not_valid, {led_point.x}, {led_point.y}\n')
-        except Exception as e:
-            print(f"Error processing image: {e}")
-        return False
+        if self.prediction_is_valid(result):
+            return (True, *self.raw_position_relative_to_lm27(result))
+        return False, None, None, None, None
 
-    def prediction_is_valid(self):
-        if self.get_pupil_left is not None and self.get_pupil_right is not None and self.get_face is not None:
+    def record(self, analysis, led_point: Point, sequence=None, timestamp=None):
+        """Smooths the result of analyze_frame and appends it to the sink.
+        Must be called in capture order."""
+        if sequence is None:
+            sequence = self.sequence
+        self.sequence = sequence + 1
+        self.timestamp = timestamp
+
+        valid, *position = analysis
+        if valid:
+            left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y = self.smooth_position(position, self.timestamp)
+            led_point_cart = Point(led_point.x, 1080 - led_point.y)
+            self.sink.write((left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y, 'valid',
+                             led_point_cart.x, led_point_cart.y, sequence, timestamp))
             return True
+        # Short gaps are filled with the position predicted by the smoother, if it predicts
+        predicted = self.smoother.predict(self.timestamp)
+        if predicted is not None:
+            left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y = predicted
+            led_point_cart = Point(led_point.x, 1080 - led_point.y)
+            self.sink.write((left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y, 'predicted',
+                             led_point_cart.x, led_point_cart.y, sequence, timestamp))
+            return False
+        # The last measured position is repeated, NaN until a pupil has been measured
+        last = self.smoother.last_measurement
+        if last is None:
+            last = (float('nan'),) * 4
+        self.sink.write((last[0], last[1], last[2], last[3], 'not_valid', led_point.x, led_point.y, sequence, timestamp))
         return False
 
+    def record_dropped(self, led_point: Point, sequence=None, timestamp=None):
+        """Appends a gap row for a frame that was dropped before processing.
+        The LED position is NaN if led_point is None (frame never captured)."""
+        if sequence is None:
+            sequence = self.sequence
+        self.sequence = sequence + 1
+
+        nan = float('nan')
+        led_point_cart = Point(nan, nan) if led_point is None else Point(led_point.x, 1080 - led_point.y)
+        self.sink.write((nan, nan, nan, nan, 'dropped', led_point_cart.x, led_point_cart.y, sequence, timestamp))
+
+    def close(self):
+        """Writes the rows still buffered and closes the data file"""
+        if self.sink is not None:
+            self.sink.close()
+
+    def prediction_is_valid(self, result=None):
+        if result is None:
+            result = self.gaze.result
+        return result is not None and result.valid and result.face is not None
+
 
     def show_frame(self):
         frame = self.gaze.annotated_frame()
@@ -114,27 +174,27 @@ class SingleImageProcessor:
         return self.gaze.face
     
     def pupil_position_relative_to_lm27(self, gaze):
-        left_pupil = self.get_pupil_left()
-        right_pupil = self.get_pupil_right()
-        lm27 = self.get_landmarks(27)
+        return self.smooth_position(self.raw_position_relative_to_lm27())
+
+    def raw_position_relative_to_lm27(self, result=None):
+        if result is None:
+            result = self.gaze.result
+        left_pupil = result.pupil_left
+        right_pupil = result.pupil_right
+        lm27 = result.landmark(27)
+        img_height = result.frame_size[1]
 
         # convert from image coordinates to cartesian coordinates
-        left_pupil = Pupil(left_pupil[0], self.img_height - left_pupil[1])
-        right_pupil = Pupil(right_pupil[0], self.img_height - right_pupil[1])
-        lm27 = Landmark(lm27.x, self.img_height - lm27.y)
+        left_pupil = Pupil(left_pupil[0], img_height - left_pupil[1])
+        right_pupil = Pupil(right_pupil[0], img_height - right_pupil[1])
+        lm27 = Landmark(lm27[0], img_height - lm27[1])
 
         left_pupil_x = left_pupil.x - lm27.x
         left_pupil_y = left_pupil.y - lm27.y
         right_pupil_x = right_pupil.x - lm27.x
         right_pupil_y = right_pupil.y - lm27.y
 
-        self.previous_positions.append((left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y))
-        if len(self.previous_positions) > 3:
-            self.previous_positions.pop(0)
-
-        mean_left_pupil_x = sum([pos[0] for pos in self.previous_positions]) / len(self.previous_positions)
-        mean_left_pupil_y = sum([pos[1] for pos in self.previous_positions]) / len(self.previous_positions)
-        mean_right_pupil_x = sum([pos[2] for pos in self.previous_positions]) / len(self.previous_positions)
-        mean_right_pupil_y = sum([pos[3] for pos in self.previous_positions]) / len(self.previous_positions)
+        return left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y
 
-        return mean_left_pupil_x, mean_left_pupil_y, mean_right_pupil_x, mean_right_pupil_y
+    def smooth_position(self, position, timestamp=None):
+        return self.smoother.update(position, timestamp)
@@ -0,0 +1,57 @@
+import math
+
+import pytest
+
+from GazeTracking.single_image_processor import SingleImageProcessor
+from led_point.point import Point
+from pipeline.result_sink import ResultSink
+
+NOT_VALID = (False, None, None, None, None)
+
+
+class ListSink(ResultSink):
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+
+class FailingSink(ResultSink):
+    def write(self, row):
+        raise RuntimeError("Writing the rows to data.csv failed")
+
+
+@pytest.fixture(scope="module")
+def image_processor():
+    return SingleImageProcessor(None)
+
+
+@pytest.fixture
+def sink(image_processor):
+    image_processor.smoother.reset()
+    image_processor.sink = ListSink()
+    return image_processor.sink
+
+
+def test_not_valid_frames_before_a_measurement_are_written(image_processor, sink):
+    image_processor.record(NOT_VALID, Point(10, 20), 0, 0.0)
+    image_processor.record(NOT_VALID, Point(10, 20), 1, 0.1)
+
+    assert [row[4] for row in sink.rows] == ["not_valid", "not_valid"]
+    assert [row[7] for row in sink.rows] == [0, 1]
+    assert all(math.isnan(value) for value in sink.rows[0][:4])
+
+
+def test_not_valid_frames_repeat_the_last_measurement(image_processor, sink):
+    image_processor.record((True, 1.0, 2.0, 3.0, 4.0), Point(10, 20), 0, 0.0)
+    image_processor.record(NOT_VALID, Point(10, 20), 1, 0.1)
+
+    assert sink.rows[1][:5] == (1.0, 2.0, 3.0, 4.0, "not_valid")
+
+
+def test_sink_errors_are_raised_for_not_valid_frames(image_processor):
+    image_processor.smoother.reset()
+    image_processor.sink = FailingSink()
+    with pytest.raises(RuntimeError):
+        image_processor.record(NOT_VALID, Point(10, 20), 0, 0.0)
@@ -0,0 +1,156 @@
+"""
+Offline analysis of a recorded session. The session is loaded once and every
+derived series (pupil velocities, angles relative to the LED) is computed on
+whole arrays, independently of how it is plotted.
+
+Usage: python analysis.py outs_backup/data.csv --calibration outs_backup/calibration.csv
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from pipeline.session_file import (DROPPED, SCREEN_SIZE, SESSION_EXTENSION, SessionFile, read_calibration_file,
+                                   read_data_file)
+
+
+def pupil_velocity(x, y):
+    """Returns the distance (px/frame) moved since the previous sample, 0 for the first one"""
+    velocity = np.zeros(len(x))
+    velocity[1:] = np.hypot(np.diff(x), np.diff(y))
+    return velocity
+
+
+def unwrapped_angle(y, x):
+    """Returns the angles of the vectors (x, y), continuous over the samples
+    instead of jumping by 2 pi. Samples without a position (NaN) stay NaN and
+    do not interrupt the unwrapping."""
+    angle = np.arctan2(y, x)
+    finite = np.isfinite(angle)
+    angle[finite] = np.unwrap(angle[finite])
+    return angle
+
+
+def lttb(x, y, num_points):
+    """Downsamples a series for display with Largest-Triangle-Three-Buckets: the first
+    and last points are kept and, in each of num_points - 2 buckets in between, the
+    point forming the largest triangle with the point kept before and the mean of the
+    next bucket. Points with NaN coordinates are left out.
+
+    Returns:
+        (x, y) of the points kept
+    """
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = np.asarray(x)[finite], np.asarray(y)[finite]
+    n = len(x)
+    if num_points >= n or num_points < 3:
+        return x, y
+
+    # Bucket b spans edges[b]:edges[b + 1], the last bucket is the last point
+    edges = np.append(np.linspace(1, n - 1, num_points - 1).astype(int), n)
+    # The bucket means do not depend on the points kept
+    counts = np.diff(edges)
+    means_x = np.add.reduceat(x, edges[:-1]) / counts
+    means_y = np.add.reduceat(y, edges[:-1]) / counts
+    kept = np.empty(num_points, int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for b in range(num_points - 2):
+        start, stop = edges[b], edges[b + 1]
+        area = np.abs((x[a] - means_x[b + 1]) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (means_y[b + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        kept[b + 1] = a
+    return x[kept], y[kept]
+
+
+def rolling_mean(values, window):
+    """Returns the mean of the last window values (fewer at the start) for every sample"""
+    sums = np.cumsum(values, dtype=float)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+class SessionAnalysis:
+    """
+    Derived series of a session, one value per processed frame (dropped
+    frames are left out). Every attribute is a NumPy array.
+
+    The angle differences compare the direction of each pupil from its
+    calibrated position with the direction of the LED from the screen
+    center; they are None if the session has no calibration.
+    """
+
+    def __init__(self, samples, calibration=None, screen_size=SCREEN_SIZE):
+        """
+        Arguments:
+            samples: Structured array of samples (see pipeline.session_file.SAMPLE_DTYPE)
+            calibration: Calibrated pupil positions (left_x, left_y, right_x, right_y), None if unknown
+            screen_size: (width, height) of the LED display
+        """
+        samples = samples[samples["status"] != DROPPED]
+        self.calibration = calibration
+        self.screen_size = screen_size
+        self.timestamp = np.asarray(samples["timestamp"])
+        self.sequence = np.asarray(samples["sequence"])
+        self.status = np.asarray(samples["status"])
+        self.left_x = np.asarray(samples["left_pupil_x"])
+        self.left_y = np.asarray(samples["left_pupil_y"])
+        self.right_x = np.asarray(samples["right_pupil_x"])
+        self.right_y = np.asarray(samples["right_pupil_y"])
+        self.led_x = np.asarray(samples["led_x"])
+        self.led_y = np.asarray(samples["led_y"])
+
+        self.velocity_left = pupil_velocity(self.left_x, self.left_y)
+        self.velocity_right = pupil_velocity(self.right_x, self.right_y)
+        self.led_angle = unwrapped_angle(self.led_y - screen_size[1] / 2, self.led_x - screen_size[0] / 2)
+
+        self.left_angle = self.right_angle = None
+        self.left_angle_diff = self.right_angle_diff = None
+        if calibration is not None:
+            left_x, left_y, right_x, right_y = calibration
+            self.left_angle = unwrapped_angle(self.left_y - left_y, self.left_x - left_x)
+            self.right_angle = unwrapped_angle(self.right_y - right_y, self.right_x - right_x)
+            self.left_angle_diff = self.left_angle - self.led_angle
+            self.right_angle_diff = self.right_angle - self.led_angle
+
+    def __len__(self):
+        return len(self.sequence)
+
+
+def load(path, calibration_file_path=None):
+    """Loads a session file, or a data.csv file with its calibration.csv, and analyzes it
+
+    Arguments:
+        path: Session file (.gaze) or data.csv file
+        calibration_file_path: calibration.csv of a data.csv file, by default the
+                               calibration.csv next to it if there is one
+    """
+    if path.endswith(SESSION_EXTENSION):
+        with SessionFile(path) as session:
+            return SessionAnalysis(session.samples, session.calibration, session.screen_size)
+
+    if calibration_file_path is None:
+        calibration_file_path = os.path.join(os.path.dirname(path), "calibration.csv")
+    calibration, screen_size = None, None
+    if os.path.exists(calibration_file_path):
+        calibration, screen_size = read_calibration_file(calibration_file_path)
+    screen_size = screen_size or SCREEN_SIZE
+    return SessionAnalysis(read_data_file(path, screen_size[1]), calibration, screen_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyzes a recorded session.")
+    parser.add_argument('session', help=f'Session file ({SESSION_EXTENSION}) or data.csv file')
+    parser.add_argument('--calibration', help='calibration.csv of a data.csv file')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    analysis = load(args.session, args.calibration)
+    elapsed = time.perf_counter() - start
+    print(f"{len(analysis)} samples analyzed in {1000 * elapsed:.1f} ms")
+    print(f"mean velocity: left {np.nanmean(analysis.velocity_left):.2f} px/frame, "
+          f"right {np.nanmean(analysis.velocity_right):.2f} px/frame")
+    if analysis.left_angle_diff is not None:
+        print(f"mean angle difference: left {np.nanmean(analysis.left_angle_diff):.3f} rad, "
+              f"right {np.nanmean(analysis.right_angle_diff):.3f} rad")
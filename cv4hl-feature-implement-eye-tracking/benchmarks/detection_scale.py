@@ -0,0 +1,84 @@
+"""
+Compares the face detection on downsampled frames with the detection at full
+resolution: time of a detection against the error of the landmarks and of the
+pupils, which are always located on the full resolution frame.
+
+Usage: python -m benchmarks.detection_scale [--frames outs_backup] [--scales 1 0.5 0.35]
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+from GazeTracking.gaze_tracking import GazeTracking
+from pipeline.archive import frame_files
+
+
+def landmark_array(gaze):
+    return np.array([(point.x, point.y) for point in gaze.face_landmarks.parts()])
+
+
+def run(files, scale):
+    """Analyzes the frames with a full detection on every frame, returns the
+    gaze tracking (for its statistics) and the landmarks and pupils of every
+    frame (None where no face was found)"""
+    gaze = GazeTracking(face_tracking=False, detection_scale=scale)
+    results = []
+    for file_path in files:
+        gaze.refresh(cv2.imread(file_path))
+        if gaze.face is None:
+            results.append(None)
+            continue
+        pupils = (gaze.pupil_left_coords(), gaze.pupil_right_coords()) if gaze.pupils_located else None
+        results.append((landmark_array(gaze), pupils))
+    return gaze, results
+
+
+def compare(results, reference):
+    """Returns the mean and max landmark error and the mean pupil error (in px)
+    over the frames both runs found a face in"""
+    landmark_errors = []
+    pupil_errors = []
+    for result, expected in zip(results, reference):
+        if result is None or expected is None:
+            continue
+        landmark_errors.append(np.hypot(*(result[0] - expected[0]).T))
+        if result[1] is not None and expected[1] is not None:
+            pupil_errors.append(np.hypot(*(np.array(result[1]) - np.array(expected[1])).T))
+    landmark_errors = np.concatenate(landmark_errors) if landmark_errors else np.array([np.nan])
+    pupil_error = np.mean(pupil_errors) if pupil_errors else np.nan
+    return landmark_errors.mean(), landmark_errors.max(), pupil_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the face detection scale factor on recorded frames.")
+    parser.add_argument('--frames', default='outs_backup', help='Directory of frame_*.jpg files')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument('--limit', type=int, default=200, help='Number of frames used (0 for all)')
+    args = parser.parse_args()
+
+    files = [file_path for _, file_path in frame_files(args.frames)]
+    if args.limit:
+        files = files[:args.limit]
+    if not files:
+        raise SystemExit(f"No frames found in {args.frames}")
+
+    scales = [1.0] + [scale for scale in args.scales if scale != 1.0]
+    print(f"{len(files)} frames from {args.frames}")
+    print(f"{'scale':>6} {'detection':>10} {'speedup':>8} {'faces':>7} "
+          f"{'landmark err':>13} {'max':>6} {'pupil err':>10}")
+    reference = None
+    reference_time = None
+    for scale in scales:
+        gaze, results = run(files, scale)
+        stats = gaze.detection_stats
+        detection_time = stats.full_time / stats.full_detections
+        if reference is None:
+            reference, reference_time = results, detection_time
+        mean_error, max_error, pupil_error = compare(results, reference)
+        print(f"{scale:>6.2f} {1000 * detection_time:>7.1f} ms {reference_time / detection_time:>7.2f}x "
+              f"{100 * stats.face_rate:>6.1f}% {mean_error:>10.2f} px {max_error:>6.1f} {pupil_error:>7.2f} px")
+
+
+if __name__ == "__main__":
+    main()
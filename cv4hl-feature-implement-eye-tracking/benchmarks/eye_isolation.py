@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of Eye._isolate against the former implementation, which
+masked the whole frame before cropping the eye. Also checks that both give
+bit-identical eye frames and origins.
+
+Usage: python -m benchmarks.eye_isolation [--frames outs_backup] [--limit 50] [--repeat 20]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from GazeTracking.gaze_tracking import GazeTracking
+from GazeTracking.gaze_tracking.eye import Eye
+from pipeline.archive import frame_files
+
+
+def isolate_full_frame(frame, landmarks, points):
+    """Former Eye._isolate: masks the whole frame, then crops the eye"""
+    region = landmarks[points]
+
+    height, width = frame.shape[:2]
+    black_frame = np.zeros((height, width), np.uint8)
+    mask = np.full((height, width), 255, np.uint8)
+    cv2.fillPoly(mask, [region], (0, 0, 0))
+    eye = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
+
+    margin = 5
+    min_x = np.min(region[:, 0]) - margin
+    max_x = np.max(region[:, 0]) + margin
+    min_y = np.min(region[:, 1]) - margin
+    max_y = np.max(region[:, 1]) + margin
+    return eye[min_y:max_y, min_x:max_x], (min_x, min_y)
+
+
+def isolate_crop_first(frame, landmarks, points):
+    eye = Eye.__new__(Eye)
+    eye._isolate(frame, landmarks, points)
+    return eye.frame, eye.origin
+
+
+def measure(function, samples, repeat):
+    """Returns the mean time of a call in s"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame, landmarks, points in samples:
+            function(frame, landmarks, points)
+    return (time.perf_counter() - start) / (repeat * len(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the eye isolation on recorded frames.")
+    parser.add_argument('--frames', default='outs_backup', help='Directory of frame_*.jpg files')
+    parser.add_argument('--limit', type=int, default=50, help='Number of frames used')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of times every eye is isolated')
+    args = parser.parse_args()
+
+    gaze = GazeTracking()
+    samples = []
+    for _, file_path in frame_files(args.frames)[:args.limit]:
+        gaze.refresh(cv2.imread(file_path))
+        if gaze.face is None:
+            continue
+        frame = cv2.cvtColor(gaze.frame, cv2.COLOR_BGR2GRAY)
+        for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS):
+            samples.append((frame, gaze.landmarks, points))
+    if not samples:
+        raise SystemExit(f"No faces found in {args.frames}")
+
+    mismatches = 0
+    for frame, landmarks, points in samples:
+        expected, expected_origin = isolate_full_frame(frame, landmarks, points)
+        eye, origin = isolate_crop_first(frame, landmarks, points)
+        if eye.dtype != expected.dtype or not np.array_equal(eye, expected) or tuple(origin) != tuple(expected_origin):
+            mismatches += 1
+    print(f"{len(samples)} eyes, {mismatches} differ from the full frame masking")
+
+    full_frame_time = measure(isolate_full_frame, samples, args.repeat)
+    crop_first_time = measure(isolate_crop_first, samples, args.repeat)
+    print(f"full frame mask: {1e6 * full_frame_time:8.1f} us per eye")
+    print(f"crop first:      {1e6 * crop_first_time:8.1f} us per eye ({full_frame_time / crop_first_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
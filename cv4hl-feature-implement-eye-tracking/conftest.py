@@ -0,0 +1,3 @@
+# The tests import the packages of this directory (pipeline, GazeTracking,
+# led_point) the same way main.py does; pytest puts the directory of this
+# file on sys.path.
@@ -2,9 +2,21 @@ import pygame
 from led_point.trajectory import Trajectory
 from led_point.point import Point
 import ctypes
+import time
+
+BACKGROUND_COLOR = (149, 199, 206)
+POINT_COLOR = (255, 0, 0)
 
 class Display:
-    def __init__(self, point_speed = 1):
+    """
+    Shows the LED point on a full screen window. Every drawing method waits
+    for the next frame of the configured rate, and only the parts of the
+    screen that changed are sent to the display.
+    """
+
+    def __init__(self, point_speed = 75, fps = 60):
+        # The default speed (px/s) is the speed the former 1 px per main loop
+        # iteration reached in the recorded sessions (outs_backup)
         user32 = ctypes.windll.user32
         user32.SetProcessDPIAware()
         self.width, self.height = user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
@@ -12,52 +24,83 @@ class Display:
         pygame.init()
 
         self.point_radius = 30
+        self.fps = fps
+        self.clock = pygame.time.Clock()
         self.window = pygame.display.set_mode((self.width, self.height))
-        self.window.fill((149, 199, 206))
+        self.window.fill(BACKGROUND_COLOR)
         self.trajectory = Trajectory(Point(self.width, self.height), point_speed, 2*self.point_radius)
+        # Area of the point drawn last and the screen currently shown, to redraw only what changed
+        self._point_rect = None
+        self._screen = None
+        self._wait_text = None
 
-    def draw_point(self, position):
+    def _handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
-        self.window.fill((149, 199, 206))
-        pygame.draw.circle(self.window, (255, 0, 0), (position.x, position.y), self.point_radius)
-        pygame.display.flip()
+
+    def _show_screen(self, screen):
+        """Clears the window when switching to another screen. Returns True if the screen changed."""
+        if self._screen == screen:
+            return False
+        self._screen = screen
+        self._point_rect = None
+        self.window.fill(BACKGROUND_COLOR)
+        return True
+
+    def _move_point(self, position):
+        dirty_rects = []
+        if self._point_rect is not None:
+            dirty_rects.append(self.window.fill(BACKGROUND_COLOR, self._point_rect))
+        self._point_rect = pygame.draw.circle(self.window, POINT_COLOR, (position.x, position.y), self.point_radius)
+        dirty_rects.append(self._point_rect)
+        return dirty_rects
+
+    def draw_point(self, position):
+        self._handle_events()
+        full_redraw = self._show_screen('point')
+        dirty_rects = self._move_point(position)
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty_rects)
+        self.clock.tick(self.fps)
+
+    def show_start(self):
+        """Shows the point at the start of its trajectory, without moving it yet"""
+        self.draw_point(self.trajectory.position_at(time.time()))
+
+    def start_moving(self):
+        """Starts the trajectory clock, the point moves from the next run() on"""
+        self.trajectory.start()
 
     def run(self):
         """running = True
         while running:"""
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-
-        self.trajectory.move_point()
-        position = self.get_current_position()
-
-        self.window.fill((149, 199, 206))
-        pygame.draw.circle(self.window, (255, 0, 0), (position.x, position.y), self.point_radius)
-        pygame.display.flip()
+        if self.trajectory.start_time is None:
+            # The point starts moving with the first frame shown
+            self.trajectory.start()
+        self.draw_point(self.get_current_position())
 
     def central_point(self):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-        position = Point(self.width // 2, self.height // 2)
-        self.window.fill((149, 199, 206))
-        pygame.draw.circle(self.window, (255, 0, 0), (position.x, position.y), self.point_radius)
-        pygame.display.flip()
+        self._handle_events()
+        if self._show_screen('central'):
+            position = Point(self.width // 2, self.height // 2)
+            self._move_point(position)
+            pygame.display.flip()
+        self.clock.tick(self.fps)
 
     def wait_processing(self):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
+        self._handle_events()
         # The function displays a message that the user has to wait for the data processing to complete
-        self.window.fill((149, 199, 206))
-        font = pygame.font.Font(None, 36)
-        text = font.render("Please wait for data processing to be completed", True, (0, 0, 0))
-        text_rect = text.get_rect(center=(self.width // 2, self.height // 2))
-        self.window.blit(text, text_rect)
-        pygame.display.flip()
+        if self._show_screen('wait'):
+            if self._wait_text is None:
+                font = pygame.font.Font(None, 36)
+                self._wait_text = font.render("Please wait for data processing to be completed", True, (0, 0, 0))
+            text_rect = self._wait_text.get_rect(center=(self.width // 2, self.height // 2))
+            self.window.blit(self._wait_text, text_rect)
+            pygame.display.flip()
+        self.clock.tick(self.fps)
     
     def quit(self):
         pygame.quit()
@@ -65,6 +108,36 @@ class Display:
     def get_current_position(self):
         return self.trajectory.get_current_position()
 
+class NullDisplay:
+    """Headless stand-in for Display (e.g. for replaying recorded sessions).
+    Draws nothing and keeps the LED at the screen center."""
+
+    def __init__(self, width=1920, height=1080, fps=60):
+        self.width, self.height = width, height
+        self.frame_time = 1 / fps
+
+    def show_start(self):
+        pass
+
+    def start_moving(self):
+        pass
+
+    def run(self):
+        # Keeps the main loop from spinning a core
+        time.sleep(self.frame_time)
+
+    def central_point(self):
+        pass
+
+    def wait_processing(self):
+        pass
+
+    def quit(self):
+        pass
+
+    def get_current_position(self):
+        return Point(self.width // 2, self.height // 2)
+
 # Usage
 if __name__ == "__main__":
     display = Display()
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from led_point.point import Point
+from led_point.trajectory import Trajectory
+
+START = 1000.0
+
+
+@pytest.fixture
+def trajectory():
+    # The path is a 180 x 80 rectangle from (10, 10) to (190, 90), 520 px long
+    return Trajectory(Point(200, 100), speed=10, padding=10, start_time=START)
+
+
+def position(trajectory, distance):
+    """Position after the given distance along the path"""
+    point = trajectory.position_at(START + distance / trajectory.speed)
+    return point.x, point.y
+
+
+def stepped_positions(window_size, speed, padding, steps):
+    """Positions of the former Trajectory.move_point(), which moved by speed per call and
+    stopped at the corners"""
+    x, y = padding, padding
+    direction = "right"
+    positions = []
+    for _ in range(steps):
+        if direction == "right":
+            x += speed
+            if x >= window_size.x - padding:
+                direction, x = "down", window_size.x - padding
+        elif direction == "down":
+            y += speed
+            if y >= window_size.y - padding:
+                direction, y = "left", window_size.y - padding
+        elif direction == "left":
+            x -= speed
+            if x <= padding:
+                direction, x = "up", padding
+        else:
+            y -= speed
+            if y <= padding:
+                direction, y = "right", padding
+        positions.append((x, y))
+    return positions
+
+
+@pytest.mark.parametrize("distance, expected", [
+    (50, (60, 10)),    # top, to the right
+    (200, (190, 30)),  # right, downwards
+    (300, (150, 90)),  # bottom, to the left
+    (480, (10, 50)),   # left, upwards
+])
+def test_sides(trajectory, distance, expected):
+    assert position(trajectory, distance) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("distance, expected", [(0, (10, 10)), (180, (190, 10)), (260, (190, 90)), (440, (10, 90)),
+                                                (520, (10, 10))])
+def test_corners(trajectory, distance, expected):
+    assert position(trajectory, distance) == pytest.approx(expected)
+
+
+def test_later_laps_wrap_around(trajectory):
+    for distance in (50, 200, 300, 480):
+        assert position(trajectory, 7 * 520 + distance) == pytest.approx(position(trajectory, distance))
+
+
+def test_padding():
+    trajectory = Trajectory(Point(200, 100), speed=10, padding=0, start_time=START)
+
+    assert position(trajectory, 0) == (0, 0)
+    assert position(trajectory, 250) == pytest.approx((200, 50))
+    assert position(trajectory, 600) == (0, 0)
+
+
+def test_point_waits_at_the_start_before_start_time(trajectory):
+    assert position(trajectory, -100) == (10, 10)
+    assert position(Trajectory(Point(200, 100), speed=10, padding=10), 300) == (10, 10)
+
+
+def test_array_of_timestamps(trajectory):
+    distances = np.array([-10, 0, 50, 180, 200, 300, 480, 520 + 50])
+    x, y = trajectory.position_at(START + distances / trajectory.speed)
+
+    assert isinstance(x, np.ndarray) and x.shape == distances.shape
+    np.testing.assert_allclose(np.column_stack([x, y]), [position(trajectory, distance) for distance in distances])
+
+
+def test_save_and_load(trajectory, tmp_path):
+    path = tmp_path / "trajectory.csv"
+    trajectory.save(path)
+    loaded = Trajectory.load(path)
+
+    assert (loaded.window_size.x, loaded.window_size.y) == (200, 100)
+    assert (loaded.speed, loaded.padding, loaded.start_time) == (10, 10, START)
+    times = START + np.linspace(-5, 200, 101)
+    np.testing.assert_array_equal(loaded.position_at(times), trajectory.position_at(times))
+
+
+@pytest.mark.parametrize("speed", [1, 10])
+def test_matches_the_stepper_when_speed_divides_the_sides(speed):
+    trajectory = Trajectory(Point(200, 100), speed=speed, padding=10, start_time=0)
+    steps = 3 * 520 // speed
+    x, y = trajectory.position_at(np.arange(1, steps + 1))
+
+    np.testing.assert_allclose(np.column_stack([x, y]), stepped_positions(Point(200, 100), speed, 10, steps))
+
+
+def test_differs_from_the_stepper_after_a_clamped_corner():
+    # The 80 px side is not a multiple of 3 px: the stepper stops at the corner
+    # and loses the rest of the step, the trajectory goes round it
+    trajectory = Trajectory(Point(200, 100), speed=3, padding=10, start_time=START)
+    stepped = stepped_positions(Point(200, 100), 3, 10, 87)
+
+    assert position(trajectory, 3 * 86) == pytest.approx(stepped[85])
+    assert stepped[86] == (190, 90)
+    assert position(trajectory, 3 * 87) == pytest.approx((189, 90))
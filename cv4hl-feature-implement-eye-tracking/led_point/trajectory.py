@@ -1,41 +1,83 @@
-from led_point.point import Point
-from enum import Enum
+import csv
+import time
+
+import numpy as np
 
-class Direction(Enum):
-    UP = 'up'
-    DOWN = 'down'
-    RIGHT = 'right'
-    LEFT = 'left'
+from led_point.point import Point
 
 class Trajectory():
-    def __init__(self, window_size: Point, speed, padding=0):
+    """
+    Moves the point clockwise along the border of the window, starting in the
+    top left corner. The position is a pure function of time, so it can be
+    queried from any thread and reconstructed offline from timestamps.
+
+    The distance along the path is exact, the point goes round the corners.
+    The former stepper, which moved by a fixed step and stopped at a corner,
+    lost the rest of the step there, so the two only agree while the step
+    divides the side lengths. E.g. with a 200 x 100 window, padding 10 and
+    3 px steps, the stepper is at (190, 90) after step 87, the trajectory at
+    (189, 90) after the same distance, and they stay apart from then on.
+    """
+
+    def __init__(self, window_size: Point, speed, padding=0, start_time=None):
+        """
+        Arguments:
+            window_size (Point): Size of the window in pixels
+            speed: Speed of the point in pixels per second
+            padding: Distance of the path to the window border in pixels
+            start_time: Time (time.time()) the point starts moving, set by start() if not given
+        """
         self.window_size = window_size
         self.speed = speed
-        self.current_direction = Direction.RIGHT
         self.padding = padding
-        self.current_position = Point(padding, padding)
+        self.start_time = start_time
+        self._width = window_size.x - 2 * padding
+        self._height = window_size.y - 2 * padding
+        self._perimeter = 2 * (self._width + self._height)
+
+    def start(self, start_time=None):
+        """Starts the movement of the point, now or at the given time"""
+        self.start_time = time.time() if start_time is None else start_time
+
+    def position_at(self, t):
+        """Returns the position of the point at time t (time.time()).
+
+        Arguments:
+            t: A timestamp, or a numpy.ndarray of timestamps
+
+        Returns:
+            A Point for a single timestamp, a tuple (x, y) of arrays otherwise
+        """
+        start_time = self.start_time if self.start_time is not None else t
+        elapsed = np.maximum(np.asarray(t, dtype=float) - start_time, 0)
+        # Distance travelled along the current lap, starting at the top left corner
+        s = np.mod(self.speed * elapsed, self._perimeter)
+        w, h = self._width, self._height
+
+        on_top = s < w
+        on_right = ~on_top & (s < w + h)
+        on_bottom = ~on_top & ~on_right & (s < 2 * w + h)
+        x = np.select([on_top, on_right, on_bottom], [s, w, 2 * w + h - s], 0) + self.padding
+        y = np.select([on_top, on_right, on_bottom], [0, s - w, h], self._perimeter - s) + self.padding
+
+        if np.ndim(t) == 0:
+            return Point(float(x), float(y))
+        return x, y
 
     def get_current_position(self):
-        return self.current_position
-
-    def move_point(self):
-        if self.current_direction == Direction.RIGHT:
-            self.current_position.x += self.speed
-            if self.current_position.x >= (self.window_size.x - self.padding):
-                self.current_direction = Direction.DOWN
-                self.current_position.x = (self.window_size.x - self.padding)
-        elif self.current_direction == Direction.DOWN:
-            self.current_position.y += self.speed
-            if self.current_position.y >= (self.window_size.y - self.padding):
-                self.current_direction = Direction.LEFT
-                self.current_position.y = (self.window_size.y - self.padding)
-        elif self.current_direction == Direction.LEFT:
-            self.current_position.x -= self.speed
-            if self.current_position.x <= self.padding:
-                self.current_direction = Direction.UP
-                self.current_position.x = self.padding
-        elif self.current_direction == Direction.UP:
-            self.current_position.y -= self.speed
-            if self.current_position.y <= self.padding:
-                self.current_direction = Direction.RIGHT
-                self.current_position.y = self.padding
\ No newline at end of file
+        return self.position_at(time.time())
+
+    def save(self, file_path):
+        """Writes the parameters of the trajectory, to reconstruct the positions offline"""
+        with open(file_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["width", "height", "speed", "padding", "start_time"])
+            writer.writerow([self.window_size.x, self.window_size.y, self.speed, self.padding, self.start_time])
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, "r", newline="") as file:
+            reader = csv.reader(file)
+            next(reader)  # Skip the header row
+            width, height, speed, padding, start_time = [float(i) for i in next(reader)]
+        return cls(Point(width, height), speed, padding, start_time)
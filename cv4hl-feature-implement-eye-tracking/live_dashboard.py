@@ -0,0 +1,284 @@
+"""
+Live view of a session while main.py records it. The data file (outs/data.csv
+or a session file) is followed: every refresh only parses the rows appended
+since the previous one, derives their series from the state the previous rows
+left, and appends them to display buffers of bounded size, so a refresh takes
+about the same time after 10 seconds as after 10 minutes.
+
+Usage: python live_dashboard.py [outs/data.csv] [--interval 0.5] [--points 500] [--window 30]
+"""
+import argparse
+import os
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+import analysis
+from pipeline.session_file import SCREEN_SIZE, VALID, SessionTail
+
+
+class IncrementalAnalysis:
+    """
+    Derived series of a followed session (see analysis.SessionAnalysis),
+    computed only for the samples appended since the previous call. The
+    velocities and the unwrapped angles continue from the last sample before
+    them, the valid rate from the last window samples, so the values are the
+    same as those of the whole session. Angles are only computed for the
+    samples read once the calibration is known.
+    """
+
+    def __init__(self, window=30):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.valid_frames = 0
+        # Pupil positions (left_x, left_y, right_x, right_y) of the last sample
+        self._last_position = None
+        # Last finite unwrapped angle of every angle series
+        self._last_angles = {}
+        self._last_valid = np.zeros(0, bool)
+
+    def extend(self, samples, calibration=None, screen_size=SCREEN_SIZE):
+        """Returns the SessionAnalysis of the samples and their valid rate (0 to 1)
+
+        Arguments:
+            samples: Structured array of the appended samples (see pipeline.session_file.SAMPLE_DTYPE)
+            calibration: Calibrated pupil positions (left_x, left_y, right_x, right_y), None if unknown
+            screen_size: (width, height) of the LED display
+        """
+        session = analysis.SessionAnalysis(samples, calibration, screen_size)
+        if not len(session):
+            return session, np.zeros(0)
+
+        if self._last_position is not None:
+            left_x, left_y, right_x, right_y = self._last_position
+            session.velocity_left[0] = np.hypot(session.left_x[0] - left_x, session.left_y[0] - left_y)
+            session.velocity_right[0] = np.hypot(session.right_x[0] - right_x, session.right_y[0] - right_y)
+        self._last_position = (session.left_x[-1], session.left_y[-1], session.right_x[-1], session.right_y[-1])
+
+        for name in ("led_angle", "left_angle", "right_angle"):
+            angle = getattr(session, name)
+            finite = np.flatnonzero(np.isfinite(angle)) if angle is not None else ()
+            if not len(finite):
+                continue
+            # Shifted by whole turns, like np.unwrap() would over both parts
+            last_angle = self._last_angles.get(name)
+            if last_angle is not None:
+                angle += 2 * np.pi * np.round((last_angle - angle[finite[0]]) / (2 * np.pi))
+            self._last_angles[name] = angle[finite[-1]]
+        if session.left_angle is not None:
+            session.left_angle_diff = session.left_angle - session.led_angle
+            session.right_angle_diff = session.right_angle - session.led_angle
+
+        valid = np.concatenate([self._last_valid, session.status == VALID])
+        valid_rate = analysis.rolling_mean(valid, self.window)[len(self._last_valid):]
+        self._last_valid = valid[max(len(valid) - self.window + 1, 0):]
+        self.frames += len(session)
+        self.valid_frames += int(np.count_nonzero(session.status == VALID))
+        return session, valid_rate
+
+
+class DecimatedSeries:
+    """
+    Bounded display buffer of a series. The points are gathered in buckets of
+    bucket_size samples, of which the lowest and the highest point are kept.
+    Once max_buckets buckets are full, neighbouring buckets are merged in
+    pairs and bucket_size doubles, so appending costs constant time per
+    sample and at most 2 * max_buckets points are shown, however long the
+    session is. Points with NaN coordinates are left out.
+    """
+
+    def __init__(self, max_buckets=250):
+        # Merged in pairs, so an even number
+        self.max_buckets = max(2 * (max_buckets // 2), 2)
+        self.clear()
+
+    def clear(self):
+        self.bucket_size = 1
+        # x, y of the lowest and x, y of the highest point of every full bucket
+        self._buckets = np.empty((self.max_buckets, 4))
+        self._count = 0
+        self._current = np.full(4, np.nan)
+        self._filled = 0
+
+    def extend(self, x, y):
+        x, y = np.asarray(x, float), np.asarray(y, float)
+        start = 0
+        while start < len(x):
+            stop = min(start + self.bucket_size - self._filled, len(x))
+            self._add(x[start:stop], y[start:stop])
+            self._filled += stop - start
+            start = stop
+            if self._filled == self.bucket_size:
+                self._buckets[self._count] = self._current
+                self._count += 1
+                self._current = np.full(4, np.nan)
+                self._filled = 0
+                if self._count == self.max_buckets:
+                    self._merge()
+
+    def _add(self, x, y):
+        finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        if not len(finite):
+            return
+        low = finite[np.argmin(y[finite])]
+        high = finite[np.argmax(y[finite])]
+        if not y[low] >= self._current[1]:
+            self._current[:2] = x[low], y[low]
+        if not y[high] <= self._current[3]:
+            self._current[2:] = x[high], y[high]
+
+    def _merge(self):
+        first, second = self._buckets[0::2], self._buckets[1::2]
+        # Comparisons with NaN are false, so empty buckets give way to the other one
+        merged = first.copy()
+        lower = second[:, 1] < first[:, 1]
+        lower |= np.isnan(first[:, 1])
+        merged[lower, :2] = second[lower, :2]
+        higher = second[:, 3] > first[:, 3]
+        higher |= np.isnan(first[:, 3])
+        merged[higher, 2:] = second[higher, 2:]
+        self._count = len(merged)
+        self._buckets[:self._count] = merged
+        self.bucket_size *= 2
+
+    def points(self):
+        """Returns (x, y) of the points kept, in the order of the samples"""
+        buckets = self._buckets[:self._count]
+        if self._filled:
+            buckets = np.vstack([buckets, self._current])
+        # The lowest and the highest point of a bucket, in the order they were appended
+        swapped = buckets[:, 2] < buckets[:, 0]
+        points = buckets.reshape(-1, 2, 2).copy()
+        points[swapped] = points[swapped, ::-1]
+        x, y = points[:, :, 0].ravel(), points[:, :, 1].ravel()
+        finite = np.isfinite(x) & np.isfinite(y)
+        return x[finite], y[finite]
+
+
+class LiveDashboard:
+    """Four panels showing the tracking quality of the session so far"""
+
+    def __init__(self, fig, num_points=500, window=30):
+        """
+        Arguments:
+            fig: Figure the panels are drawn in
+            num_points: Maximum number of points shown per series
+            window: Number of frames the valid rate is averaged over
+        """
+        self.fig = fig
+        self.num_points = num_points
+        self.window = window
+        self.analysis = IncrementalAnalysis(window)
+        ((ax1, ax2), (ax3, ax4)) = self.axes = fig.subplots(2, 2)
+
+        light_blue = (171/255, 209/255, 215/255)
+        mid_blue = (85/255, 177/255, 188/255)
+        dark_blue = (69/255, 146/255, 155/255)
+
+        self.line_left_x, = ax1.plot([], [], color=light_blue, label='Left x', linewidth=1)
+        self.line_left_y, = ax1.plot([], [], '--', color=light_blue, label='Left y', linewidth=1)
+        self.line_right_x, = ax1.plot([], [], color=mid_blue, label='Right x', linewidth=1)
+        self.line_right_y, = ax1.plot([], [], '--', color=mid_blue, label='Right y', linewidth=1)
+        self.line_velocity_left, = ax2.plot([], [], color=light_blue, label='Left Eye', linewidth=1)
+        self.line_velocity_right, = ax2.plot([], [], color=mid_blue, label='Right Eye', linewidth=1)
+        self.line_left_angle, = ax3.plot([], [], color=light_blue, label='Left Eye', linewidth=1)
+        self.line_right_angle, = ax3.plot([], [], color=mid_blue, label='Right Eye', linewidth=1)
+        self.line_valid, = ax4.plot([], [], color=dark_blue, linewidth=1)
+        for ax in (ax1, ax2, ax3):
+            ax.legend(fontsize='small', loc='upper left')
+        self.series = {line: DecimatedSeries(num_points // 2) for ax in self.axes.flat for line in ax.get_lines()}
+
+        ax1.set_xlabel('frame')
+        ax1.set_ylabel('px relative to landmark 27')
+        ax1.set_title('Pupil Positions')
+        ax2.set_xlabel('frame')
+        ax2.set_ylabel('v in px/frame')
+        ax2.set_title('Pupil Velocity')
+        ax3.set_xlabel('frame')
+        ax3.set_ylabel(r'$\Delta\phi$ in rad')
+        ax3.set_title('Angle Differences (waiting for calibration)')
+        ax4.set_xlabel('frame')
+        ax4.set_ylabel('%')
+        ax4.set_ylim(-5, 105)
+        ax4.set_title(f'Valid Frames (last {window} frames)')
+        fig.subplots_adjust(wspace=0.3, hspace=0.5)
+
+    def clear(self):
+        """Forgets the samples shown, e.g. when a new session starts"""
+        self.analysis.reset()
+        for series in self.series.values():
+            series.clear()
+
+    def extend(self, samples, calibration=None, screen_size=SCREEN_SIZE):
+        """Adds the samples appended to the session since the previous call
+
+        Arguments:
+            samples: Structured array of samples (see pipeline.session_file.SAMPLE_DTYPE)
+            calibration: Calibrated pupil positions (left_x, left_y, right_x, right_y), None if unknown
+            screen_size: (width, height) of the LED display
+        """
+        session, valid_rate = self.analysis.extend(samples, calibration, screen_size)
+        frames = session.sequence.astype(float)
+        # Positions of the frames without pupils are repeated or predicted, not measured
+        measured = np.where(session.status == VALID, 1.0, np.nan)
+        self.series[self.line_left_x].extend(frames, session.left_x * measured)
+        self.series[self.line_left_y].extend(frames, session.left_y * measured)
+        self.series[self.line_right_x].extend(frames, session.right_x * measured)
+        self.series[self.line_right_y].extend(frames, session.right_y * measured)
+        self.series[self.line_velocity_left].extend(frames, session.velocity_left * measured)
+        self.series[self.line_velocity_right].extend(frames, session.velocity_right * measured)
+        if session.left_angle_diff is not None:
+            self.series[self.line_left_angle].extend(frames, session.left_angle_diff * measured)
+            self.series[self.line_right_angle].extend(frames, session.right_angle_diff * measured)
+            self.axes[1, 0].set_title('Angle Differences relative to LED Point Position')
+        self.series[self.line_valid].extend(frames, 100 * valid_rate)
+
+    def draw(self):
+        """Shows the points kept of every series"""
+        for line, series in self.series.items():
+            line.set_data(*series.points())
+        for ax in self.axes.flat:
+            ax.relim()
+            ax.autoscale_view(scaley=ax is not self.axes[1, 1])
+        frames = self.analysis.frames
+        self.fig.suptitle(f'{frames} frames, {100 * self.analysis.valid_frames / max(frames, 1):.1f}% valid')
+
+
+def follow(path, interval=0.5, num_points=500, window=30):
+    """Shows the session written to path until the window is closed or Ctrl+C is pressed"""
+    tail = SessionTail(path)
+
+    plt.style.use('dark_background')
+    fig = plt.figure(figsize=(12.80, 7.20), dpi=100)
+    dashboard = LiveDashboard(fig, num_points, window)
+    plt.show(block=False)
+    print(f"Following {path}, close the window or press Ctrl+C to stop.")
+    try:
+        while plt.fignum_exists(fig.number):
+            start_time = time.time()
+            samples = tail.read()
+            if tail.restarted:
+                dashboard.clear()
+            if len(samples):
+                dashboard.extend(samples, tail.calibration, tail.screen_size)
+                dashboard.draw()
+                fig.canvas.draw_idle()
+            plt.pause(max(interval - (time.time() - start_time), 0.01))
+    except KeyboardInterrupt:
+        print("Program interrupted by user.")
+    plt.close(fig)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Follows the data file of a running session.")
+    parser.add_argument('path', nargs='?', default=os.path.join('outs', 'data.csv'),
+                        help='data.csv or session file written by main.py')
+    parser.add_argument('--interval', type=float, default=0.5, help='Time between refreshes in s')
+    parser.add_argument('--points', type=int, default=500, help='Maximum number of points shown per series')
+    parser.add_argument('--window', type=int, default=30, help='Number of frames the valid rate is averaged over')
+    args = parser.parse_args()
+    follow(args.path, args.interval, args.points, args.window)
@@ -1,25 +1,40 @@
 import threading
 import time
 import cv2
-import queue
 import signal
 import argparse
 import glob
 import os
 import logging
-import copy
 import pygame
 
-from led_point.display import Display
+from led_point.display import Display, NullDisplay
 from GazeTracking.single_image_processor import SingleImageProcessor
+from GazeTracking.gaze_tracking import models
+from GazeTracking.gaze_tracking.running_stats import RunningStats
+from GazeTracking.gaze_tracking.smoothing import SMOOTHERS, make_smoother
+from pipeline.worker_pool import BACKENDS, GazeWorkerPool
+from pipeline.frame_queue import CapturedFrame, DropPolicy, FrameQueue
+from pipeline.scheduler import CaptureScheduler, LatePolicy
+from pipeline.grabber import FrameGrabber
+from pipeline.archive import SessionArchiveWriter, remove_archive
+from pipeline.replay import ReplaySource
+from pipeline.result_sink import CsvResultSink
+from pipeline.session_file import SESSION_EXTENSION, SessionFileSink
 
 # Step 1: Configure logging to write errors to a log file
 logging.basicConfig(filename='error_log.log', level=logging.ERROR, 
                     format='%(asctime)s:%(levelname)s:%(message)s')
 
-task_queue = queue.Queue()
+# Replaced in main() by a queue bounded as configured on the command line
+task_queue = FrameQueue()
 data_capture_active = True
 shutdown_flag  = False
+# Archiving frames to disk is optional and kept off the processing path
+frame_archive = None
+archive_path = os.path.join("outs", "session")
+# Sequence number of the next captured frame, used to merge the worker results in capture order
+frame_sequence = 0
 
 def signal_handler(sig, frame):
     global shutdown_flag
@@ -30,13 +45,13 @@ def signal_handler(sig, frame):
 
 signal.signal(signal.SIGINT, signal_handler)
 
-def worker():
+def worker(worker_pool):
     global shutdown_flag
     while not shutdown_flag:
         # Get a task from the queue
-        task = task_queue.get()
+        captured = task_queue.get()
         try:
-            task()
+            process_image(captured, worker_pool)
         finally:
             # Mark the task as done
             task_queue.task_done()
@@ -45,44 +60,51 @@ def worker():
         task_queue.queue.clear()
     print("Worker thread stopped.")
 
-def capture_image(cap):
-    ret, frame = cap.read()
-    if not ret:
-        return None
-    return frame
+def capture_image(grabber):
+    # The grabber thread has already flipped the frame and sampled the LED position at grab time
+    return grabber.next_frame(timeout=1)
 
-def process_image(frame, image_processor, led_point):
+def archive_frame(frame, timestamp):
+    frame_archive.append(frame, timestamp)
+
+def process_image(captured, worker_pool):
     #print("Other task is running.")
     # Simulate a task that takes some time
-    timestamp = time.time()
-    cv2.imwrite(f"outs\\frame_{timestamp}.jpg", frame)
-    image_processor.process(f"outs\\frame_{timestamp}.jpg", led_point)
+    if frame_archive is not None:
+        archive_frame(captured.frame, captured.timestamp)
+    worker_pool.submit(captured.sequence, captured.frame, captured.led_point, captured.timestamp,
+                       on_done=captured.release)
     #time.sleep(2)
     #print(f"Other task completed in {(time.time()-timestamp)}s.")
 
-def capture_data(cap, display, image_processor):
+def capture_frame(grabber):
+    global frame_sequence
     global data_capture_active
-    if not data_capture_active:
-        print("Data capture has been stopped.")
-        return
-    start_time = time.time()    
     # Simulate critical task work
-    frame = capture_image(cap)
-    frame = cv2.flip(frame, 1)
+    slot = capture_image(grabber)
+    if slot is None:
+        if grabber.exhausted:
+            # A replayed session has no frames left
+            data_capture_active = False
+        return
     #breakpoint()
-    led_point = copy.deepcopy(display.get_current_position())
-    #print(f"LED point position: {led_point}")
-    delta = time.time() - start_time
-    #print(f"Critical task completed in {delta} seconds.")
-    #sprint(f"LED point position: {display.get_current_position()}")
+    #print(f"LED point position: {slot.led_point}")
     # After critical task, spawn a new other task
-    task_queue.put(lambda: process_image(frame, image_processor, led_point))
-    # Schedule the next execution of the critical task
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0:
-        fps = 30
-    wait_time = 1/fps - delta
-    threading.Timer(wait_time, capture_data, args=(cap,display,image_processor,)).start()
+    task_queue.put(CapturedFrame(frame_sequence, slot.timestamp, slot.frame, slot.led_point, slot))
+    frame_sequence += 1
+
+def capture_data(fps, grabber, late_policy=LatePolicy.SKIP):
+    if fps is None:
+        # Replayed frames are paced by the replay source itself
+        while data_capture_active:
+            capture_frame(grabber)
+        print("Data capture has been stopped.")
+        return
+    # One loop for the whole session, scheduled against monotonic deadlines
+    scheduler = CaptureScheduler(fps, late_policy)
+    scheduler.run(lambda: capture_frame(grabber), lambda: data_capture_active)
+    print("Data capture has been stopped.")
+    print(scheduler.report())
 
 def clear_images():
     files = glob.glob("outs/frame_*.jpg")
@@ -91,81 +113,182 @@ def clear_images():
             os.remove(f)
         except OSError as e:
             print(f"Error: {e}")
+    try:
+        remove_archive(archive_path)
+    except OSError as e:
+        print(f"Error: {e}")
 
-def calibration(cap, display, image_processor):
+def calibration(grabber, display, image_processor, is_active=None, tolerance=0.5, timeout=5, min_samples=10):
+    """Estimates the resting pupil positions while the user looks at the central point.
+    Stops as soon as the standard error of every mean is within the tolerance (in px),
+    at the latest after the timeout (in s)."""
     display.central_point()
     start_time = time.time()
-    left_pupil_x = []
-    left_pupil_y = []
-    right_pupil_x = []
-    right_pupil_y = []
-    while time.time() - start_time < 5:
+    if is_active is None:
+        is_active = lambda: time.time() - start_time < timeout
+    # Running statistics of left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y
+    pupil_stats = [RunningStats() for _ in range(4)]
+    while is_active():
         display.central_point()
-        frame = capture_image(cap)
-        frame = cv2.flip(frame, 1)
-        timestamp = time.time()
-        cv2.imwrite(f"outs\\frame_{timestamp}.jpg", frame)
-        led_point = display.get_current_position()
-        valid, lpx, lpy, rpx, rpy = image_processor.process_without_writing(f"outs\\frame_{timestamp}.jpg", led_point)
+        slot = capture_image(grabber)
+        if slot is None:
+            continue
+        valid, *pupils = image_processor.process_frame_without_writing(slot.frame, slot.led_point)
+        if frame_archive is not None:
+            archive_frame(slot.frame, slot.timestamp)
+        slot.release()
         if valid:
-            left_pupil_x.append(lpx)
-            left_pupil_y.append(lpy)
-            right_pupil_x.append(rpx)
-            right_pupil_y.append(rpy)
-    print(f"{len(left_pupil_x)} samples collected.")
-    left_pupil_x = sum(left_pupil_x) / len(left_pupil_x)
-    left_pupil_y = sum(left_pupil_y) / len(left_pupil_y)
-    right_pupil_x = sum(right_pupil_x) / len(right_pupil_x)
-    right_pupil_y = sum(right_pupil_y) / len(right_pupil_y)
+            for stats, value in zip(pupil_stats, pupils):
+                stats.add(value)
+            if all(stats.has_converged(tolerance, min_samples) for stats in pupil_stats):
+                break
+    print(f"{pupil_stats[0].count} samples collected in {time.time() - start_time:.2f} s.")
+    if pupil_stats[0].count == 0:
+        raise RuntimeError("No valid calibration samples collected.")
 
-    return left_pupil_x, left_pupil_y, right_pupil_x, right_pupil_y
+    return tuple(stats.mean for stats in pupil_stats)
 
 
 
 
 def main():
     parser = argparse.ArgumentParser(description="Capture data from a webcam and process it.")
-    parser.add_argument('--clear_images', action='store_true', help='If set, deletes all frame_*.jpg files from outs')
+    parser.add_argument('--clear_images', action='store_true', help='If set, deletes all frame_*.jpg files and the frame archive from outs')
+    parser.add_argument('--save_images', action='store_true', help='If set, archives every captured frame in outs/session.frames')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) - 2), help='Number of gaze processing workers')
+    parser.add_argument('--backend', choices=list(BACKENDS), default='process',
+                        help='Runs the workers as processes, or as threads sharing one GazeTracking (with the calibration frozen)')
+    parser.add_argument('--queue_size', type=int, default=32, help='Maximum number of captured frames waiting for processing')
+    parser.add_argument('--drop_policy', choices=[policy.value for policy in DropPolicy], default=DropPolicy.BLOCK.value,
+                        help='What to do with frames when the queue is full')
+    parser.add_argument('--keep_every', type=int, default=1, help='With the every_nth drop policy, only every n-th frame is processed')
+    parser.add_argument('--late_policy', choices=[policy.value for policy in LatePolicy], default=LatePolicy.SKIP.value,
+                        help='Whether the capture skips or catches up frames it is late for')
+    parser.add_argument('--calibration_tolerance', type=float, default=0.5,
+                        help='Standard error (in px) of the calibrated pupil positions at which the calibration stops')
+    parser.add_argument('--threshold_step', type=int, default=5,
+                        help='Step of the binarization thresholds tried by the pupil calibration')
+    parser.add_argument('--calibration_timeout', type=float, default=5, help='Maximum duration of the calibration in s')
+    parser.add_argument('--display_fps', type=int, default=60, help='Frame rate of the LED display')
+    parser.add_argument('--no_face_tracking', action='store_true',
+                        help='Searches the face in the whole frame every time instead of around its last position')
+    parser.add_argument('--redetect_interval', type=int, default=30,
+                        help='Number of frames after which a tracked face is searched in the whole frame again')
+    parser.add_argument('--predict_roi', action='store_true',
+                        help='Moves the face search region along the pupil motion predicted from the frame timestamps')
+    parser.add_argument('--detection_scale', type=float, default=0.5,
+                        help='Factor the frames are downsampled by for the face detection (1 for full resolution)')
+    parser.add_argument('--subpixel', action='store_true', help='Keeps the pupil centroids as floats instead of truncating them')
+    parser.add_argument('--smoother', choices=list(SMOOTHERS), default='moving_average',
+                        help='How the pupil positions are smoothed; kalman also fills short gaps with predictions')
+    parser.add_argument('--data_format', choices=['csv', 'session'], default='csv',
+                        help=f'Writes the results to outs/data.csv, or to the binary session file outs/data{SESSION_EXTENSION}')
+    parser.add_argument('--replay', metavar='SESSION',
+                        help='Headless run on a recorded session (directory of frame_*.jpg files or session archive) instead of the webcam')
+    parser.add_argument('--realtime', action='store_true', help='Replays the session at its original pace instead of as fast as possible')
     args = parser.parse_args()
 
+    global frame_archive
+    global task_queue
+
     if args.clear_images:
         clear_images()
 
+    if args.save_images:
+        frame_archive = SessionArchiveWriter(archive_path)
+
     output_file_path = "outs/data.csv"
     calibration_file_path = "outs/calibration.csv"
+    trajectory_file_path = "outs/trajectory.csv"
 
     global data_capture_active
-    display = Display()
+    # Loading the face models takes a few seconds, meanwhile the display starts
+    models.preload()
+    display = NullDisplay(fps=args.display_fps) if args.replay else Display(fps=args.display_fps)
     print("Display initialized.")
 
-    image_processor = SingleImageProcessor(output_file_path)
+    # The rows are written in the background, as CSV or as a binary session file
+    if args.data_format == 'session':
+        output_file_path = os.path.splitext(output_file_path)[0] + SESSION_EXTENSION
+        sink = SessionFileSink(output_file_path)
+    else:
+        sink = CsvResultSink(output_file_path)
+    image_processor = SingleImageProcessor(output_file_path, make_smoother(args.smoother), sink,
+                                           face_tracking=not args.no_face_tracking, predict_roi=args.predict_roi,
+                                           redetect_interval=args.redetect_interval,
+                                           detection_scale=args.detection_scale,
+                                           subpixel=args.subpixel)
+    image_processor.gaze.calibration.threshold_step = args.threshold_step
     print("Image processor initialized.")
-    # Set video capture properties
-    width, height = 1280, 720 
-    fps = 30
-
-    # Create a VideoCapture object
-    cap = cv2.VideoCapture(0)
-    print("Video capture object created.")
-
-    # Set video width, height, and FPS
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-    cap.set(cv2.CAP_PROP_FPS, fps)
-    threading.Thread(target=worker, daemon=True).start()
-    print("Worker thread started.")
 
-    calib = calibration(cap, display, image_processor)
+    if args.replay:
+        cap = None
+        # Recorded frames take the place of the camera and the grabber
+        grabber = ReplaySource(args.replay, realtime=args.realtime)
+        capture_fps = None
+        calibration_active = grabber.is_calibrating
+        print(f"Replaying {len(grabber)} frames from {args.replay}.")
+    else:
+        # Set video capture properties
+        width, height = 1280, 720 
+        fps = 30
+
+        # Create a VideoCapture object
+        cap = cv2.VideoCapture(0)
+        print("Video capture object created.")
+
+        # Set video width, height, and FPS
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        cap.set(cv2.CAP_PROP_FPS, fps)
+        capture_fps = cap.get(cv2.CAP_PROP_FPS)
+        if capture_fps == 0:
+            capture_fps = 30
+        calibration_active = None
+
+        # Frame buffers for every frame that can be waiting in the queue or in the worker pool
+        num_slots = args.queue_size + 2 * args.workers + 4
+        grabber = FrameGrabber(cap, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or width, int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or height,
+                               num_slots, led_position=display.get_current_position)
+    grabber.start()
+    print("Frame grabber started.")
+
+    calib = calibration(grabber, display, image_processor, calibration_active,
+                        args.calibration_tolerance, args.calibration_timeout)
+    if args.replay:
+        # Recorded calibration frames left over after convergence are not session data
+        grabber.skip_calibration()
     with open(calibration_file_path, "w") as f:
         f.write(f"{calib[0]},{calib[1]},{calib[2]},{calib[3]}, 1920, 1080\n")
+    image_processor.sink.set_calibration(calib, (1920, 1080))
     print("Calibration completed.")
     print(f"Calib: {calib}")
 
-    display.run()
+    # The workers reuse the binarization thresholds found during calibration, frozen so they stay the same in every worker
+    image_processor.gaze.calibration = image_processor.gaze.calibration.freeze()
+    print(f"Pupil thresholds: {image_processor.gaze.calibration}")
+    worker_pool = GazeWorkerPool(image_processor, num_workers=args.workers, backend=args.backend)
+    print(f"Worker pool started with {worker_pool.num_workers} {'threads' if args.backend == 'thread' else 'processes'}.")
+
+    # Dropped frames are written as gap rows to the data file
+    def on_drop(captured):
+        captured.release()
+        worker_pool.skip(captured.sequence, captured.led_point, captured.timestamp)
+    task_queue = FrameQueue(args.queue_size, args.drop_policy, args.keep_every, on_drop=on_drop)
+    threading.Thread(target=worker, args=(worker_pool,), daemon=True).start()
+    print("Worker thread started.")
+
+    display.show_start()
     time.sleep(2)
+    # The trajectory clock starts with the continuous drawing, not while the start position is shown
+    display.start_moving()
+    if not args.replay:
+        # The LED positions can be reconstructed offline from the frame timestamps
+        display.trajectory.save(trajectory_file_path)
 
     # Start the critical task in a separate process
-    critical_process = threading.Thread(target=capture_data, args=(cap,display,image_processor))
+    critical_process = threading.Thread(target=capture_data, args=(capture_fps,grabber,args.late_policy))
+    processing_start_time = time.time()
     critical_process.start()
     print("Critical task started.")
 
@@ -177,16 +300,18 @@ def main():
             # Example: Main program doing some work
             iteration_time = time.time()
             display.run()
-            if time.time() - start_time > 300:
+            if not args.replay and time.time() - start_time > 300:
                 print("Stopping data capture.")
-                print(f"The number of tasks in the queue: {task_queue.qsize()}")
+                print(f"The number of tasks in the queue: {task_queue.qsize() + worker_pool.pending()}")
                 print(f"Time elapsed: {time.time() - start_time}")
+                print(f"Frames dropped: {task_queue.dropped}, grabber overruns: {grabber.overruns}")
                 data_capture_active = False
             iteration_times.append(time.time() - iteration_time)
         avrg = sum(iteration_times) / len(iteration_times)
         print(f"Average iteration time: {avrg}")
 
-        while not task_queue.empty() and not shutdown_flag:
+        # pending() comes first: it raises if the results can no longer be written
+        while (worker_pool.pending() or task_queue.unfinished_tasks) and not shutdown_flag:
             display.wait_processing()
             time.sleep(1)
     except KeyboardInterrupt:
@@ -196,9 +321,22 @@ def main():
     print("Main program completed.")
     critical_process.join()  # Wait for the critical task to complete
     print("Critical task completed.")
+    worker_pool.close(cancel_pending=shutdown_flag)
+    # Writes the rows still buffered, also after Ctrl+C
+    image_processor.close()
     #task_queue.join()  # Wait for all tasks in the queue to be completed before exiting
     print("All tasks completed.")
-    cap.release()  # Release the video capture object
+    print(f"Face detection: {worker_pool.detection_stats}")
+    if args.replay:
+        elapsed = time.time() - processing_start_time
+        recorded = grabber.timestamps[-1] - grabber.timestamps[min(grabber.calibration_frames, len(grabber) - 1)]
+        print(f"Replay throughput: {frame_sequence} frames in {elapsed:.2f} s ({frame_sequence / elapsed:.2f} fps, "
+              f"{recorded / elapsed:.2f}x the recorded duration)")
+    grabber.stop()
+    if frame_archive is not None:
+        frame_archive.close()
+    if cap is not None:
+        cap.release()  # Release the video capture object
     display.quit()  # Quit the display
 
 if __name__ == "__main__":
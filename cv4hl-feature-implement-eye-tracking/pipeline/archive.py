@@ -0,0 +1,138 @@
+import argparse
+import bisect
+import csv
+import glob
+import os
+import threading
+
+import cv2
+import numpy as np
+
+FRAMES_EXTENSION = ".frames"
+INDEX_EXTENSION = ".index.csv"
+
+
+class SessionArchiveWriter:
+    """
+    Archives the frames of a session in a single container file instead of
+    one image file per frame. The container is the plain concatenation of
+    the encoded frames; a sidecar CSV index maps every frame number to its
+    timestamp, byte offset and length.
+    """
+
+    def __init__(self, path, extension=".jpg", params=None):
+        self.path = path
+        self.extension = extension
+        self.params = params if params is not None else [cv2.IMWRITE_JPEG_QUALITY, 95]
+        self.frame_count = 0
+        self._frames_file = open(path + FRAMES_EXTENSION, "wb")
+        self._index_file = open(path + INDEX_EXTENSION, "w", newline="")
+        self._index = csv.writer(self._index_file)
+        self._index.writerow(["frame", "timestamp", "offset", "length"])
+
+    def append(self, frame, timestamp):
+        ret, data = cv2.imencode(self.extension, frame, self.params)
+        if not ret:
+            raise ValueError(f"Could not encode frame {self.frame_count} as {self.extension}")
+        self.append_encoded(data.tobytes(), timestamp)
+
+    def append_encoded(self, data, timestamp):
+        """Appends an already encoded image, e.g. an existing JPEG file"""
+        offset = self._frames_file.tell()
+        self._frames_file.write(data)
+        self._index.writerow([self.frame_count, timestamp, offset, len(data)])
+        self.frame_count += 1
+
+    def close(self):
+        self._frames_file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionArchiveReader:
+    """Random access to the frames of a session archive by frame number or by timestamp"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path + INDEX_EXTENSION, "r", newline="") as file:
+            reader = csv.reader(file)
+            next(reader)  # Skip the header row
+            rows = [row for row in reader]
+        self.timestamps = np.array([float(row[1]) for row in rows])
+        self._offsets = [int(row[2]) for row in rows]
+        self._lengths = [int(row[3]) for row in rows]
+        self._frames_file = open(path + FRAMES_EXTENSION, "rb")
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def read(self, frame_number):
+        """Returns the frame with the given number and its timestamp"""
+        with self._lock:
+            self._frames_file.seek(self._offsets[frame_number])
+            data = self._frames_file.read(self._lengths[frame_number])
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        return frame, self.timestamps[frame_number]
+
+    def frame_number_at(self, timestamp):
+        """Returns the number of the frame captured closest to the given timestamp"""
+        index = bisect.bisect_left(self.timestamps, timestamp)
+        if index == len(self):
+            return index - 1
+        if index > 0 and timestamp - self.timestamps[index - 1] <= self.timestamps[index] - timestamp:
+            return index - 1
+        return index
+
+    def read_at(self, timestamp):
+        return self.read(self.frame_number_at(timestamp))
+
+    def __iter__(self):
+        for frame_number in range(len(self)):
+            yield self.read(frame_number)
+
+    def close(self):
+        self._frames_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def frame_files(directory):
+    """Returns the frame_<timestamp>.jpg files of a directory with their timestamps, in capture order"""
+    files = []
+    for file_path in glob.glob(os.path.join(directory, "frame_*.jpg")):
+        timestamp = float(os.path.basename(file_path)[len("frame_"):-len(".jpg")])
+        files.append((timestamp, file_path))
+    return sorted(files)
+
+
+def import_frame_files(directory, path):
+    """Packs the frame_<timestamp>.jpg files of a directory into an archive without re-encoding them"""
+    with SessionArchiveWriter(path) as writer:
+        for timestamp, file_path in frame_files(directory):
+            with open(file_path, "rb") as file:
+                writer.append_encoded(file.read(), timestamp)
+        return writer.frame_count
+
+
+def remove_archive(path):
+    for extension in (FRAMES_EXTENSION, INDEX_EXTENSION):
+        if os.path.exists(path + extension):
+            os.remove(path + extension)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packs a directory of frame_*.jpg files into a session archive.")
+    parser.add_argument('directory', help='Directory containing the frame_*.jpg files')
+    parser.add_argument('archive', help='Path of the archive, without extension')
+    args = parser.parse_args()
+    print(f"{import_frame_files(args.directory, args.archive)} frames archived.")
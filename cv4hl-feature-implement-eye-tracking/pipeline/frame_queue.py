@@ -0,0 +1,81 @@
+import queue
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+
+from led_point.point import Point
+
+
+@dataclass
+class CapturedFrame:
+    sequence: int
+    timestamp: float
+    frame: np.ndarray
+    led_point: Point
+    # Grabber ring slot holding the frame, if any
+    slot: object = None
+
+    def release(self):
+        """Hands the frame buffer back to the grabber once the frame is no longer needed"""
+        if self.slot is not None:
+            self.slot.release()
+
+
+class DropPolicy(Enum):
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    EVERY_NTH = 'every_nth'
+
+
+class FrameQueue(queue.Queue):
+    """
+    Bounded queue between the capture and the processing of frames.
+    When it is full, the policy decides whether the producer blocks or
+    which frame is dropped. With EVERY_NTH only every keep_every-th frame
+    is queued at all (and the producer blocks when the queue is full).
+
+    Dropped frames are counted and passed to on_drop, so the gap can be
+    recorded in the data file.
+    """
+
+    def __init__(self, maxsize=0, policy=DropPolicy.BLOCK, keep_every=1, on_drop=None):
+        super().__init__(maxsize)
+        self.policy = DropPolicy(policy)
+        self.keep_every = keep_every
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._offered = 0
+
+    def put(self, item, block=True, timeout=None):
+        """Offers a frame to the queue. Returns False if the frame was dropped."""
+        self._offered += 1
+        if self.policy == DropPolicy.EVERY_NTH and (self._offered - 1) % self.keep_every:
+            self._drop(item)
+            return False
+        if self.policy in (DropPolicy.BLOCK, DropPolicy.EVERY_NTH):
+            super().put(item, block, timeout)
+            return True
+
+        dropped = None
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                if self.policy == DropPolicy.DROP_NEWEST:
+                    dropped = item
+                else:
+                    dropped = self._get()
+            if dropped is not item:
+                self._put(item)
+                if dropped is None:
+                    self.unfinished_tasks += 1
+                self.not_empty.notify()
+        if dropped is not None:
+            self._drop(dropped)
+            return dropped is not item
+        return True
+
+    def _drop(self, item):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(item)
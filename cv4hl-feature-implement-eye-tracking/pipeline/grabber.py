@@ -0,0 +1,119 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameSlot:
+    """
+    One preallocated frame buffer of the grabber ring. A slot handed out by
+    FrameGrabber.next_frame stays reserved until release() is called.
+    """
+
+    def __init__(self, index, shape):
+        self.index = index
+        self.frame = np.empty(shape, np.uint8)
+        self.timestamp = None
+        self.led_point = None
+        self.grab_number = -1
+        self.in_use = False
+
+    def release(self):
+        self.in_use = False
+
+
+class FrameGrabber:
+    """
+    Reads the camera continuously on a dedicated thread into a fixed ring of
+    preallocated frame buffers. Every frame is timestamped right after grab(),
+    together with the LED position at that time, and flipped straight into its
+    slot, so no frame is allocated while capturing.
+
+    Consumers take the most recent frame with next_frame(); frames that are
+    not taken in time are overwritten. When every slot is still reserved, the
+    grabbed frame is discarded and counted as an overrun.
+    """
+
+    def __init__(self, cap, width, height, num_slots=8, led_position=None):
+        self.cap = cap
+        self.led_position = led_position
+        self._raw = np.empty((height, width, 3), np.uint8)
+        self._slots = [FrameSlot(i, (height, width, 3)) for i in range(num_slots)]
+        self._next_slot = 0
+        self._latest = None
+        self._last_taken = -1
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.grabbed = 0
+        self.overruns = 0
+        # A camera never runs out of frames, unlike a replayed session
+        self.exhausted = False
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        with self._condition:
+            self._condition.notify_all()
+
+    def _free_slot(self):
+        # The latest frame is kept until a newer one is ready
+        for offset in range(len(self._slots)):
+            slot = self._slots[(self._next_slot + offset) % len(self._slots)]
+            if not slot.in_use and slot is not self._latest:
+                self._next_slot = (slot.index + 1) % len(self._slots)
+                return slot
+        return None
+
+    def _run(self):
+        while self._running:
+            if not self.cap.grab():
+                time.sleep(0.001)
+                continue
+            timestamp = time.time()
+            led_point = self.led_position() if self.led_position is not None else None
+
+            with self._condition:
+                slot = self._free_slot()
+            if slot is None:
+                self.overruns += 1
+                continue
+
+            ret, raw = self.cap.retrieve(self._raw)
+            if not ret:
+                continue
+            if raw.shape == slot.frame.shape:
+                cv2.flip(raw, 1, slot.frame)
+            else:
+                # The camera doesn't deliver the configured frame size
+                slot.frame = cv2.flip(raw, 1)
+
+            with self._condition:
+                slot.timestamp = timestamp
+                slot.led_point = led_point
+                slot.grab_number = self.grabbed
+                self.grabbed += 1
+                self._latest = slot
+                self._condition.notify_all()
+
+    def next_frame(self, timeout=None):
+        """Waits for a frame newer than the previous one taken and reserves its slot.
+        Returns None on timeout or when the grabber is stopped."""
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: not self._running or (self._latest is not None and self._latest.grab_number > self._last_taken),
+                    timeout):
+                return None
+            if not self._running:
+                return None
+            slot = self._latest
+            slot.in_use = True
+            self._last_taken = slot.grab_number
+            return slot
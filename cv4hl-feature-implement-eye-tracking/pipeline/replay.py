@@ -0,0 +1,183 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from led_point.point import Point
+from led_point.trajectory import Trajectory
+from pipeline.archive import FRAMES_EXTENSION, SessionArchiveReader, frame_files
+
+SCREEN_HEIGHT = 1080
+CALIBRATION_DURATION = 5
+
+
+class ReplayFrame:
+    """A recorded frame, handed out like a grabber slot"""
+
+    def __init__(self, frame, timestamp, led_point):
+        self.frame = frame
+        self.timestamp = timestamp
+        self.led_point = led_point
+
+    def release(self):
+        pass
+
+
+def read_led_positions(data_file_path):
+    """Reads the LED positions (in screen coordinates) of a recorded data file.
+    Returns a list of (timestamp or None, Point)."""
+    positions = []
+    with open(data_file_path, 'r') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        if 'led_x' not in header:
+            return positions
+        for row in reader:
+            status = row[4].strip()
+            led_x, led_y = float(row[5]), float(row[6])
+            # Valid, predicted and dropped rows store the LED in cartesian coordinates
+            if status != 'not_valid':
+                led_y = SCREEN_HEIGHT - led_y
+            timestamp = float(row[8]) if len(row) > 8 and row[8].strip() else None
+            positions.append((timestamp, Point(led_x, led_y)))
+    return positions
+
+
+class ReplaySource:
+    """
+    Feeds the frames of a recorded session into the capture pipeline in place
+    of the camera and the FrameGrabber. The session is either a directory of
+    frame_<timestamp>.jpg files or a session archive.
+
+    The LED positions are taken from the data.csv next to the frames: rows
+    with timestamps are matched by timestamp, older files without timestamps
+    are aligned to the last frames. The frames before the first data row are
+    the calibration frames. Without LED positions in a data file they are
+    reconstructed from the trajectory.csv of the session (the frames before
+    the LED started moving are the calibration frames), or else the LED is
+    at the screen center and the first 5 s are used for calibration.
+
+    With realtime set, next_frame() hands out the frames at their original
+    pace, otherwise as fast as they are requested.
+    """
+
+    def __init__(self, session, realtime=False, prefetch=16, screen_size=(1920, 1080)):
+        self.realtime = realtime
+        self.exhausted = False
+        self.overruns = 0
+        self.position = 0
+        self._archive = None
+        if os.path.exists(session + FRAMES_EXTENSION):
+            self._archive = SessionArchiveReader(session)
+            self.timestamps = [float(timestamp) for timestamp in self._archive.timestamps]
+            directory = os.path.dirname(session)
+        else:
+            files = frame_files(session)
+            self.timestamps = [timestamp for timestamp, _ in files]
+            self._files = [file_path for _, file_path in files]
+            directory = session
+        if not self.timestamps:
+            raise ValueError(f"No recorded frames found in {session}")
+
+        center = Point(screen_size[0] // 2, screen_size[1] // 2)
+        self.led_points = [center] * len(self.timestamps)
+        self.calibration_frames = sum(1 for t in self.timestamps if t - self.timestamps[0] < CALIBRATION_DURATION)
+        trajectory_file_path = os.path.join(directory, 'trajectory.csv')
+        if os.path.exists(trajectory_file_path):
+            trajectory = Trajectory.load(trajectory_file_path)
+            x, y = trajectory.position_at(np.array(self.timestamps))
+            self.led_points = [Point(led_x, led_y) for led_x, led_y in zip(x.tolist(), y.tolist())]
+            # The LED starts moving once the calibration is done
+            self.calibration_frames = sum(1 for t in self.timestamps if t < trajectory.start_time)
+        data_file_path = os.path.join(directory, 'data.csv')
+        if os.path.exists(data_file_path):
+            self._match_led_positions(read_led_positions(data_file_path))
+
+        self._frames = queue.Queue(maxsize=prefetch)
+        self._running = False
+        self._thread = None
+        self._start_time = None
+
+    def _match_led_positions(self, positions):
+        if not positions:
+            return
+        if positions[0][0] is not None:
+            by_timestamp = {timestamp: led_point for timestamp, led_point in positions}
+            self.calibration_frames = sum(1 for t in self.timestamps if t < positions[0][0])
+            for i, timestamp in enumerate(self.timestamps):
+                self.led_points[i] = by_timestamp.get(timestamp, self.led_points[i])
+        else:
+            self.calibration_frames = max(len(self.timestamps) - len(positions), 0)
+            num_data_frames = len(self.timestamps) - self.calibration_frames
+            for i, (_, led_point) in enumerate(positions[-num_data_frames:]):
+                self.led_points[self.calibration_frames + i] = led_point
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def is_calibrating(self):
+        return self.position < self.calibration_frames
+
+    def skip_calibration(self):
+        """Discards the calibration frames that were not used"""
+        while self.is_calibrating() and self.next_frame(timeout=1) is not None:
+            pass
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._load, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        if self._archive is not None:
+            self._archive.close()
+
+    def _put(self, replay_frame):
+        while self._running:
+            try:
+                self._frames.put(replay_frame, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _load(self):
+        # Decodes the frames ahead of the pipeline
+        for i, timestamp in enumerate(self.timestamps):
+            if self._archive is not None:
+                frame, _ = self._archive.read(i)
+            else:
+                frame = cv2.imread(self._files[i])
+            if not self._put(ReplayFrame(frame, timestamp, self.led_points[i])):
+                return
+        self._put(None)
+
+    def next_frame(self, timeout=None):
+        """Returns the next recorded frame, or None on timeout and at the end of the session"""
+        if self.exhausted:
+            return None
+        try:
+            replay_frame = self._frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if replay_frame is None:
+            self.exhausted = True
+            return None
+
+        if self.realtime:
+            # The original pace is measured from the first frame handed out
+            offset = replay_frame.timestamp - self.timestamps[0]
+            if self._start_time is None:
+                self._start_time = time.monotonic() - offset
+            delay = self._start_time + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.position += 1
+        return replay_frame
@@ -0,0 +1,166 @@
+import abc
+import atexit
+import threading
+import time
+
+# Columns of a result row, in order. "valid" holds the status of the row:
+# valid, predicted, not_valid or dropped
+COLUMNS = ("left_pupil_x", "left_pupil_y", "right_pupil_x", "right_pupil_y", "valid", "led_x", "led_y",
+           "sequence", "timestamp")
+
+
+class ResultSink(abc.ABC):
+    """
+    Destination of the result rows of a session, one row per frame in
+    capture order. A row is a tuple of the COLUMNS values. Formats plug in
+    by implementing write(); write() must not block on file I/O, since it is
+    called on the processing path.
+    """
+
+    @abc.abstractmethod
+    def write(self, row):
+        """Appends a row"""
+
+    def set_calibration(self, calibration, screen_size=None):
+        """Stores the calibrated pupil positions (left_x, left_y, right_x, right_y)
+        with the rows, if the format has room for them"""
+
+    def flush(self):
+        """Returns once every row written so far is stored"""
+
+    def close(self):
+        """Flushes the rows and releases the sink"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BufferedResultSink(ResultSink):
+    """
+    Keeps one file open and writes the rows on a background thread, in
+    batches of up to max_rows rows, at least every flush_interval seconds.
+    write() only queues the row. The rows left are written when the sink is
+    closed, at the latest when the interpreter exits (e.g. after Ctrl+C).
+    Subclasses define how rows are encoded (header() and format_rows()).
+
+    If the writer thread fails (e.g. the disk is full), the next write(),
+    flush() or close() raises the error instead of buffering on.
+    """
+
+    def __init__(self, path, flush_interval=1.0, max_rows=256, mode="w"):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.rows_written = 0
+        self._file = open(path, mode)
+        header = self.header()
+        if header:
+            self._file.write(header)
+            self._file.flush()
+        self._rows = []
+        # Rows taken by the writer thread but not written yet
+        self._writing = 0
+        self._flush_requested = False
+        self._closed = False
+        # Error the writer thread stopped with
+        self._error = None
+        self._condition = threading.Condition()
+        self._writer = threading.Thread(target=self._write_batches, name="result-sink", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def header(self):
+        """Returns what is written at the start of the file"""
+        return ""
+
+    @abc.abstractmethod
+    def format_rows(self, rows):
+        """Returns the rows encoded for the file"""
+
+    def _store(self, rows):
+        """Writes a batch of rows to the file, on the writer thread"""
+        if rows:
+            self._file.write(self.format_rows(rows))
+            self._file.flush()
+
+    def _check_writer(self):
+        """Raises the error the writer thread stopped with, if any"""
+        if self._error is not None:
+            raise RuntimeError(f"Writing the rows to {self.path} failed") from self._error
+
+    def write(self, row):
+        with self._condition:
+            self._check_writer()
+            if self._closed:
+                raise ValueError(f"Write to closed sink {self.path}")
+            self._rows.append(row)
+            if len(self._rows) >= self.max_rows:
+                self._condition.notify_all()
+
+    def _write_batches(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._rows) < self.max_rows and not (self._closed or self._flush_requested):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                rows, self._rows = self._rows, []
+                self._writing = len(rows)
+                self._flush_requested = False
+                closed = self._closed
+            try:
+                self._store(rows)
+            except BaseException as e:
+                with self._condition:
+                    self._error = e
+                    self._writing = 0
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self.rows_written += self._writing
+                self._writing = 0
+                self._condition.notify_all()
+                if closed and not self._rows:
+                    return
+
+    def flush(self):
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while (self._rows or self._writing) and self._writer.is_alive():
+                self._condition.wait(self.flush_interval)
+            self._check_writer()
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join()
+        self._file.close()
+        atexit.unregister(self.close)
+        self._check_writer()
+
+
+class CsvResultSink(BufferedResultSink):
+    """Writes the rows to a data.csv file"""
+
+    def header(self):
+        return ",".join(COLUMNS) + "\n"
+
+    def format_rows(self, rows):
+        return "".join([self.format_row(*row) for row in rows])
+
+    @staticmethod
+    def format_row(left_x, left_y, right_x, right_y, status, led_x, led_y, sequence, timestamp):
+        timestamp = '' if timestamp is None else timestamp
+        if status == "not_valid":
+            # not_valid rows have always been written with spaces around the LED position
+            return f'{left_x},{left_y},{right_x},{right_y}, {status}, {led_x}, {led_y},{sequence},{timestamp}\n'
+        return f'{left_x},{left_y},{right_x},{right_y}, {status},{led_x},{led_y},{sequence},{timestamp}\n'
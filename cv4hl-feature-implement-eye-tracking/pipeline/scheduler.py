@@ -0,0 +1,70 @@
+import time
+from enum import Enum
+
+
+class LatePolicy(Enum):
+    SKIP = 'skip'
+    CATCH_UP = 'catch_up'
+
+
+class CaptureScheduler:
+    """
+    Runs a task at a fixed rate in one long-lived loop. The deadlines are
+    taken from time.monotonic(), so they don't drift with the task duration
+    or with changes of the wall clock.
+
+    When the task overruns, SKIP drops the missed deadlines but the last
+    one, for which the task runs at once, and goes on with the schedule.
+    CATCH_UP runs the task back to back for the missed deadlines until the
+    schedule is met again; if more than max_catch_up + 1 are missed, the
+    oldest ones are dropped.
+    """
+
+    def __init__(self, fps, late_policy=LatePolicy.SKIP, max_catch_up=5):
+        self.period = 1 / fps
+        self.late_policy = LatePolicy(late_policy)
+        self.max_catch_up = max_catch_up
+        self.ticks = 0
+        self.skipped = 0
+        self._lateness_sum = 0.0
+        self._lateness_square_sum = 0.0
+        self.max_lateness = 0.0
+
+    def run(self, task, is_active):
+        """Calls task() on every deadline as long as is_active() returns True"""
+        deadline = time.monotonic()
+        while is_active():
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(deadline - now)
+                now = time.monotonic()
+            self._record(now - deadline)
+
+            task()
+
+            deadline += self.period
+            behind = int((time.monotonic() - deadline) // self.period)
+            if self.late_policy == LatePolicy.CATCH_UP:
+                behind -= self.max_catch_up
+            if behind > 0:
+                self.skipped += behind
+                deadline += behind * self.period
+
+    def _record(self, lateness):
+        self.ticks += 1
+        self._lateness_sum += lateness
+        self._lateness_square_sum += lateness ** 2
+        self.max_lateness = max(self.max_lateness, lateness)
+
+    def jitter(self):
+        """Returns the mean and the standard deviation of the lateness of the task start in seconds"""
+        if self.ticks == 0:
+            return 0.0, 0.0
+        mean = self._lateness_sum / self.ticks
+        variance = max(self._lateness_square_sum / self.ticks - mean ** 2, 0.0)
+        return mean, variance ** 0.5
+
+    def report(self):
+        mean, std = self.jitter()
+        return (f"Capture schedule: {self.ticks} frames at {1 / self.period:.1f} fps, {self.skipped} deadlines skipped, "
+                f"lateness mean {mean * 1000:.2f} ms, std {std * 1000:.2f} ms, max {self.max_lateness * 1000:.2f} ms")
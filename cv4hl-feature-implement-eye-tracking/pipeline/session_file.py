@@ -0,0 +1,340 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from pipeline.result_sink import BufferedResultSink, CsvResultSink, COLUMNS
+
+SESSION_EXTENSION = ".gaze"
+MAGIC = b"GAZESESSION\n"
+# Version of the record layout, files of other versions are not read
+VERSION = 2
+# The header is padded to a fixed size, so it can be rewritten in place
+# (e.g. once the calibration is known) while rows are appended
+HEADER_SIZE = 4096
+SCREEN_SIZE = (1920, 1080)
+
+# Status codes of the status column, in the order of the codes
+STATUSES = ("valid", "predicted", "not_valid", "dropped")
+VALID, PREDICTED, NOT_VALID, DROPPED = range(len(STATUSES))
+
+# The status byte comes last and the records are padded to a multiple of 8
+# bytes, so every number of a memory mapped file is aligned (the header
+# size is a multiple of 8 as well)
+SAMPLE_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("sequence", "<i8"),
+    ("left_pupil_x", "<f8"),
+    ("left_pupil_y", "<f8"),
+    ("right_pupil_x", "<f8"),
+    ("right_pupil_y", "<f8"),
+    # LED position in cartesian coordinates (y up), for every status
+    ("led_x", "<f8"),
+    ("led_y", "<f8"),
+    ("status", "u1"),
+], align=True)
+
+
+def _header(calibration=None, screen_size=SCREEN_SIZE):
+    metadata = {
+        "version": VERSION,
+        "dtype": SAMPLE_DTYPE.descr,
+        "statuses": STATUSES,
+        "calibration": None if calibration is None else [float(value) for value in calibration],
+        "screen_size": list(screen_size),
+    }
+    header = MAGIC + json.dumps(metadata).encode("utf-8")
+    if len(header) >= HEADER_SIZE:
+        raise ValueError(f"Session header longer than {HEADER_SIZE} bytes")
+    return header.ljust(HEADER_SIZE - 1) + b"\n"
+
+
+def _read_metadata(path, header):
+    """Returns the metadata of a session header"""
+    if not header.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session file")
+    metadata = json.loads(header[len(MAGIC):].decode("utf-8"))
+    if metadata["version"] != VERSION:
+        raise ValueError(f"{path} is a session file of version {metadata['version']}, expected {VERSION}")
+    return metadata
+
+
+def _records(rows, screen_height=SCREEN_SIZE[1]):
+    """Converts result rows (see result_sink.COLUMNS) into a structured array of samples"""
+    records = np.zeros(len(rows), SAMPLE_DTYPE)
+    if not rows:
+        return records
+    left_x, left_y, right_x, right_y, status, led_x, led_y, sequence, timestamp = zip(*rows)
+    status = np.array(status)
+    codes = records["status"]
+    for code, name in enumerate(STATUSES):
+        codes[status == name] = code
+    records["left_pupil_x"] = left_x
+    records["left_pupil_y"] = left_y
+    records["right_pupil_x"] = right_x
+    records["right_pupil_y"] = right_y
+    records["led_x"] = led_x
+    led_y = np.array(led_y, dtype=float)
+    # not_valid rows carry the LED in screen coordinates
+    records["led_y"] = np.where(codes == NOT_VALID, screen_height - led_y, led_y)
+    records["sequence"] = sequence
+    # Rows without a timestamp (None) get NaN
+    records["timestamp"] = np.array(timestamp, dtype=float)
+    return records
+
+
+class SessionFileSink(BufferedResultSink):
+    """
+    Appends the result rows to a session file: a JSON header followed by
+    the rows as SAMPLE_DTYPE records. The rows are appended in batches by
+    the writer thread, the file can be read while it grows.
+    """
+
+    def __init__(self, path, flush_interval=1.0, max_rows=256, screen_size=SCREEN_SIZE):
+        self.screen_size = tuple(screen_size)
+        self.calibration = None
+        self._header_changed = False
+        super().__init__(path, flush_interval, max_rows, mode="wb")
+
+    def header(self):
+        return _header(self.calibration, self.screen_size)
+
+    def set_calibration(self, calibration, screen_size=None):
+        with self._condition:
+            self.calibration = tuple(calibration)
+            if screen_size is not None:
+                self.screen_size = tuple(screen_size)
+            self._header_changed = True
+
+    def format_rows(self, rows):
+        return _records(rows, self.screen_size[1]).tobytes()
+
+    def _store(self, rows):
+        with self._condition:
+            header = self.header() if self._header_changed else None
+            self._header_changed = False
+        if header is not None:
+            end = self._file.tell()
+            self._file.seek(0)
+            self._file.write(header)
+            self._file.seek(end)
+        super()._store(rows)
+        if header is not None and not rows:
+            self._file.flush()
+
+
+class SessionFile:
+    """
+    Reads a session file. The file is memory mapped: the columns are views
+    of the file, nothing is parsed or copied until the values are used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            header = file.read(HEADER_SIZE)
+        metadata = _read_metadata(path, header)
+        self.statuses = tuple(metadata["statuses"])
+        self.calibration = None if metadata["calibration"] is None else tuple(metadata["calibration"])
+        self.screen_size = tuple(metadata["screen_size"])
+        # A batch being appended may end in a partial record
+        count = (os.path.getsize(path) - HEADER_SIZE) // SAMPLE_DTYPE.itemsize
+        if count > 0:
+            self.samples = np.memmap(path, SAMPLE_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.samples = np.zeros(0, SAMPLE_DTYPE)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, column):
+        """Returns a column (e.g. "timestamp" or "left_pupil_x") as a view of the file"""
+        return self.samples[column]
+
+    @property
+    def valid(self):
+        """Boolean array, true for the rows with both pupils located"""
+        return self.samples["status"] == self.statuses.index("valid")
+
+    def close(self):
+        self.samples = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionTail:
+    """
+    Follows a data.csv or session file while it is being written. The file
+    offset of the data read so far is kept, so every read() only parses the
+    rows appended since the previous one. Partial rows at the end of the
+    file are left for the next read().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.calibration = None
+        self.screen_size = SCREEN_SIZE
+        # True after a read() that found the file rewritten from the start (e.g. a new session)
+        self.restarted = False
+        self._offset = 0
+        self._rows = 0
+
+    def _reset(self):
+        self.calibration = None
+        self._offset = 0
+        self._rows = 0
+        self.restarted = True
+
+    def read(self):
+        """Returns the samples appended since the last call, as a structured array"""
+        self.restarted = False
+        if not os.path.exists(self.path):
+            return np.zeros(0, SAMPLE_DTYPE)
+        if os.path.getsize(self.path) < self._offset:
+            self._reset()
+        if self.path.endswith(SESSION_EXTENSION):
+            return self._read_session_file()
+        return self._read_data_file()
+
+    def _read_session_file(self):
+        with open(self.path, "rb") as file:
+            header = file.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+                return np.zeros(0, SAMPLE_DTYPE)
+            # The calibration is written into the header once it is known
+            metadata = _read_metadata(self.path, header)
+            self.calibration = None if metadata["calibration"] is None else tuple(metadata["calibration"])
+            self.screen_size = tuple(metadata["screen_size"])
+            self._offset = max(self._offset, HEADER_SIZE)
+            file.seek(self._offset)
+            data = file.read()
+        count = len(data) // SAMPLE_DTYPE.itemsize
+        self._offset += count * SAMPLE_DTYPE.itemsize
+        self._rows += count
+        return np.frombuffer(data, SAMPLE_DTYPE, count)
+
+    def _read_data_file(self):
+        if self.calibration is None:
+            calibration_file_path = os.path.join(os.path.dirname(self.path), "calibration.csv")
+            if os.path.exists(calibration_file_path):
+                calibration, screen_size = read_calibration_file(calibration_file_path)
+                if len(calibration) == 4:
+                    self.calibration = calibration
+                    self.screen_size = screen_size or SCREEN_SIZE
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        # Only complete lines are parsed
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].decode("utf-8").splitlines()
+        if self._offset == 0 and lines:
+            lines = lines[1:]  # Skip the header row
+        self._offset += end
+        samples = _parse_rows(list(csv.reader(lines)), self._rows, self.screen_size[1])
+        self._rows += len(lines)
+        return samples
+
+
+def save_session(path, samples, calibration=None, screen_size=SCREEN_SIZE):
+    """Writes a structured array of samples (see SAMPLE_DTYPE) to a new session file"""
+    if samples.dtype != SAMPLE_DTYPE:
+        raise ValueError(f"Samples of dtype {samples.dtype} instead of SAMPLE_DTYPE")
+    with open(path, "wb") as file:
+        file.write(_header(calibration, screen_size))
+        file.write(np.ascontiguousarray(samples).tobytes())
+
+
+def read_calibration_file(calibration_file_path):
+    """Returns the calibrated pupil positions (left_x, left_y, right_x, right_y)
+    and the screen size of a calibration.csv file, None if it has none"""
+    with open(calibration_file_path, "r") as file:
+        values = [float(value) for value in file.readline().split(",") if value.strip()]
+    screen_size = tuple(int(value) for value in values[4:6]) if len(values) >= 6 else None
+    return tuple(values[:4]), screen_size
+
+
+def _parse_rows(rows, first_number=0, screen_height=SCREEN_SIZE[1]):
+    """Parses data.csv rows (lists of fields) into a structured array of samples. Rows
+    without a sequence number are numbered from first_number on."""
+    parsed = []
+    for number, row in enumerate(rows, first_number):
+        if not row:
+            continue
+        row = [field.strip() for field in row] + [""] * (len(COLUMNS) - len(row))
+        left_x, left_y, right_x, right_y = (float(value) for value in row[:4])
+        led_x, led_y = (float(value) if value else np.nan for value in row[5:7])
+        sequence = int(row[7]) if row[7] else number
+        timestamp = float(row[8]) if row[8] else None
+        parsed.append((left_x, left_y, right_x, right_y, row[4], led_x, led_y, sequence, timestamp))
+    return _records(parsed, screen_height)
+
+
+def read_data_file(data_file_path, screen_height=SCREEN_SIZE[1]):
+    """Parses a data.csv file into a structured array of samples. Older files
+    without LED positions, sequence numbers or timestamps are supported."""
+    with open(data_file_path, "r", newline="") as file:
+        reader = csv.reader(file)
+        next(reader)  # Skip the header row
+        return _parse_rows(list(reader), 0, screen_height)
+
+
+def import_csv(data_file_path, path, calibration_file_path=None):
+    """Converts a data.csv file (and its calibration.csv) into a session file.
+    Returns the number of rows."""
+    calibration, screen_size = None, None
+    if calibration_file_path is not None and os.path.exists(calibration_file_path):
+        calibration, screen_size = read_calibration_file(calibration_file_path)
+    screen_size = screen_size or SCREEN_SIZE
+    samples = read_data_file(data_file_path, screen_size[1])
+    save_session(path, samples, calibration, screen_size)
+    return len(samples)
+
+
+def export_csv(path, data_file_path, calibration_file_path=None):
+    """Writes a session file back as data.csv (and calibration.csv) files"""
+    with SessionFile(path) as session:
+        samples = session.samples
+        led_y = samples["led_y"].copy()
+        not_valid = samples["status"] == session.statuses.index("not_valid")
+        led_y[not_valid] = session.screen_size[1] - led_y[not_valid]
+        timestamps = [None if np.isnan(timestamp) else timestamp for timestamp in samples["timestamp"].tolist()]
+        columns = zip(samples["left_pupil_x"].tolist(), samples["left_pupil_y"].tolist(),
+                      samples["right_pupil_x"].tolist(), samples["right_pupil_y"].tolist(),
+                      [session.statuses[status] for status in samples["status"].tolist()],
+                      samples["led_x"].tolist(), led_y.tolist(), samples["sequence"].tolist(), timestamps)
+        with open(data_file_path, "w") as file:
+            file.write(",".join(COLUMNS) + "\n")
+            file.write("".join([CsvResultSink.format_row(*row) for row in columns]))
+        if calibration_file_path is not None and session.calibration is not None:
+            width, height = session.screen_size
+            with open(calibration_file_path, "w") as file:
+                file.write(",".join(str(value) for value in session.calibration) + f", {width}, {height}\n")
+        return len(samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts sessions between data.csv files and session files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Converts a data.csv file into a session file")
+    import_parser.add_argument("data_file", help="data.csv file")
+    import_parser.add_argument("session_file", help=f"Session file to create (e.g. data{SESSION_EXTENSION})")
+    import_parser.add_argument("--calibration", help="calibration.csv file of the session")
+    export_parser = commands.add_parser("export", help="Converts a session file into a data.csv file")
+    export_parser.add_argument("session_file", help="Session file")
+    export_parser.add_argument("data_file", help="data.csv file to create")
+    export_parser.add_argument("--calibration", help="calibration.csv file to create")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "import":
+        count = import_csv(args.data_file, args.session_file, args.calibration)
+    else:
+        count = export_csv(args.session_file, args.data_file, args.calibration)
+    print(f"{count} rows converted in {time.perf_counter() - start:.3f} s.")
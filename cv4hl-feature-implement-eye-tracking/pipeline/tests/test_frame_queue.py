@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from pipeline.frame_queue import CapturedFrame, DropPolicy, FrameQueue
+
+
+def drain(frame_queue):
+    items = []
+    while not frame_queue.empty():
+        items.append(frame_queue.get_nowait())
+        frame_queue.task_done()
+    return items
+
+
+def test_block_waits_for_a_free_place():
+    frame_queue = FrameQueue(2, DropPolicy.BLOCK)
+    assert frame_queue.put(1) and frame_queue.put(2)
+    producer = threading.Thread(target=frame_queue.put, args=(3,), daemon=True)
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+
+    assert frame_queue.get() == 1
+    frame_queue.task_done()
+    producer.join(1)
+    assert not producer.is_alive()
+    assert drain(frame_queue) == [2, 3]
+    assert frame_queue.dropped == 0
+
+
+def test_drop_oldest_keeps_the_newest_frames():
+    dropped = []
+    frame_queue = FrameQueue(2, DropPolicy.DROP_OLDEST, on_drop=dropped.append)
+    results = [frame_queue.put(item) for item in range(5)]
+
+    assert results == [True] * 5
+    assert dropped == [0, 1, 2]
+    assert frame_queue.dropped == 3
+    assert drain(frame_queue) == [3, 4]
+    assert frame_queue.unfinished_tasks == 0
+
+
+def test_drop_newest_keeps_the_queued_frames():
+    dropped = []
+    frame_queue = FrameQueue(2, "drop_newest", on_drop=dropped.append)
+    results = [frame_queue.put(item) for item in range(5)]
+
+    assert results == [True, True, False, False, False]
+    assert dropped == [2, 3, 4]
+    assert drain(frame_queue) == [0, 1]
+    assert frame_queue.unfinished_tasks == 0
+
+
+def test_every_nth_queues_one_frame_in_keep_every():
+    dropped = []
+    frame_queue = FrameQueue(0, DropPolicy.EVERY_NTH, keep_every=3, on_drop=dropped.append)
+    results = [frame_queue.put(item) for item in range(7)]
+
+    assert results == [True, False, False, True, False, False, True]
+    assert drain(frame_queue) == [0, 3, 6]
+    assert dropped == [1, 2, 4, 5]
+    assert frame_queue.dropped == 4
+
+
+def test_unbounded_queue_never_drops():
+    frame_queue = FrameQueue(0, DropPolicy.DROP_OLDEST)
+    for item in range(100):
+        frame_queue.put(item)
+
+    assert frame_queue.dropped == 0
+    assert frame_queue.qsize() == 100
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        FrameQueue(2, "drop_random")
+
+
+def test_captured_frame_releases_its_slot():
+    class Slot:
+        released = 0
+
+        def release(self):
+            self.released += 1
+
+    slot = Slot()
+    CapturedFrame(0, 0.0, None, None, slot).release()
+    CapturedFrame(1, 0.0, None, None).release()
+    assert slot.released == 1
@@ -0,0 +1,100 @@
+import pytest
+
+from pipeline import scheduler
+from pipeline.scheduler import CaptureScheduler, LatePolicy
+
+
+class FakeClock:
+    """Replaces the time module of the scheduler: sleeping advances the clock at once"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, duration):
+        assert duration >= 0
+        self.now += duration
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, "time", clock)
+    return clock
+
+
+def run(capture_scheduler, clock, durations):
+    """Runs the task once per duration, each run taking that long.
+    Returns the start times of the runs relative to the first one."""
+    starts = []
+
+    def task():
+        starts.append(clock.now)
+        clock.now += durations[len(starts) - 1]
+
+    capture_scheduler.run(task, lambda: len(starts) < len(durations))
+    return [start - starts[0] for start in starts]
+
+
+def test_task_starts_on_fixed_deadlines(clock):
+    capture_scheduler = CaptureScheduler(10)
+    starts = run(capture_scheduler, clock, [0.03] * 5)
+
+    assert starts == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4])
+    assert capture_scheduler.ticks == 5
+    assert capture_scheduler.skipped == 0
+    assert capture_scheduler.jitter() == pytest.approx((0.0, 0.0))
+
+
+def test_deadlines_do_not_drift_with_the_task_duration(clock):
+    capture_scheduler = CaptureScheduler(10)
+    starts = run(capture_scheduler, clock, [0.01, 0.09, 0.05, 0.02, 0.08, 0.0])
+
+    assert starts == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+
+
+def test_skip_drops_the_missed_deadlines(clock):
+    capture_scheduler = CaptureScheduler(10, LatePolicy.SKIP)
+    # The second run ends at 0.45, after the deadlines 0.2, 0.3 and 0.4
+    starts = run(capture_scheduler, clock, [0.0, 0.35, 0.0, 0.0])
+
+    # 0.2 and 0.3 are dropped, 0.4 runs at once, then the schedule goes on
+    assert starts == pytest.approx([0.0, 0.1, 0.45, 0.5])
+    assert capture_scheduler.skipped == 2
+    assert capture_scheduler.max_lateness == pytest.approx(0.05)
+
+
+def test_catch_up_runs_the_missed_deadlines_back_to_back(clock):
+    capture_scheduler = CaptureScheduler(10, LatePolicy.CATCH_UP)
+    starts = run(capture_scheduler, clock, [0.0, 0.35, 0.0, 0.0, 0.0, 0.0])
+
+    assert starts == pytest.approx([0.0, 0.1, 0.45, 0.45, 0.45, 0.5])
+    assert capture_scheduler.skipped == 0
+
+
+def test_catch_up_is_limited(clock):
+    capture_scheduler = CaptureScheduler(10, "catch_up", max_catch_up=2)
+    # The second run ends at 0.65, after the deadlines 0.2 to 0.6
+    starts = run(capture_scheduler, clock, [0.0, 0.55, 0.0, 0.0, 0.0, 0.0])
+
+    # 0.2 and 0.3 are dropped, 0.4 to 0.6 are caught up
+    assert starts == pytest.approx([0.0, 0.1, 0.65, 0.65, 0.65, 0.7])
+    assert capture_scheduler.skipped == 2
+
+
+def test_jitter_is_the_lateness_of_the_task_starts(clock):
+    capture_scheduler = CaptureScheduler(10, LatePolicy.CATCH_UP)
+    run(capture_scheduler, clock, [0.0, 0.12, 0.0, 0.0])
+
+    # Lateness of the runs: 0, 0, 0.02, 0
+    mean, std = capture_scheduler.jitter()
+    assert mean == pytest.approx(0.005)
+    assert std == pytest.approx((0.02 ** 2 / 4 - 0.005 ** 2) ** 0.5)
+
+
+def test_report_without_ticks():
+    capture_scheduler = CaptureScheduler(30)
+    assert capture_scheduler.jitter() == (0.0, 0.0)
+    assert "0 frames at 30.0 fps" in capture_scheduler.report()
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from pipeline.result_sink import CsvResultSink
+from pipeline.session_file import (DROPPED, HEADER_SIZE, NOT_VALID, PREDICTED, SAMPLE_DTYPE, SCREEN_SIZE, VALID,
+                                   SessionFile, SessionFileSink, SessionTail, _records, export_csv, import_csv,
+                                   read_data_file, save_session)
+
+NAN = float("nan")
+ROWS = [
+    (-80.5, -11.25, 85.0, -8.0, "valid", 64.0, 1020.0, 0, 1721060919.5),
+    (-81.0, -11.0, 84.5, -8.5, "predicted", 77.0, 1020.0, 1, 1721060919.6),
+    (-81.0, -11.0, 84.5, -8.5, "not_valid", 90.0, 60.0, 2, 1721060919.7),
+    (NAN, NAN, NAN, NAN, "dropped", 103.0, 1020.0, 3, None),
+    (-79.0, -12.0, 86.0, -7.0, "valid", 116.0, 1020.0, 4, 1721060919.9),
+]
+CALIBRATION = (-78.45, -11.63, 88.23, -9.12)
+
+
+def assert_samples_equal(actual, expected):
+    assert actual.dtype.names == expected.dtype.names
+    for name in expected.dtype.names:
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+
+
+def write_csv(path, rows):
+    with CsvResultSink(str(path)) as sink:
+        for row in rows:
+            sink.write(row)
+
+
+def test_records_columns():
+    records = _records(ROWS, screen_height=1080)
+
+    assert records["status"].tolist() == [VALID, PREDICTED, NOT_VALID, DROPPED, VALID]
+    assert records["sequence"].tolist() == [0, 1, 2, 3, 4]
+    # not_valid rows carry the LED in screen coordinates, the records in cartesian ones
+    assert records["led_y"].tolist() == [1020.0, 1020.0, 1020.0, 1020.0, 1020.0]
+    assert np.isnan(records["timestamp"][3])
+    assert np.isnan(records["left_pupil_x"][3])
+    assert records["right_pupil_y"][0] == -8.0
+    assert len(_records([])) == 0
+
+
+def test_records_are_aligned():
+    assert SAMPLE_DTYPE.itemsize % 8 == 0
+    assert HEADER_SIZE % 8 == 0
+    for name in SAMPLE_DTYPE.names:
+        dtype, offset = SAMPLE_DTYPE.fields[name][:2]
+        assert offset % dtype.alignment == 0, name
+
+
+def test_csv_round_trip(tmp_path):
+    data_file = tmp_path / "data.csv"
+    calibration_file = tmp_path / "calibration.csv"
+    write_csv(data_file, ROWS)
+    calibration_file.write_text(",".join(str(value) for value in CALIBRATION) + ", 1920, 1080\n")
+
+    assert import_csv(str(data_file), str(tmp_path / "data.gaze"), str(calibration_file)) == len(ROWS)
+    assert export_csv(str(tmp_path / "data.gaze"), str(tmp_path / "export.csv"),
+                      str(tmp_path / "export_calibration.csv")) == len(ROWS)
+
+    assert (tmp_path / "export.csv").read_text() == data_file.read_text()
+    assert (tmp_path / "export_calibration.csv").read_text() == calibration_file.read_text()
+
+
+def test_session_file_columns(tmp_path):
+    data_file = tmp_path / "data.csv"
+    write_csv(data_file, ROWS)
+    import_csv(str(data_file), str(tmp_path / "data.gaze"))
+
+    with SessionFile(str(tmp_path / "data.gaze")) as session:
+        assert len(session) == len(ROWS)
+        assert session.calibration is None
+        assert session.screen_size == SCREEN_SIZE
+        assert session.valid.tolist() == [True, False, False, False, True]
+        assert session["led_x"].tolist() == [64.0, 77.0, 90.0, 103.0, 116.0]
+        assert_samples_equal(np.asarray(session.samples), read_data_file(str(data_file)))
+
+
+def test_sink_writes_a_session_file(tmp_path):
+    path = str(tmp_path / "data.gaze")
+    with SessionFileSink(path, flush_interval=0.01, max_rows=2) as sink:
+        for row in ROWS[:3]:
+            sink.write(row)
+        sink.flush()
+        with SessionFile(path) as session:
+            assert len(session) == 3
+            assert session.calibration is None
+        # The header is rewritten in place once the calibration is known
+        sink.set_calibration(CALIBRATION, (1280, 720))
+        for row in ROWS[3:]:
+            sink.write(row)
+
+    with SessionFile(path) as session:
+        assert session.calibration == CALIBRATION
+        assert session.screen_size == (1280, 720)
+        assert_samples_equal(np.asarray(session.samples), _records(ROWS, 1080))
+
+
+def test_partial_record_is_left_out(tmp_path):
+    path = tmp_path / "data.gaze"
+    save_session(str(path), _records(ROWS))
+    with open(path, "ab") as file:
+        file.write(b"\0" * (SAMPLE_DTYPE.itemsize // 2))
+
+    with SessionFile(str(path)) as session:
+        assert len(session) == len(ROWS)
+
+
+def test_files_of_other_versions_are_rejected(tmp_path):
+    path = tmp_path / "data.gaze"
+    save_session(str(path), _records(ROWS))
+    header = path.read_bytes()[:HEADER_SIZE].replace(b'"version": 2', b'"version": 1')
+    path.write_bytes(header + path.read_bytes()[HEADER_SIZE:])
+
+    with pytest.raises(ValueError):
+        SessionFile(str(path))
+    with pytest.raises(ValueError):
+        SessionTail(str(path)).read()
+
+
+def test_not_a_session_file(tmp_path):
+    path = tmp_path / "data.gaze"
+    path.write_bytes(b"left_pupil_x,left_pupil_y\n")
+    with pytest.raises(ValueError):
+        SessionFile(str(path))
@@ -0,0 +1,109 @@
+import numpy as np
+
+from pipeline.result_sink import COLUMNS, CsvResultSink
+from pipeline.session_file import HEADER_SIZE, SAMPLE_DTYPE, SessionTail, _header, _records
+
+ROWS = [(-80.0 - i, -10.0, 80.0 + i, -10.0, "valid", 100.0 + i, 1020.0, i, 0.1 * i) for i in range(6)]
+LINES = [CsvResultSink.format_row(*row) for row in ROWS]
+HEADER_LINE = ",".join(COLUMNS) + "\n"
+
+
+def test_csv_rows_are_read_once(tmp_path):
+    path = tmp_path / "data.csv"
+    tail = SessionTail(str(path))
+    assert len(tail.read()) == 0
+
+    path.write_text(HEADER_LINE + "".join(LINES[:2]))
+    assert tail.read()["sequence"].tolist() == [0, 1]
+    assert len(tail.read()) == 0
+
+    with open(path, "a") as file:
+        file.write("".join(LINES[2:4]))
+    samples = tail.read()
+    assert samples["sequence"].tolist() == [2, 3]
+    assert samples["left_pupil_x"].tolist() == [-82.0, -83.0]
+    assert not tail.restarted
+
+
+def test_partial_csv_lines_wait_for_the_next_read(tmp_path):
+    path = tmp_path / "data.csv"
+    # The header itself is incomplete at first
+    path.write_text(HEADER_LINE[:10])
+    tail = SessionTail(str(path))
+    assert len(tail.read()) == 0
+
+    with open(path, "a") as file:
+        file.write(HEADER_LINE[10:] + LINES[0] + LINES[1][:7])
+    assert tail.read()["sequence"].tolist() == [0]
+
+    with open(path, "a") as file:
+        file.write(LINES[1][7:])
+    samples = tail.read()
+    assert samples["sequence"].tolist() == [1]
+    assert samples["left_pupil_x"].tolist() == [-81.0]
+
+
+def test_rewritten_csv_restarts(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(HEADER_LINE + "".join(LINES[:4]))
+    tail = SessionTail(str(path))
+    assert len(tail.read()) == 4
+
+    # A new session overwrites the file
+    path.write_text(HEADER_LINE + LINES[0])
+    samples = tail.read()
+    assert tail.restarted
+    assert samples["sequence"].tolist() == [0]
+    tail.read()
+    assert not tail.restarted
+
+
+def test_csv_calibration_is_read_next_to_the_data_file(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(HEADER_LINE + LINES[0])
+    tail = SessionTail(str(path))
+    tail.read()
+    assert tail.calibration is None
+
+    (tmp_path / "calibration.csv").write_text("-78.5,-11.5,88.0,-9.0, 1280, 720\n")
+    tail.read()
+    assert tail.calibration == (-78.5, -11.5, 88.0, -9.0)
+    assert tail.screen_size == (1280, 720)
+
+
+def test_session_file_records_are_read_once(tmp_path):
+    path = tmp_path / "data.gaze"
+    records = _records(ROWS).tobytes()
+    size = SAMPLE_DTYPE.itemsize
+    # Nothing to read before the header is complete
+    path.write_bytes(_header()[:100])
+    tail = SessionTail(str(path))
+    assert len(tail.read()) == 0
+
+    path.write_bytes(_header() + records[:2 * size + 5])
+    samples = tail.read()
+    assert samples.dtype == SAMPLE_DTYPE
+    assert samples["sequence"].tolist() == [0, 1]
+    assert tail.calibration is None
+
+    # The calibration is written into the header while the rows are appended
+    with open(path, "r+b") as file:
+        file.write(_header((1.0, 2.0, 3.0, 4.0)))
+        file.seek(HEADER_SIZE + 2 * size + 5)
+        file.write(records[2 * size + 5:])
+    samples = tail.read()
+    assert samples["sequence"].tolist() == [2, 3, 4, 5]
+    assert tail.calibration == (1.0, 2.0, 3.0, 4.0)
+    np.testing.assert_array_equal(samples["led_x"], [102.0, 103.0, 104.0, 105.0])
+
+
+def test_rewritten_session_file_restarts(tmp_path):
+    path = tmp_path / "data.gaze"
+    path.write_bytes(_header() + _records(ROWS).tobytes())
+    tail = SessionTail(str(path))
+    assert len(tail.read()) == 6
+
+    path.write_bytes(_header() + _records(ROWS[:1]).tobytes())
+    samples = tail.read()
+    assert tail.restarted
+    assert samples["sequence"].tolist() == [0]
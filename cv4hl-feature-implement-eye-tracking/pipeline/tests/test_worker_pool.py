@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+
+import pytest
+
+from GazeTracking.gaze_tracking.calibration import FrozenCalibration
+from led_point.point import Point
+from pipeline.result_sink import CsvResultSink
+from pipeline.worker_pool import GazeWorkerPool
+
+
+class FakeGaze:
+    """Stands in for GazeTracking: a frame is its own result, after a random delay"""
+
+    def __init__(self):
+        self.calibration = FrozenCalibration(50, 60)
+
+    def analyze(self, frame, calibration, timestamp=None):
+        time.sleep(random.uniform(0, 0.01))
+        if frame is None:
+            raise ValueError("no frame")
+        return frame
+
+    def thread_detection_attempts(self):
+        return [(False, True, 0.0)]
+
+
+class FakeImageProcessor:
+    """Records what the merger writes, instead of smoothing and writing rows"""
+
+    def __init__(self):
+        self.gaze = FakeGaze()
+        self.rows = []
+
+    def relative_position(self, result):
+        return True, result, result, result, result
+
+    def record(self, analysis, led_point, sequence, timestamp):
+        self.rows.append((sequence, "valid" if analysis[0] else "not_valid", analysis[1]))
+
+    def record_dropped(self, led_point, sequence, timestamp):
+        self.rows.append((sequence, "dropped", led_point))
+
+
+def close_within(pool, timeout=5):
+    closer = threading.Thread(target=pool.close, daemon=True)
+    closer.start()
+    closer.join(timeout)
+    assert not closer.is_alive(), "close() did not return"
+
+
+@pytest.fixture
+def image_processor():
+    return FakeImageProcessor()
+
+
+def test_results_are_written_in_sequence_order(image_processor):
+    pool = GazeWorkerPool(image_processor, num_workers=4, backend="thread")
+    for sequence in range(50):
+        pool.submit(sequence, sequence * 10, Point(0, 0), float(sequence))
+    close_within(pool)
+
+    assert [row[0] for row in image_processor.rows] == list(range(50))
+    assert [row[2] for row in image_processor.rows] == [sequence * 10 for sequence in range(50)]
+    assert pool.detection_stats.frames == 50
+
+
+def test_skipped_frames_become_gap_rows(image_processor):
+    pool = GazeWorkerPool(image_processor, num_workers=2, backend="thread")
+    led_point = Point(5, 5)
+    pool.submit(0, 0, led_point, 0.0)
+    pool.skip(1, led_point, 0.1)
+    pool.submit(2, 20, led_point, 0.2)
+    close_within(pool)
+
+    assert image_processor.rows == [(0, "valid", 0), (1, "dropped", led_point), (2, "valid", 20)]
+
+
+def test_failed_analysis_is_written_as_not_valid(image_processor):
+    pool = GazeWorkerPool(image_processor, num_workers=2, backend="thread")
+    pool.submit(0, None, Point(0, 0), 0.0)
+    pool.submit(1, 10, Point(0, 0), 0.1)
+    close_within(pool)
+
+    assert [row[:2] for row in image_processor.rows] == [(0, "not_valid"), (1, "valid")]
+
+
+def test_close_writes_missing_sequence_numbers_as_gaps(image_processor):
+    pool = GazeWorkerPool(image_processor, num_workers=2, backend="thread")
+    pool.submit(0, 0, Point(0, 0), 0.0)
+    # Sequence numbers 1 and 2 never arrive
+    pool.submit(3, 30, Point(0, 0), 0.3)
+    close_within(pool)
+
+    assert image_processor.rows == [(0, "valid", 0), (1, "dropped", None), (2, "dropped", None), (3, "valid", 30)]
+    assert pool.pending() == 0
+
+
+def test_failed_submit_leaves_a_gap_row(image_processor):
+    pool = GazeWorkerPool(image_processor, num_workers=1, max_pending=1, backend="thread")
+    pool.submit(0, 0, Point(0, 0), 0.0)
+    released = []
+    pool._executor.shutdown(wait=True)
+    with pytest.raises(RuntimeError):
+        pool.submit(1, 10, Point(1, 1), 0.1, on_done=lambda: released.append(1))
+    close_within(pool)
+
+    assert released == [1]
+    assert [row[:2] for row in image_processor.rows] == [(0, "valid"), (1, "dropped")]
+
+
+def test_cancelled_pool_closes_without_writing_pending_frames(image_processor):
+    pool = GazeWorkerPool(image_processor, num_workers=1, backend="thread")
+    pool.submit(1, 10, Point(0, 0), 0.1)
+    closer = threading.Thread(target=pool.close, kwargs={"cancel_pending": True}, daemon=True)
+    closer.start()
+    closer.join(5)
+
+    assert not closer.is_alive()
+    assert image_processor.rows == []
+
+
+def test_calibration_is_frozen_for_the_workers(image_processor):
+    pool = GazeWorkerPool(image_processor, num_workers=1, backend="thread")
+    close_within(pool)
+
+    assert pool.calibration is image_processor.gaze.calibration
+    assert pool.calibration.threshold(0) == 50
+
+
+def test_unknown_backend_is_rejected(image_processor):
+    with pytest.raises(ValueError):
+        GazeWorkerPool(image_processor, backend="gpu")
+
+
+class FailingSink(CsvResultSink):
+    """Its writer thread stops on the first batch, like on a full disk"""
+
+    def _store(self, rows):
+        raise OSError(28, "No space left on device")
+
+
+class SinkImageProcessor(FakeImageProcessor):
+    """Writes what the merger records to a sink"""
+
+    def __init__(self, sink):
+        super().__init__()
+        self.sink = sink
+
+    def record(self, analysis, led_point, sequence, timestamp):
+        self.sink.write((*analysis[1:], "valid", 0, 0, sequence, timestamp))
+        super().record(analysis, led_point, sequence, timestamp)
+
+
+def test_sink_error_stops_the_pool(tmp_path):
+    sink = FailingSink(str(tmp_path / "data.csv"))
+    sink.write((0, 0, 0, 0, "valid", 0, 0, 0, 0.0))
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    image_processor = SinkImageProcessor(sink)
+    pool = GazeWorkerPool(image_processor, num_workers=2, backend="thread")
+    for sequence in range(3):
+        pool.submit(sequence, sequence, Point(0, 0), float(sequence))
+    pool._merger.join(5)
+
+    assert not pool._merger.is_alive()
+    with pytest.raises(RuntimeError, match="data.csv"):
+        pool.pending()
+    with pytest.raises(RuntimeError, match="data.csv"):
+        pool.submit(3, 3, Point(0, 0), 0.3)
+    # Dropped frames are not queued anymore either
+    pool.skip(4, Point(0, 0), 0.4)
+    with pytest.raises(RuntimeError, match="data.csv"):
+        pool.close()
+    assert image_processor.rows == []
+    with pytest.raises(RuntimeError):
+        sink.close()
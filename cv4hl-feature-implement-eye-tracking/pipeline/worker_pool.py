@@ -0,0 +1,239 @@
+import functools
+import multiprocessing
+import os
+import threading
+import signal
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from GazeTracking.gaze_tracking import models
+from GazeTracking.gaze_tracking.face_tracker import DetectionStats
+from GazeTracking.single_image_processor import SingleImageProcessor
+
+BACKENDS = ("process", "thread")
+
+# Imported by the fork server, which loads the models once for all worker processes
+MODELS_PRELOAD_MODULE = "GazeTracking.gaze_tracking.preloaded_models"
+# Directory the GazeTracking and pipeline packages are imported from
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Per-process image processor, created by _init_worker in every worker process
+_image_processor = None
+
+
+def _init_worker(calibration, gaze_options):
+    global _image_processor
+    # Ctrl+C is handled by the main process, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Workers forked from the fork server have its models; spawned ones load their own,
+    # in the background while the processor is set up
+    if not models.is_loaded():
+        models.preload()
+    _image_processor = SingleImageProcessor(None, **gaze_options)
+    _image_processor.gaze.calibration = calibration
+
+
+def _start_forkserver():
+    """Starts the fork server with the models loaded, unless it is running already"""
+    from multiprocessing import forkserver
+    forkserver.set_forkserver_preload([MODELS_PRELOAD_MODULE])
+    # The fork server imports its preload modules before it gets the sys.path of this
+    # process, so it finds the packages through PYTHONPATH
+    python_path = os.environ.get("PYTHONPATH")
+    os.environ["PYTHONPATH"] = os.pathsep.join([_ROOT, python_path] if python_path else [_ROOT])
+    try:
+        forkserver.ensure_running()
+    finally:
+        if python_path is None:
+            del os.environ["PYTHONPATH"]
+        else:
+            os.environ["PYTHONPATH"] = python_path
+
+
+def _wait_until_ready():
+    """Returns once the models of the worker process are loaded"""
+    models.load()
+    return os.getpid()
+
+
+def _analyze_frame(frame, timestamp):
+    result = _image_processor.analyze_frame(frame, timestamp)
+    # The face detections of all workers are counted by the pool
+    return result, _image_processor.gaze.last_detection_attempts
+
+
+def _analyze_frame_in_thread(gaze, calibration, frame, timestamp):
+    result = gaze.analyze(frame, calibration, timestamp)
+    return result, gaze.thread_detection_attempts()
+
+
+class GazeWorkerPool:
+    """
+    Analyzes frames on a pool of workers and merges the results back into
+    capture order. The calibration of image_processor is frozen when the
+    pool starts (see Calibration.freeze()), so every worker uses the same
+    thresholds. With the process backend, every worker process owns its own
+    SingleImageProcessor. With the thread backend, the worker threads share
+    the GazeTracking of image_processor through GazeTracking.analyze().
+
+    The workers send back a GazeResult per frame and keep no smoothing
+    state; the positions relative to landmark 27, smoothing and writing to the
+    data file are done by the merger thread with the given image_processor,
+    one frame after the other in sequence order. Each worker tracks the face
+    over the frames it gets; the face detections of all workers are counted
+    in detection_stats.
+
+    Worker processes are started with forkserver where available, spawn
+    otherwise: the main process runs threads (grabber, display, writers) by
+    the time the pool starts, and forking it could deadlock the workers on a
+    lock held by one of them. The fork server loads the models once, before
+    it forks any worker, so the worker processes share its models through
+    copy-on-write; spawned workers load their own. The pool starts all
+    workers and waits until their models are loaded, so the first frames
+    are not held up. Worker threads share the models of the main process.
+
+    If writing a result fails (e.g. the sink's writer thread stopped), the
+    merger stops: submit(), pending() and close() raise the error from then
+    on, so the application does not wait for frames that are never written.
+    """
+
+    def __init__(self, image_processor, num_workers=None, max_pending=None, first_sequence=0, start_method=None,
+                 backend="process"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+        self.image_processor = image_processor
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.backend = backend
+        # A calibration still in progress would go on differently in every worker
+        self.calibration = image_processor.gaze.calibration.freeze()
+        if backend == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="gaze-worker")
+            self._task = functools.partial(_analyze_frame_in_thread, image_processor.gaze, self.calibration)
+        else:
+            if start_method is None:
+                start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            if start_method == "forkserver":
+                _start_forkserver()
+            self._executor = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context(start_method),
+                                                 initargs=(self.calibration, image_processor.gaze_options))
+            self._task = _analyze_frame
+            # Idle workers are missing, so every task starts a new worker process
+            ready = [self._executor.submit(_wait_until_ready) for _ in range(self.num_workers)]
+            wait(ready)
+            for future in ready:
+                # Raises if a worker could not start (e.g. missing model file)
+                future.result()
+        self.detection_stats = DetectionStats()
+        # Limits the frames held by the pool, so a slow pool blocks the dispatcher instead of growing
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * self.num_workers)
+        self._entries = {}
+        self._next_sequence = first_sequence
+        self._closed = False
+        # Error the merger stopped with
+        self._error = None
+        self._condition = threading.Condition()
+        self._merger = threading.Thread(target=self._merge, daemon=True)
+        self._merger.start()
+
+    def submit(self, sequence, frame, led_point, timestamp, on_done=None):
+        """Queues a frame for analysis. Every sequence number from first_sequence on
+        has to be either submitted or skipped. on_done is called once the frame
+        buffer is not used by the pool anymore."""
+        self._check_merger()
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._task, frame, timestamp)
+        except Exception:
+            # The frame is written as a gap row, so the merger does not wait for it
+            self._done(on_done)
+            self.skip(sequence, led_point, timestamp)
+            raise
+        future.add_done_callback(lambda _: self._done(on_done))
+        self._add_entry(sequence, future, led_point, timestamp)
+
+    def _done(self, on_done):
+        self._slots.release()
+        if on_done is not None:
+            on_done()
+
+    def skip(self, sequence, led_point, timestamp):
+        """Records a dropped frame, so it shows up as a gap row in the data file.
+        Does nothing once the merger has failed."""
+        self._add_entry(sequence, None, led_point, timestamp)
+
+    def _add_entry(self, sequence, future, led_point, timestamp):
+        with self._condition:
+            if self._error is not None:
+                return
+            self._entries[sequence] = (future, led_point, timestamp)
+            self._condition.notify()
+
+    def _check_merger(self):
+        """Raises the error the merger stopped with, if any"""
+        if self._error is not None:
+            raise self._error
+
+    def pending(self):
+        """Returns the number of frames submitted but not written yet"""
+        with self._condition:
+            self._check_merger()
+            return len(self._entries)
+
+    def _merge(self):
+        while True:
+            with self._condition:
+                while self._next_sequence not in self._entries and not self._closed:
+                    self._condition.wait()
+                if self._next_sequence not in self._entries:
+                    if not self._entries:
+                        return
+                    # Closed with a sequence number that was never submitted (e.g. a failed
+                    # submit): nothing will come for it anymore, it is written as a gap row
+                    sequence = self._next_sequence
+                    future, led_point, timestamp = None, None, None
+                else:
+                    sequence = self._next_sequence
+                    future, led_point, timestamp = self._entries[sequence]
+
+            if future is not None:
+                try:
+                    result, detection_attempts = future.result()
+                    self.detection_stats.add_frame(detection_attempts)
+                    analysis = self.image_processor.relative_position(result)
+                except CancelledError:
+                    return
+                except Exception as e:
+                    print(f"Error processing image: {e}")
+                    analysis = (False, None, None, None, None)
+            try:
+                if future is None:
+                    self.image_processor.record_dropped(led_point, sequence, timestamp)
+                else:
+                    self.image_processor.record(analysis, led_point, sequence, timestamp)
+            except Exception as e:
+                # Nothing can be written anymore, the frames left are given up
+                with self._condition:
+                    self._error = e
+                    self._entries.clear()
+                    self._condition.notify_all()
+                return
+
+            with self._condition:
+                self._entries.pop(sequence, None)
+                self._next_sequence += 1
+                self._condition.notify_all()
+
+    def close(self, cancel_pending=False):
+        """Stops the pool. Waits until every submitted frame is written unless cancel_pending is set.
+        Sequence numbers missing before the last submitted frame are written as gap rows.
+        Raises the error the merger stopped with, if any."""
+        # The results of a failed merger would not be written anyway
+        cancel_pending = cancel_pending or self._error is not None
+        self._executor.shutdown(wait=not cancel_pending, cancel_futures=cancel_pending)
+        with self._condition:
+            self._closed = True
+            if cancel_pending:
+                self._entries.clear()
+            self._condition.notify_all()
+        self._merger.join()
+        self._check_merger()
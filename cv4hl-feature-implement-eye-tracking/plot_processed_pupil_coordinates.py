@@ -1,11 +1,24 @@
-import csv
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+import argparse
+import os
+import tempfile
 import time
 
+import cv2
 import matplotlib.pyplot as plt
+import matplotlib.style
 import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
-from led_point.point import Point
+import analysis
+
+# Codec of the exported videos by extension. The chunks rendered by the
+# workers are stored as MJPEG at full quality (faster to encode and decode
+# than a lossless codec), they are encoded once more when joined.
+CODECS = {".mp4": "mp4v", ".avi": "MJPG"}
+CHUNK_CODEC = "MJPG"
 
 # Define the eye class
 @dataclass
@@ -16,207 +29,236 @@ class Eye:
     h: float
 
 @dataclass
-class Pupil:    
+class Pupil:
     x: float
     y: float
 
+
+class SessionFigure:
+    """The six panels of a session, showing the precomputed series (see
+    analysis.SessionAnalysis) up to a given frame. Without a calibration,
+    the calibrated pupil positions and the angle differences are left out."""
+
+    def __init__(self, session, fig):
+        self.session = session
+        self.fig = fig
+        self.frames = np.arange(len(session))
+        self.has_angles = session.left_angle_diff is not None
+        num_datapoints = len(session)
+
+        # Create the axes
+        ((ax1, ax2), (ax3, ax4), (ax5, ax6)) = self.axes = fig.subplots(3, 2)
+
+        light_blue = (171/255, 209/255, 215/255)
+        mid_blue = (85/255, 177/255, 188/255)
+        dark_blue = (69/255, 146/255, 155/255)
+
+        # Initialize plot lines for each dataset
+        self.line_left_eye, = ax1.plot([], [], color=light_blue, label='Left Eye', linewidth=1)
+        self.last_left_eye, = ax1.plot([], [], 'o', color=light_blue, linewidth=1)
+        left_eye_calib, = ax1.plot([], [], 'o', color=light_blue, linewidth=1)
+        self.line_right_eye, = ax2.plot([], [], color=mid_blue, label='Right Eye', linewidth=1)
+        self.last_right_eye, = ax2.plot([], [], 'o', color=mid_blue, linewidth=1)
+        right_eye_calib, = ax2.plot([], [], 'o', color=mid_blue, linewidth=1)
+        self.line_velocity_left, = ax3.plot([], [], color=light_blue, label='Left Eye Velocity', linewidth=1)
+        self.line_velocity_right, = ax4.plot([], [], color=mid_blue, label='Right Eye Velocity', linewidth=1)
+        self.line_led_point, = ax5.plot([], [], color=dark_blue, label='LED Point', linewidth=1)
+        self.last_led_point, = ax5.plot([], [], "o", color=dark_blue, linewidth=1)
+        self.line_left_angle, = ax6.plot([], [], color=light_blue, label='Left Eye', linewidth=1)
+        self.line_right_angle, = ax6.plot([], [], color=mid_blue, label='Right Eye', linewidth=1)
+        ax6.legend(fontsize='small')
+        # Artists that change from frame to frame
+        self.animated = [self.line_left_eye, self.last_left_eye, self.line_right_eye, self.last_right_eye,
+                         self.line_velocity_left, self.line_velocity_right, self.line_led_point, self.last_led_point]
+        if self.has_angles:
+            self.animated += [self.line_left_angle, self.line_right_angle]
+
+        if session.calibration is not None:
+            left_pupil_calibration = Pupil(*session.calibration[:2])
+            right_pupil_calibration = Pupil(*session.calibration[2:4])
+            left_eye_calib.set_data([left_pupil_calibration.x], [left_pupil_calibration.y])
+            right_eye_calib.set_data([right_pupil_calibration.x], [right_pupil_calibration.y])
+
+        # Set static properties of the plots
+        ax1.set_xlim(0, 1)  # Adjust these limits based on your data
+        ax1.set_ylim(0, 1)
+        ax1.set_xlabel('x in px')
+        ax1.set_ylabel('y in px')
+        ax1.set_title('Left Eye Position')
+        ax2.set_xlim(0, 1)
+        ax2.set_ylim(0, 1)
+        ax2.set_xlabel('x in px')
+        ax2.set_ylabel('y in px')
+        ax2.set_title('Right Eye Position')
+        ax3.set_xlim(0, num_datapoints)
+        ax3.set_xlabel('frame')
+        ax3.set_ylabel('v in px/frame')
+        ax3.set_title('Left Eye Velocity')
+        ax4.set_xlim(0, num_datapoints)
+        ax4.set_xlabel('frame')
+        ax4.set_ylabel('v in px/frame')
+        ax4.set_title('Right Eye Velocity')
+        ax5.set_xlim(-100, 2020)
+        ax5.set_ylim(-100, 1180)
+        ax5.set_xlabel('x in px')
+        ax5.set_ylabel('y in px')
+        ax5.set_title('LED Point Position')
+        ax6.set_xlim(0, num_datapoints)
+        ax6.set_ylim(-np.pi, np.pi)
+        ax6.set_xlabel('frame')
+        ax6.set_ylabel(r'$\Delta\phi$ in rad')
+        ax6.set_title('Angle Differences relative to LED Point Position' if self.has_angles
+                      else 'Angle Differences (no calibration)')
+        fig.subplots_adjust(wspace=0.4, hspace=1)
+
+        # Axis limits up to every frame
+        self.left_min_x, self.left_max_x = np.fmin.accumulate(session.left_x), np.fmax.accumulate(session.left_x)
+        self.left_min_y, self.left_max_y = np.fmin.accumulate(session.left_y), np.fmax.accumulate(session.left_y)
+        self.right_min_x, self.right_max_x = np.fmin.accumulate(session.right_x), np.fmax.accumulate(session.right_x)
+        self.right_min_y, self.right_max_y = np.fmin.accumulate(session.right_y), np.fmax.accumulate(session.right_y)
+        self.max_velocity_left = np.fmax.accumulate(session.velocity_left)
+        self.max_velocity_right = np.fmax.accumulate(session.velocity_right)
+
+    def update(self, i):
+        """Shows the series up to frame i"""
+        session = self.session
+        end = i + 1
+        self.line_left_eye.set_data(session.left_x[:end], session.left_y[:end])
+        self.last_left_eye.set_data([session.left_x[i]], [session.left_y[i]])
+        self.line_right_eye.set_data(session.right_x[:end], session.right_y[:end])
+        self.last_right_eye.set_data([session.right_x[i]], [session.right_y[i]])
+        self.line_velocity_left.set_data(self.frames[:end], session.velocity_left[:end])
+        self.line_velocity_right.set_data(self.frames[:end], session.velocity_right[:end])
+        self.line_led_point.set_data(session.led_x[:end], session.led_y[:end])
+        self.last_led_point.set_data([session.led_x[i]], [session.led_y[i]])
+        if self.has_angles:
+            self.line_left_angle.set_data(self.frames[:end], session.left_angle_diff[:end])
+            self.line_right_angle.set_data(self.frames[:end], session.right_angle_diff[:end])
+
+    def set_limits(self, i):
+        """Fits the axis limits to the series up to frame i"""
+        ax1, ax2, ax3, ax4 = self.axes.flat[:4]
+        ax1.set_xlim(self.left_min_x[i]-10, self.left_max_x[i]+10)
+        ax1.set_ylim(self.left_min_y[i]-10, self.left_max_y[i]+10)
+        ax2.set_xlim(self.right_min_x[i]-10, self.right_max_x[i]+10)
+        ax2.set_ylim(self.right_min_y[i]-10, self.right_max_y[i]+10)
+        ax3.set_ylim(0, self.max_velocity_left[i]+1)
+        ax4.set_ylim(0, self.max_velocity_right[i]+1)
+        #ax5.set_xlim(np.min(led_point_x)-10, np.max(led_point_x)+10)
+        #ax5.set_ylim(np.min(led_point_y)-10, np.max(led_point_y)+10)
+
+
+def _render_chunk(file_path, calibration_file_path, start, stop, chunk_path, fps):
+    """Renders frames start to stop of a session into a video file, without a display.
+    The axes are drawn once; every frame only redraws the changing artists on
+    top of the saved background (blitting)."""
+    session = analysis.load(file_path, calibration_file_path)
+    with matplotlib.style.context('dark_background'):
+        fig = Figure(figsize=(12.80, 7.20), dpi=100)
+        canvas = FigureCanvasAgg(fig)
+        figure = SessionFigure(session, fig)
+        # The whole session fits the axes, so the background stays valid
+        figure.set_limits(len(session) - 1)
+        for artist in figure.animated:
+            artist.set_animated(True)
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+
+        width, height = canvas.get_width_height()
+        writer = cv2.VideoWriter(chunk_path, cv2.VideoWriter_fourcc(*CHUNK_CODEC), fps, (width, height))
+        if not writer.isOpened():
+            raise RuntimeError(f"Could not open {chunk_path} for writing")
+        writer.set(cv2.VIDEOWRITER_PROP_QUALITY, 100)
+        try:
+            for i in range(start, stop):
+                canvas.restore_region(background)
+                figure.update(i)
+                for artist in figure.animated:
+                    artist.axes.draw_artist(artist)
+                writer.write(cv2.cvtColor(np.asarray(canvas.buffer_rgba()), cv2.COLOR_RGBA2BGR))
+        finally:
+            writer.release()
+    return stop - start
+
+
+def export_video(file_path, calibration_file_path, output_path, fps=30, num_workers=None, chunk_size=None):
+    """Renders the animation of a session into a video file (.mp4 or .avi) without a display.
+
+    The frames are rendered by a pool of worker processes, each rendering
+    a range of frames into a chunk file; the chunks are joined in order.
+
+    Arguments:
+        file_path: Session file (.gaze) or data.csv file
+        calibration_file_path: calibration.csv of a data.csv file
+        output_path: Video file to create
+        fps: Frame rate of the video
+        num_workers: Number of worker processes, by default one per CPU
+        chunk_size: Number of frames rendered by a worker at once, by default
+                    the frames are split evenly among the workers
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in CODECS:
+        raise ValueError(f"Unsupported video format {extension!r}, expected one of {', '.join(CODECS)}")
+    num_frames = len(analysis.load(file_path, calibration_file_path))
+    num_workers = num_workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, -(-num_frames // num_workers))
+    ranges = [(start, min(start + chunk_size, num_frames)) for start in range(0, num_frames, chunk_size)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        chunk_paths = [os.path.join(directory, f"chunk_{number}.avi") for number in range(len(ranges))]
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(_render_chunk, file_path, calibration_file_path, start, stop, chunk_path, fps)
+                       for (start, stop), chunk_path in zip(ranges, chunk_paths)]
+            for future in futures:
+                future.result()
+
+        # Joins the chunks in frame order
+        writer = None
+        for chunk_path in chunk_paths:
+            chunk = cv2.VideoCapture(chunk_path)
+            while True:
+                ret, frame = chunk.read()
+                if not ret:
+                    break
+                if writer is None:
+                    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*CODECS[extension]), fps,
+                                             (frame.shape[1], frame.shape[0]))
+                writer.write(frame)
+            chunk.release()
+        if writer is not None:
+            writer.release()
+    return num_frames
+
+
 class GazeTrackingPlotter:
-    def __init__(self): 
-        self.previous_left_angle = 0
-        self.previous_right_angle = 0
-        self.previous_led_angle = 0
-
-    def read_row(self, row):
-        # Extract the coordinates from the row
-        left_pupil = Pupil(*[float(i) for i in row[:2]])
-        right_pupil = Pupil(*[float(i) for i in row[2:4]])
-        valid = row[4] == 'valid'
-        led_point = Point(*[float(i) for i in row[5:7]])
-
-        return left_pupil, right_pupil, valid, led_point
-
-    def get_num_datapoints(self, file_path):
-        with open(file_path, 'r') as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip the header row
-            return sum(1 for row in reader)
-
-    def get_current_pupil_velocity(self, pupil_x, pupil_y):
-        if len(pupil_x) < 2:
-            return 0
-        else:
-            return ((pupil_x[-1] - pupil_x[-2])**2 + (pupil_y[-1] - pupil_y[-2])**2)**0.5
-        
-    def calculate_angle_diff(self, left_pupil, right_pupil, left_pupil_calibration, right_pupil_calibration, led_point, screen_midpoint):
-        left_angle_raw = np.arctan2(left_pupil.y - left_pupil_calibration.y, left_pupil.x - left_pupil_calibration.x)
-        right_angle_raw = np.arctan2(right_pupil.y - right_pupil_calibration.y, right_pupil.x - right_pupil_calibration.x)
-        led_angle_raw = np.arctan2(led_point.y - screen_midpoint.y, led_point.x - screen_midpoint.x)
-        
-        # Unwrap each angle manually
-        left_angle = self.unwrap_angle(left_angle_raw, self.previous_left_angle)
-        right_angle = self.unwrap_angle(right_angle_raw, self.previous_right_angle)
-        led_angle = self.unwrap_angle(led_angle_raw, self.previous_led_angle)
-        
-        # Update previous angles
-        self.previous_left_angle = left_angle
-        self.previous_right_angle = right_angle
-        self.previous_led_angle = led_angle
-
-        left_angle_diff = left_angle - led_angle
-        right_angle_diff = right_angle - led_angle
-
-        return left_angle_diff, right_angle_diff    
-
-    def unwrap_angle(self, current_angle, previous_angle):
-        # Calculate the difference
-        angle_diff = current_angle - previous_angle
-        
-        # Adjust if the angle jumps
-        if angle_diff > np.pi:
-            current_angle -= 2 * np.pi
-        elif angle_diff < -np.pi:
-            current_angle += 2 * np.pi
-        
-        return current_angle
+    """Animates the precomputed series of a session (see analysis.SessionAnalysis)"""
 
     def read_and_plot_coordinates(self, file_path, calibration_file_path):
-        # Read the CSV file
-        with open(calibration_file_path, 'r') as file:
-            reader = csv.reader(file)
-            row = next(reader)
-            left_pupil_calibration = Pupil(*[float(i) for i in row[:2]])
-            right_pupil_calibration = Pupil(*[float(i) for i in row[2:4]])
-            screen_midpoint = Point(*[float(i)/2 for i in row[4:6]])
-        with open(file_path, 'r') as file:
-            num_datapoints = self.get_num_datapoints(file_path)
-            reader = csv.reader(file)
-            next(reader)  # Skip the header row
-
-            plt.style.use('dark_background')
-            # Create a new figure and axis
-            fig, ((ax1, ax2), (ax3, ax4), (ax5, ax6)) = plt.subplots(3, 2, figsize=(12.80, 7.20), dpi=100)
-
-
-            # Initialize numpy arrays to store the coordinates
-            left_pupil_x = []
-            left_pupil_y = []
-            right_pupil_x = []
-            right_pupil_y = []
-            led_point_x = []
-            led_point_y = []
-            velocity_left_pupil = []
-            velocity_right_pupil = []
-            left_angle = []
-            right_angle = []
-
-            light_blue = (171/255, 209/255, 215/255)
-            mid_blue = (85/255, 177/255, 188/255)
-            dark_blue = (69/255, 146/255, 155/255)
-
-            # Initialize plot lines for each dataset
-            line_left_eye, = ax1.plot([], [], color=light_blue, label='Left Eye', linewidth=1)
-            last_left_eye, = ax1.plot([], [], 'o', color=light_blue, linewidth=1)
-            left_eye_calib, = ax1.plot([], [], 'o', color=light_blue, linewidth=1)
-            line_right_eye, = ax2.plot([], [], color=mid_blue, label='Right Eye', linewidth=1)
-            last_right_eye, = ax2.plot([], [], 'o', color=mid_blue, linewidth=1)
-            right_eye_calib, = ax2.plot([], [], 'o', color=mid_blue, linewidth=1)
-            line_velocity_left, = ax3.plot([], [], color=light_blue, label='Left Eye Velocity', linewidth=1)
-            line_velocity_right, = ax4.plot([], [], color=mid_blue, label='Right Eye Velocity', linewidth=1)
-            line_led_point, = ax5.plot([], [], color=dark_blue, label='LED Point', linewidth=1)
-            last_led_point, = ax5.plot([], [], "o", color=dark_blue, linewidth=1)
-            line_left_angle, = ax6.plot([], [], color=light_blue, label='Left Eye', linewidth=1)
-            line_right_angle, = ax6.plot([], [], color=mid_blue, label='Right Eye', linewidth=1)
-            ax6.legend(fontsize='small')
-
-            left_eye_calib.set_data(left_pupil_calibration.x, left_pupil_calibration.y)
-            right_eye_calib.set_data(right_pupil_calibration.x, right_pupil_calibration.y)
-
-            # Set static properties of the plots
-            ax1.set_xlim(0, 1)  # Adjust these limits based on your data
-            ax1.set_ylim(0, 1)
-            ax1.set_xlabel('x in px')
-            ax1.set_ylabel('y in px')
-            ax1.set_title('Left Eye Position')
-            ax2.set_xlim(0, 1)
-            ax2.set_ylim(0, 1)
-            ax2.set_xlabel('x in px')
-            ax2.set_ylabel('y in px')
-            ax2.set_title('Right Eye Position')
-            ax3.set_xlim(0, num_datapoints)
-            ax3.set_xlabel('frame')
-            ax3.set_ylabel('v in px/frame')
-            ax3.set_title('Left Eye Velocity')
-            ax4.set_xlim(0, num_datapoints)
-            ax4.set_xlabel('frame')
-            ax4.set_ylabel('v in px/frame')
-            ax4.set_title('Right Eye Velocity')
-            ax5.set_xlim(-100, 2020)
-            ax5.set_ylim(-100, 1180)
-            ax5.set_xlabel('x in px')
-            ax5.set_ylabel('y in px')
-            ax5.set_title('LED Point Position')
-            ax6.set_xlim(0, num_datapoints)
-            ax6.set_ylim(-np.pi, np.pi)
-            ax6.set_xlabel('frame')
-            ax6.set_ylabel(r'$\Delta\phi$ in rad')
-            ax6.set_title('Angle Differences relative to LED Point Position')
-
-            iteration = 0
-            # Iterate over each line in the CSV file
-            for row in reader:
-                # Append new coordinates to the numpy arrays
-                start_time = time.time()
-                left_pupil, right_pupil, _, led_point = self.read_row(row)
-                left_pupil_x.append(left_pupil.x)
-                left_pupil_y.append(left_pupil.y)
-                right_pupil_x.append(right_pupil.x)
-                right_pupil_y.append(right_pupil.y)
-                led_point_x.append(led_point.x)
-                led_point_y.append(led_point.y)
-
-                # Calculate the angle differences
-                left_angle_diff, right_angle_diff = self.calculate_angle_diff(left_pupil, right_pupil, left_pupil_calibration, right_pupil_calibration, led_point, screen_midpoint)
-                left_angle.append(left_angle_diff)
-                right_angle.append(right_angle_diff)
-
-                velocity_left_pupil.append(self.get_current_pupil_velocity(left_pupil_x, left_pupil_y))
-                velocity_right_pupil.append(self.get_current_pupil_velocity(right_pupil_x, right_pupil_y))
-
-                # Update plot data
-                line_left_eye.set_data(left_pupil_x, left_pupil_y)
-                last_left_eye.set_data(left_pupil.x, left_pupil.y)
-                line_right_eye.set_data(right_pupil_x, right_pupil_y)
-                last_right_eye.set_data(right_pupil.x, right_pupil.y)
-                line_velocity_left.set_data(range(len(velocity_left_pupil)), velocity_left_pupil)
-                line_velocity_right.set_data(range(len(velocity_right_pupil)), velocity_right_pupil)
-                line_led_point.set_data(led_point_x, led_point_y)
-                last_led_point.set_data(led_point.x, led_point.y)
-                line_left_angle.set_data(range(len(left_angle)), left_angle)
-                line_right_angle.set_data(range(len(right_angle)), right_angle)
-                #line_led_angle.set_data(range(len(led_angle)), led_angle)
-
-                
-                # Adjust dynamic properties of the plots if necessary
-                ax1.set_xlim(np.min(left_pupil_x)-10, np.max(left_pupil_x)+10)
-                ax1.set_ylim(np.min(left_pupil_y)-10, np.max(left_pupil_y)+10)
-                ax2.set_xlim(np.min(right_pupil_x)-10, np.max(right_pupil_x)+10)
-                ax2.set_ylim(np.min(right_pupil_y)-10, np.max(right_pupil_y)+10)
-                ax3.set_ylim(0, np.max(velocity_left_pupil)+1)
-                ax4.set_ylim(0, np.max(velocity_right_pupil)+1)
-                #ax5.set_xlim(np.min(led_point_x)-10, np.max(led_point_x)+10)
-                #ax5.set_ylim(np.min(led_point_y)-10, np.max(led_point_y)+10)
-
-                plt.subplots_adjust(wspace=0.4, hspace=1)
-                plt.draw()
-                #plt.get_current_fig_manager().window.showMaximized()
-                #filename = f"plot_img\plot_{iteration}.png"  # Generates filenames like plot_0001.png, plot_0002.png, etc.
-                #plt.savefig(filename)
-                print(f"Processing time: {time.time() - start_time:.5f} seconds")
-                iteration += 1
-                process_time = time.time() - start_time
-                pause_time = max(0.033 - process_time, 0)
-                #breakpoint()
-                plt.pause(pause_time)
+        # Everything plotted is computed once, before the animation
+        session = analysis.load(file_path, calibration_file_path)
+
+        plt.style.use('dark_background')
+        # Create a new figure and axis
+        fig = plt.figure(figsize=(12.80, 7.20), dpi=100)
+        figure = SessionFigure(session, fig)
+
+        iteration = 0
+        # Draw the frames one after the other
+        for i in range(len(session)):
+            start_time = time.time()
+
+            # Update plot data and adjust dynamic properties of the plots
+            figure.update(i)
+            figure.set_limits(i)
+
+            plt.draw()
+            #plt.get_current_fig_manager().window.showMaximized()
+            print(f"Processing time: {time.time() - start_time:.5f} seconds")
+            iteration += 1
+            process_time = time.time() - start_time
+            pause_time = max(0.033 - process_time, 0)
+            #breakpoint()
+            plt.pause(pause_time)
 
         # Show the final plots
         plt.show(block=False)
@@ -234,14 +276,24 @@ class GazeTrackingPlotter:
 
 
 if __name__ == '__main__':
-    # Define the file path
-    #file_path = 'pupil_coordinates_relative_to_eye.csv'
-    #file_path = 'pupil_coordinates_relative_to_face.csv'
-    file_path = r'outs_backup\data.csv'
-    calibration_file_path = r'outs_backup\calibration.csv'
-
-    # Initialize the GazeTrackingPlotter object
-    gaze_plotter = GazeTrackingPlotter()
-
-    # Read and plot the coordinates from the CSV file
-    gaze_plotter.read_and_plot_coordinates(file_path, calibration_file_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Plots the processed pupil coordinates of a session.")
+    parser.add_argument('file_path', nargs='?', default=os.path.join('outs_backup', 'data.csv'),
+                        help='Session file (.gaze) or data.csv file')
+    parser.add_argument('--calibration', default=None,
+                        help='calibration.csv of a data.csv file (default: the one next to it)')
+    parser.add_argument('--export', metavar='VIDEO',
+                        help='Renders the animation into a .mp4 or .avi file without a display instead of showing it')
+    parser.add_argument('--fps', type=int, default=30, help='Frame rate of the exported video')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes rendering the exported video')
+    args = parser.parse_args()
+
+    if args.export:
+        start = time.time()
+        num_frames = export_video(args.file_path, args.calibration, args.export, args.fps, args.workers)
+        print(f"{num_frames} frames exported to {args.export} in {time.time() - start:.1f} s.")
+    else:
+        # Initialize the GazeTrackingPlotter object
+        gaze_plotter = GazeTrackingPlotter()
+
+        # Read and plot the coordinates from the CSV file
+        gaze_plotter.read_and_plot_coordinates(args.file_path, args.calibration)
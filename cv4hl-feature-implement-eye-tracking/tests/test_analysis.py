@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+import analysis
+from pipeline.result_sink import CsvResultSink
+from pipeline.session_file import _records
+
+
+def lttb_reference(x, y, num_points):
+    """Straightforward Largest-Triangle-Three-Buckets, one point at a time"""
+    n = len(x)
+    edges = np.append(np.linspace(1, n - 1, num_points - 1).astype(int), n)
+    kept = [0]
+    for b in range(num_points - 2):
+        next_start, next_stop = edges[b + 1], edges[b + 2]
+        mean_x, mean_y = np.mean(x[next_start:next_stop]), np.mean(y[next_start:next_stop])
+        a = kept[-1]
+        areas = [abs((x[a] - mean_x) * (y[i] - y[a]) - (x[a] - x[i]) * (mean_y - y[a]))
+                 for i in range(edges[b], edges[b + 1])]
+        kept.append(edges[b] + int(np.argmax(areas)))
+    kept.append(n - 1)
+    return x[kept], y[kept]
+
+
+def test_lttb_matches_the_reference():
+    rng = np.random.default_rng(0)
+    x = np.arange(1000, dtype=float)
+    y = np.cumsum(rng.normal(size=1000))
+    for num_points in (3, 10, 100, 999):
+        kept_x, kept_y = analysis.lttb(x, y, num_points)
+        reference_x, reference_y = lttb_reference(x, y, num_points)
+        np.testing.assert_array_equal(kept_x, reference_x)
+        np.testing.assert_array_equal(kept_y, reference_y)
+        assert len(kept_x) == num_points
+
+
+def test_lttb_keeps_the_extremes():
+    x = np.arange(101, dtype=float)
+    y = np.zeros(101)
+    y[37], y[80] = 50.0, -50.0
+    kept_x, kept_y = analysis.lttb(x, y, 10)
+
+    assert kept_x[0] == 0 and kept_x[-1] == 100
+    assert 37 in kept_x and 80 in kept_x
+
+
+def test_lttb_leaves_out_nan_and_short_series():
+    x = np.arange(6, dtype=float)
+    y = np.array([0.0, np.nan, 2.0, 3.0, np.nan, 5.0])
+    kept_x, kept_y = analysis.lttb(x, y, 10)
+
+    assert kept_x.tolist() == [0.0, 2.0, 3.0, 5.0]
+    assert kept_y.tolist() == [0.0, 2.0, 3.0, 5.0]
+
+
+def test_unwrapped_angle_is_continuous_over_several_turns():
+    # Three turns clockwise, past -3 pi
+    angles = -np.linspace(0, 6 * np.pi, 200)
+    unwrapped = analysis.unwrapped_angle(np.sin(angles), np.cos(angles))
+
+    np.testing.assert_allclose(unwrapped, angles, atol=1e-9)
+
+
+def test_unwrapped_angle_keeps_nan():
+    angles = np.linspace(0, 4 * np.pi, 50)
+    y, x = np.sin(angles), np.cos(angles)
+    y[[10, 11, 30]] = np.nan
+    unwrapped = analysis.unwrapped_angle(y, x)
+
+    assert np.isnan(unwrapped[[10, 11, 30]]).all()
+    finite = ~np.isnan(unwrapped)
+    np.testing.assert_allclose(unwrapped[finite], angles[finite], atol=1e-9)
+
+
+def test_rolling_mean():
+    values = np.array([1, 0, 1, 1, 0, 0, 1], dtype=bool)
+    expected = [np.mean(values[max(i - 2, 0):i + 1]) for i in range(len(values))]
+
+    np.testing.assert_allclose(analysis.rolling_mean(values, 3), expected)
+    np.testing.assert_allclose(analysis.rolling_mean(values, 100), np.cumsum(values) / np.arange(1, 8))
+
+
+def test_pupil_velocity():
+    velocity = analysis.pupil_velocity(np.array([0.0, 3.0, 3.0]), np.array([0.0, 4.0, 4.0]))
+    assert velocity.tolist() == [0.0, 5.0, 0.0]
+
+
+ROWS = [
+    (-80.0, -10.0, 80.0, -10.0, "valid", 1920.0, 540.0, 0, 0.0),
+    (float("nan"),) * 4 + ("dropped", 960.0, 1080.0, 1, 0.1),
+    (-80.0, -9.0, 80.0, -10.0, "valid", 960.0, 1080.0, 2, 0.2),
+]
+
+
+def test_session_analysis_leaves_out_dropped_frames():
+    session = analysis.SessionAnalysis(_records(ROWS), calibration=(-80.0, -10.0, 80.0, -11.0))
+
+    assert len(session) == 2
+    assert session.sequence.tolist() == [0, 2]
+    assert session.velocity_left.tolist() == [0.0, 1.0]
+    # LED right of the center, then above it
+    np.testing.assert_allclose(session.led_angle, [0.0, np.pi / 2])
+    np.testing.assert_allclose(session.left_angle_diff[1], 0.0)
+    np.testing.assert_allclose(session.right_angle, [np.pi / 2, np.pi / 2])
+
+
+def test_session_analysis_without_calibration():
+    session = analysis.SessionAnalysis(_records(ROWS))
+
+    assert session.left_angle is None and session.left_angle_diff is None
+    assert session.right_angle_diff is None
+
+
+def test_load_data_file(tmp_path):
+    with CsvResultSink(str(tmp_path / "data.csv")) as sink:
+        for row in ROWS:
+            sink.write(row)
+    assert analysis.load(str(tmp_path / "data.csv")).calibration is None
+
+    (tmp_path / "calibration.csv").write_text("-80.0,-10.0,80.0,-11.0, 1920, 1080\n")
+    session = analysis.load(str(tmp_path / "data.csv"))
+    assert session.calibration == pytest.approx((-80.0, -10.0, 80.0, -11.0))
+    assert session.screen_size == (1920, 1080)
+    assert len(session) == 2
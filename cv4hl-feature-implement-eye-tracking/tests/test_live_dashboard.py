@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+
+import analysis
+from live_dashboard import DecimatedSeries, IncrementalAnalysis, LiveDashboard
+from pipeline.session_file import VALID, _records
+
+CALIBRATION = (-80.0, -10.0, 80.0, -10.0)
+
+
+def session_samples(count):
+    """Pupils and LED going round in circles, with not_valid and dropped frames"""
+    random = np.random.default_rng(0)
+    rows = []
+    for i in range(count):
+        angle = 0.05 * i + random.normal(0, 0.3)
+        status = "dropped" if i % 11 == 0 else "not_valid" if i % 5 == 0 else "valid"
+        rows.append((-80.0 + 5 * np.cos(angle), -10.0 + 5 * np.sin(angle), 80.0 + 5 * np.cos(angle),
+                     -10.0 + 5 * np.sin(angle), status, 960 + 500 * np.cos(0.03 * i), 540 + 400 * np.sin(0.03 * i),
+                     i, 0.03 * i))
+    return _records(rows)
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64])
+def test_incremental_analysis_matches_the_whole_session(chunk):
+    samples = session_samples(600)
+    incremental = IncrementalAnalysis(window=10)
+    parts = [incremental.extend(samples[start:start + chunk], CALIBRATION) for start in range(0, 600, chunk)]
+    whole = analysis.SessionAnalysis(samples, CALIBRATION)
+
+    for name in ("velocity_left", "velocity_right", "led_angle", "left_angle", "right_angle_diff"):
+        np.testing.assert_allclose(np.concatenate([getattr(part, name) for part, _ in parts]), getattr(whole, name))
+    np.testing.assert_allclose(np.concatenate([rate for _, rate in parts]),
+                               analysis.rolling_mean(whole.status == VALID, 10))
+    assert incremental.frames == len(whole)
+    assert incremental.valid_frames == np.count_nonzero(whole.status == VALID)
+
+
+def test_incremental_analysis_reset():
+    samples = session_samples(100)
+    incremental = IncrementalAnalysis(window=10)
+    incremental.extend(samples, CALIBRATION)
+    incremental.reset()
+    session, rate = incremental.extend(samples[:50], CALIBRATION)
+
+    np.testing.assert_allclose(session.velocity_left, analysis.SessionAnalysis(samples[:50]).velocity_left)
+    assert incremental.frames == len(session)
+
+
+def test_decimated_series_stays_bounded():
+    series = DecimatedSeries(max_buckets=10)
+    x = np.arange(10000.0)
+    y = np.sin(x / 100)
+    for start in range(0, len(x), 13):
+        series.extend(x[start:start + 13], y[start:start + 13])
+        assert len(series.points()[0]) <= 20
+
+    points_x, points_y = series.points()
+    assert np.all(np.diff(points_x) >= 0)
+    # The extremes of the series are kept
+    assert points_y.max() == y.max() and points_y.min() == y.min()
+    assert series.bucket_size == 1024
+    # Every bucket has points, the last one is still being filled
+    assert points_x[0] < series.bucket_size and points_x[-1] >= 9 * series.bucket_size
+
+
+def test_decimated_series_leaves_out_missing_points():
+    series = DecimatedSeries(max_buckets=4)
+    series.extend([0, 1, 2, 3, 4, 5], [1, np.nan, np.nan, np.nan, 5, np.nan])
+
+    points_x, points_y = series.points()
+    assert set(points_x.tolist()) == {0, 4}
+    assert not np.isnan(points_y).any()
+    series.clear()
+    assert len(series.points()[0]) == 0
+
+
+def test_dashboard_shows_a_bounded_number_of_points():
+    samples = session_samples(2000)
+    dashboard = LiveDashboard(Figure(), num_points=50, window=10)
+    for start in range(0, 2000, 100):
+        dashboard.extend(samples[start:start + 100], CALIBRATION)
+    dashboard.draw()
+
+    for line in (dashboard.line_left_x, dashboard.line_velocity_left, dashboard.line_left_angle, dashboard.line_valid):
+        assert 0 < len(line.get_xdata()) <= 50
+    assert np.nanmax(dashboard.line_valid.get_ydata()) <= 100
+    whole = analysis.SessionAnalysis(samples)
+    valid = 100 * np.count_nonzero(whole.status == VALID) / len(whole)
+    assert dashboard.fig._suptitle.get_text() == f"{len(whole)} frames, {valid:.1f}% valid"
+
+    dashboard.clear()
+    dashboard.draw()
+    assert len(dashboard.line_left_x.get_xdata()) == 0